@@ -0,0 +1,288 @@
+"""Benchmark BuildingMOTIF MCP against a synthetic library and check for regressions.
+
+Usage:
+    python -m benchmarks.run --size medium --output results.json --no-baseline
+    python -m benchmarks.run --size medium --save-baseline
+    python -m benchmarks.run --size medium --baseline benchmarks/baseline.json
+
+Timings depend on the machine, so no baseline is shipped: the machine that
+runs the regression check records its own with --save-baseline first, and
+a check without one fails.
+
+Each measured run happens in a fresh process, since BuildingMOTIF keeps one
+database per process: a cold run against an empty library cache, then a warm
+run that reopens the cache it left behind.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.synthetic import PRESETS, generate_library
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+LIBRARY_NAME = "synthetic"
+PHASES = ("cold", "warm")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def _median_time(call: Callable[[], dict], repeat: int) -> float:
+    """Median seconds of repeated calls, failing if a call does not succeed."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = call()
+        times.append(time.perf_counter() - started)
+        if not result.get("success"):
+            raise RuntimeError(f"Benchmarked call failed: {result.get('error')}")
+    return statistics.median(times)
+
+
+def measure(
+    libraries_dir: str,
+    cache_dir: str,
+    template: str,
+    samples: int,
+    rows: int,
+    repeat: int,
+    seed: int,
+) -> dict:
+    """Time one server lifetime: startup, then the tools against the synthetic library.
+
+    Args:
+        libraries_dir: Directory holding the synthetic library
+        cache_dir: Library cache directory
+        template: Template to inline, evaluate and validate; the top of the
+            longest dependency chain
+        samples: Templates whose details are fetched
+        rows: Binding rows evaluated and validated
+        repeat: Repetitions of the cheap calls, whose median is reported
+        seed: Random seed choosing the sampled templates
+
+    Returns:
+        dict with "metrics" (name -> seconds) and "info" (counts)
+    """
+    from buildingmotif_mcp.ontology import OntologyManager
+    from buildingmotif_mcp.tools import BuildingMOTIFTools
+
+    metrics: Dict[str, float] = {}
+    info: Dict[str, object] = {}
+
+    started = time.perf_counter()
+    om = OntologyManager(ontology_paths=[libraries_dir], cache_dir=cache_dir, lazy=False)
+    metrics["startup"] = time.perf_counter() - started
+    if LIBRARY_NAME in om.load_errors:
+        raise RuntimeError(f"Synthetic library failed to load: {om.load_errors[LIBRARY_NAME]}")
+    for name, stats in om.library_stats.items():
+        metrics[f"load.{name}"] = stats["load_seconds"]
+        metrics[f"index.{name}"] = stats["index_seconds"]
+        info[f"from_cache.{name}"] = stats["from_cache"]
+    tools = BuildingMOTIFTools(om)
+
+    metrics["list_templates"] = _median_time(lambda: tools.list_templates(LIBRARY_NAME), repeat)
+    metrics["list_templates.all"] = _median_time(lambda: tools.list_templates(), repeat)
+
+    templates = om.list_templates(LIBRARY_NAME)
+    sample = random.Random(seed).sample(templates, min(samples, len(templates)))
+    for label, fields in (("get_template_details", None), ("get_template_details.parameters", ["parameters"])):
+        times = [_median_time(lambda: tools.get_template_details(LIBRARY_NAME, name, fields), 1) for name in sample]
+        metrics[f"{label}.p50"] = _percentile(times, 0.50)
+        metrics[f"{label}.p95"] = _percentile(times, 0.95)
+
+    metrics["search_templates"] = _median_time(lambda: tools.search_templates("synthetic equipment 42", limit=10), repeat)
+    metrics["match_templates"] = _median_time(
+        lambda: tools.match_templates(["urn:bench/Point_0001", "urn:bench/Template_00001"], limit=10), repeat
+    )
+
+    started = time.perf_counter()
+    details = tools.get_template_details(LIBRARY_NAME, template, ["inlined_body"])
+    metrics["inline_template"] = time.perf_counter() - started
+    if not details.get("success"):
+        raise RuntimeError(f"Could not inline '{template}': {details.get('error')}")
+
+    bindings = [
+        {param: f"urn:bench-model/{param}_{row}" for param in details["inlined_parameters"]}
+        for row in range(rows)
+    ]
+    metrics["evaluate_template"] = _median_time(
+        lambda: tools.evaluate_template(LIBRARY_NAME, template, bindings=bindings), repeat
+    )
+
+    model_id = tools.create_model()["model_id"]
+    result = tools.evaluate_template(LIBRARY_NAME, template, bindings=bindings, model_id=model_id)
+    info["model_triples"] = result.get("model_triples")
+    started = time.perf_counter()
+    result = tools.validate_model(model_id=model_id, library_names=[LIBRARY_NAME], mode="full")
+    metrics["validate_model"] = time.perf_counter() - started
+    if not result.get("success"):
+        raise RuntimeError(f"Validation failed: {result.get('error')}")
+
+    info["template"] = template
+    info["templates"] = len(templates)
+    return {"metrics": {name: round(seconds, 6) for name, seconds in metrics.items()}, "info": info}
+
+
+def run_phase(phase: str, libraries_dir: Path, cache_dir: Path, template: str, args: argparse.Namespace) -> dict:
+    """Run measure() in a fresh interpreter and return its results."""
+    command = [
+        sys.executable, "-m", "benchmarks.run", "--measure",
+        "--libraries-dir", str(libraries_dir),
+        "--cache-dir", str(cache_dir),
+        "--template", template,
+        "--samples", str(args.samples),
+        "--rows", str(args.rows),
+        "--repeat", str(args.repeat),
+        "--seed", str(args.seed),
+    ]
+    print(f"Running {phase} phase...", file=sys.stderr)
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr)
+        raise RuntimeError(f"The {phase} phase failed with exit code {completed.returncode}")
+    result = json.loads(completed.stdout)
+    result["wall_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_seconds: float) -> List[str]:
+    """List the metrics that got slower than the baseline allows.
+
+    A metric regresses when it is more than tolerance (a fraction) slower than
+    its baseline and at least min_seconds slower, so that noise in
+    sub-millisecond timings does not fail a run.
+    """
+    regressions = []
+    for phase, recorded in baseline["phases"].items():
+        current = results["phases"].get(phase, {}).get("metrics", {})
+        for name, base in recorded["metrics"].items():
+            value = current.get(name)
+            if value is None:
+                continue
+            if value > base * (1 + tolerance) and value - base >= min_seconds:
+                slower = f" (+{(value / base - 1) * 100:.0f}%)" if base > 0 else ""
+                regressions.append(f"{phase}.{name}: {value:.4f}s vs baseline {base:.4f}s{slower}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point.
+
+    Returns:
+        0 on success, 1 if a metric regressed past the baseline, 2 if the
+        baseline was recorded with a different configuration, 3 if there
+        is no baseline to compare against
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=sorted(PRESETS), default="small", help="Synthetic library size (default small)")
+    parser.add_argument("--templates", type=int, help="Override the number of templates")
+    parser.add_argument("--depth", type=int, help="Override the dependency depth")
+    parser.add_argument("--shapes", type=int, help="Override the number of validation shapes")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default 0)")
+    parser.add_argument("--samples", type=int, default=50, help="Templates whose details are fetched (default 50)")
+    parser.add_argument("--rows", type=int, default=200, help="Binding rows evaluated and validated (default 200)")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions of cheap calls (default 5)")
+    parser.add_argument("--workdir", help="Directory for the library and cache (default: a temporary directory)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--no-baseline", action="store_true", help="Only measure, without comparing to a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown as a fraction (default 0.25)")
+    parser.add_argument("--min-seconds", type=float, default=0.005,
+                        help="Ignore slowdowns smaller than this many seconds (default 0.005)")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--libraries-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--template", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+        result = measure(args.libraries_dir, args.cache_dir, args.template, args.samples, args.rows, args.repeat, args.seed)
+        print(json.dumps(result))
+        return 0
+
+    config = dict(PRESETS[args.size])
+    for key in ("templates", "depth", "shapes"):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+    config.update(seed=args.seed, samples=args.samples, rows=args.rows, repeat=args.repeat)
+
+    with tempfile.TemporaryDirectory(prefix="buildingmotif_bench-") as tmp:
+        workdir = Path(args.workdir or tmp)
+        libraries_dir = workdir / "libraries"
+        cache_dir = workdir / "cache"
+        library = generate_library(
+            libraries_dir / LIBRARY_NAME,
+            templates=config["templates"],
+            depth=config["depth"],
+            shapes=config["shapes"],
+            point_classes=config["point_classes"],
+            seed=args.seed,
+        )
+        # The cold phase must start from an empty cache
+        if cache_dir.exists():
+            shutil.rmtree(cache_dir)
+        results = {
+            "config": config,
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "machine": platform.machine(),
+            },
+            "library": {key: value for key, value in library.items() if key != "path"},
+            "phases": {phase: run_phase(phase, libraries_dir, cache_dir, library["deepest_templates"][0], args) for phase in PHASES},
+        }
+
+    for phase in PHASES:
+        print(f"\n{phase}:")
+        for name, seconds in results["phases"][phase]["metrics"].items():
+            print(f"  {name:40s} {seconds * 1000:12.2f} ms")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\nWrote {args.output}")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Saved baseline to {baseline_path}")
+        return 0
+    if args.no_baseline:
+        return 0
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; record one on this machine with --save-baseline first")
+        return 3
+
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    if baseline.get("config") != config:
+        print(f"Baseline {baseline_path} was recorded with {baseline.get('config')}, not {config}")
+        return 2
+    regressions = compare(results, baseline, args.tolerance, args.min_seconds)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {baseline_path}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions against {baseline_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Synthetic BuildingMOTIF libraries of configurable size for benchmarks."""
+
+import json
+import random
+from pathlib import Path
+from typing import Dict, List
+
+NAMESPACE = "urn:bench/"
+
+PREFIXES = """@prefix bench: <urn:bench/> .
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+"""
+
+# Library sizes selectable by name
+PRESETS: Dict[str, dict] = {
+    "small": {"templates": 200, "depth": 2, "shapes": 20, "point_classes": 50},
+    "medium": {"templates": 2000, "depth": 3, "shapes": 200, "point_classes": 300},
+    "large": {"templates": 10000, "depth": 4, "shapes": 1000, "point_classes": 1000},
+}
+
+
+def template_name(number: int) -> str:
+    """IRI of the numbered template."""
+    return f"{NAMESPACE}Template_{number:05d}"
+
+
+def generate_library(
+    directory: Path,
+    templates: int = 200,
+    depth: int = 2,
+    shapes: int = 20,
+    point_classes: int = 50,
+    points_per_template: int = 3,
+    dependencies_per_template: int = 2,
+    seed: int = 0,
+) -> dict:
+    """Write a synthetic library of template shapes as one Turtle file.
+
+    Every template is an owl:Class and sh:NodeShape, so BuildingMOTIF turns it
+    into a template. Templates are spread over depth + 1 levels; a template on
+    level L > 0 requires points and up to dependencies_per_template templates
+    of level L - 1, so evaluating a top-level template inlines a dependency
+    chain depth templates deep. The extra shapes are plain validation rules
+    targeting template classes. The same arguments always give the same file.
+
+    Args:
+        directory: Library directory to create; its name is the library name
+        templates: Number of templates
+        depth: Length of the longest dependency chain
+        shapes: Number of validation shapes that are not templates
+        point_classes: Number of point classes templates draw their points from
+        points_per_template: Point parameters of each template
+        dependencies_per_template: Dependencies of each template above level 0
+        seed: Random seed
+
+    Returns:
+        dict describing the library: name, path, sizes and the names of the
+        deepest templates
+    """
+    rng = random.Random(seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    levels: List[List[int]] = [[] for _ in range(depth + 1)]
+    for number in range(templates):
+        levels[number * (depth + 1) // max(1, templates)].append(number)
+
+    lines = [PREFIXES, f"<{NAMESPACE}> a owl:Ontology ;\n  rdfs:label \"Synthetic benchmark library\" .\n"]
+    lines.append("bench:Point a owl:Class .\nbench:Equipment a owl:Class .\n")
+    for number in range(point_classes):
+        lines.append(f"bench:Point_{number:04d} a owl:Class ;\n  rdfs:subClassOf bench:Point ;\n"
+                     f"  rdfs:label \"Synthetic point {number}\" .\n")
+
+    dependencies = 0
+    for level, numbers in enumerate(levels):
+        for number in numbers:
+            properties = []
+            for point in range(points_per_template):
+                point_class = rng.randrange(point_classes)
+                properties.append(
+                    f"  sh:property [\n    sh:path bench:hasPoint ;\n    sh:name \"point{point}_\" ;\n"
+                    f"    sh:qualifiedValueShape [ sh:class bench:Point_{point_class:04d} ] ;\n"
+                    f"    sh:qualifiedMinCount 1 ;\n  ]"
+                )
+            if level > 0:
+                below = levels[level - 1]
+                for part, dependency in enumerate(rng.sample(below, min(dependencies_per_template, len(below)))):
+                    properties.append(
+                        f"  sh:property [\n    sh:path bench:hasPart ;\n    sh:name \"part{part}_\" ;\n"
+                        f"    sh:qualifiedValueShape [ sh:node <{template_name(dependency)}> ] ;\n"
+                        f"    sh:qualifiedMinCount 1 ;\n  ]"
+                    )
+                    dependencies += 1
+            header = (f"<{template_name(number)}> a owl:Class, sh:NodeShape ;\n  rdfs:subClassOf bench:Equipment ;\n"
+                      f"  rdfs:label \"Synthetic equipment {number} level {level}\" ;\n")
+            lines.append(header + " ;\n".join(properties) + " .\n")
+
+    for number in range(shapes):
+        target = rng.randrange(templates)
+        lines.append(
+            f"bench:Rule_{number:05d} a sh:NodeShape ;\n  sh:targetClass <{template_name(target)}> ;\n"
+            f"  sh:property [ sh:path rdfs:label ; sh:maxCount 1 ] .\n"
+        )
+
+    ontology_file = directory / f"{directory.name}.ttl"
+    ontology_file.write_text("\n".join(lines), encoding="utf-8")
+    metadata = {
+        "name": directory.name,
+        "description": f"Synthetic library with {templates} templates, dependency depth {depth}",
+        "type": "synthetic",
+    }
+    Path(str(ontology_file) + ".metadata").write_text(json.dumps(metadata, indent=2), encoding="utf-8")
+    return {
+        "name": directory.name,
+        "path": str(directory),
+        "templates": templates,
+        "depth": depth,
+        "shapes": shapes,
+        "point_classes": point_classes,
+        "dependencies": dependencies,
+        "deepest_templates": [template_name(number) for number in levels[-1][:10]],
+    }
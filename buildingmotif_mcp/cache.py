@@ -0,0 +1,281 @@
+"""On-disk caching for BuildingMOTIF MCP."""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from importlib import metadata as importlib_metadata
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of the cache database, manifest or artifacts changes
+CACHE_FORMAT_VERSION = "4"
+
+
+def _buildingmotif_version() -> str:
+    """Return the installed buildingmotif version, or 'unknown'."""
+    try:
+        return importlib_metadata.version("buildingmotif")
+    except importlib_metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class LibraryCache:
+    """Persistent cache of loaded libraries, keyed by source content hash.
+
+    The cache directory holds a SQLite database used as the BuildingMOTIF
+    backend and a JSON manifest that maps each library name to the hash of
+    its source files and the database id the library was stored under.
+    A library whose hash still matches is reopened from the database
+    instead of being parsed again.
+    """
+
+    DB_FILENAME = "libraries.db"
+    MANIFEST_FILENAME = "manifest.json"
+
+    def __init__(self, cache_dir: str):
+        """Initialize the cache.
+
+        Args:
+            cache_dir: Directory holding the cache database and manifest
+        """
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / self.DB_FILENAME
+        self.manifest_path = self.cache_dir / self.MANIFEST_FILENAME
+        self.manifest: Dict[str, dict] = self._read_manifest()
+        self.hits: List[str] = []
+        self.misses: List[str] = []
+
+    @property
+    def db_url(self) -> str:
+        """SQLAlchemy URL of the cache database."""
+        return f"sqlite:///{self.db_path}"
+
+    def _read_manifest(self) -> Dict[str, dict]:
+        """Read the manifest, discarding it if unreadable or from another format."""
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache manifest {self.manifest_path}: {e}")
+            return {}
+        if data.get("format") != CACHE_FORMAT_VERSION:
+            logger.info("Cache manifest format changed; rebuilding library cache")
+            return {}
+        return data.get("libraries", {})
+
+    def compute_hash(self, files: List[Path]) -> str:
+        """Hash the contents of a library's source files.
+
+        The buildingmotif version and cache format are mixed in so that an
+        upgrade invalidates every entry.
+
+        Args:
+            files: Ontology files making up the library
+
+        Returns:
+            Hex digest identifying this exact set of file contents
+        """
+        h = hashlib.sha256()
+        h.update(f"{CACHE_FORMAT_VERSION}:{_buildingmotif_version()}".encode())
+        for path in sorted(files):
+            h.update(b"\0" + path.name.encode() + b"\0")
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+        return h.hexdigest()
+
+    def lookup(self, library_name: str, content_hash: str) -> Optional[int]:
+        """Return the cached database id for a library if its hash matches.
+
+        Args:
+            library_name: Name of the library
+            content_hash: Hash of the library's current source files
+
+        Returns:
+            Database id of the cached library, or None on a miss
+        """
+        entry = self.manifest.get(library_name)
+        if entry and entry.get("hash") == content_hash:
+            return entry.get("db_id")
+        return None
+
+    def stale_id(self, library_name: str) -> Optional[int]:
+        """Return the database id of a previously cached copy of a library."""
+        entry = self.manifest.get(library_name)
+        return entry.get("db_id") if entry else None
+
+    def store(self, library_name: str, content_hash: str, db_id: int, source: Path) -> None:
+        """Record a freshly loaded library.
+
+        Args:
+            library_name: Name of the library
+            content_hash: Hash of the library's source files
+            db_id: Database id the library was stored under
+            source: File or directory the library was loaded from
+        """
+        self.manifest[library_name] = {
+            "hash": content_hash,
+            "db_id": db_id,
+            "source": str(source),
+        }
+
+    def load_artifact(self, library_name: str, kind: str, key: Optional[str] = None) -> Optional[dict]:
+        """Load data derived from a cached library, such as its template index.
+
+        Args:
+            library_name: Name of the library
+            kind: Artifact kind, used in the file name
+            key: For kinds saved as one file per item (such as one inlined
+                template), the item to load
+
+        Returns:
+            The saved data, or None if missing or saved for other source files
+        """
+        entry = self.manifest.get(library_name)
+        path = self._artifact_path(library_name, kind, key)
+        if not entry or not path.exists():
+            return None
+        try:
+            with open(path, "r") as f:
+                saved = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache file {path}: {e}")
+            return None
+        if saved.get("hash") != entry["hash"] or saved.get("db_id") != entry["db_id"] or saved.get("key") != key:
+            return None
+        return saved.get("data")
+
+    def save_artifact(
+        self, library_name: str, kind: str, data: dict, key: Optional[str] = None, entry: Optional[dict] = None
+    ) -> None:
+        """Save data derived from a cached library next to the cache database.
+
+        Args:
+            library_name: Name of the library, which must already be stored
+            kind: Artifact kind, used in the file name
+            data: JSON-serializable data
+            key: Item the data belongs to, to save it in a file of its own
+                instead of rewriting one file holding every item
+            entry: Manifest entry of the library version the data was
+                derived from, if it may have been stored again since
+                (default: the current entry)
+        """
+        entry = entry or self.manifest.get(library_name)
+        if not entry:
+            return
+        path = self._artifact_path(library_name, kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"hash": entry["hash"], "db_id": entry["db_id"], "key": key, "data": data}, f)
+        os.replace(tmp_path, path)
+
+    def _artifact_path(self, library_name: str, kind: str, key: Optional[str] = None) -> Path:
+        """Path of an artifact file for a library, or for one item of it."""
+        if key is None:
+            return self.cache_dir / f"{library_name}.{kind}.json"
+        # Keys such as template IRIs are not valid file names
+        digest = hashlib.sha256(key.encode()).hexdigest()[:24]
+        return self.cache_dir / f"{library_name}.{kind}" / f"{digest}.json"
+
+    def forget(self, library_name: str) -> None:
+        """Drop a library from the manifest and delete its artifacts."""
+        self.manifest.pop(library_name, None)
+        prefix = f"{library_name}."
+        for path in self.cache_dir.glob(f"{glob.escape(library_name)}.*"):
+            kind = path.name[len(prefix):]
+            if path.is_dir():
+                if "." not in kind:
+                    shutil.rmtree(path, ignore_errors=True)
+            # Not the artifacts of a library whose name continues with a dot
+            elif kind.endswith(".json") and "." not in kind[:-len(".json")]:
+                path.unlink(missing_ok=True)
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"format": CACHE_FORMAT_VERSION, "libraries": self.manifest}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def summary(self) -> str:
+        """One-line description of cache hits and misses for the startup log."""
+        return (
+            f"Library cache ({self.cache_dir}): {len(self.hits)} hit(s) {self.hits}, "
+            f"{len(self.misses)} miss(es) {self.misses}"
+        )
+
+
+class ResponseCache:
+    """LRU cache of rendered tool responses, bounded by total size in bytes.
+
+    Keys must include everything the rendered text depends on (for template
+    details: library, template and library version), so entries never need
+    explicit invalidation; stale ones simply age out.
+    """
+
+    def __init__(self, max_bytes: int):
+        """Initialize the cache.
+
+        Args:
+            max_bytes: Budget for the summed size of cached responses; 0 disables caching
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (text, size in bytes)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """Return a cached response and mark it recently used, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, text: str) -> None:
+        """Cache a response, evicting least recently used entries to stay in budget."""
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (text, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
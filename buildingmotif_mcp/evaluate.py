@@ -0,0 +1,211 @@
+"""Batch template evaluation for BuildingMOTIF MCP."""
+
+import csv
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from rdflib import BNode, Literal, URIRef
+from rdflib.term import Node
+
+from buildingmotif.dataclasses import Template
+from buildingmotif.namespaces import PARAM
+
+logger = logging.getLogger(__name__)
+
+Triple = Tuple[Node, Node, Node]
+
+# Characters that may not appear in an IRI written as N-Triples
+_INVALID_IRI_RE = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+
+# Schemes accepted as absolute IRIs rather than prefixed names
+IRI_SCHEMES = {"http", "https", "urn", "file", "tag", "mailto"}
+
+
+class BindingError(ValueError):
+    """A row of bindings that cannot be applied to the template."""
+
+
+class CompiledTemplate:
+    """A template with its dependencies inlined, ready to expand many rows.
+
+    BuildingMOTIF's Template.evaluate copies and rewrites the template graph
+    on every call. Here the body is flattened once into a list of triples
+    with the parameter positions marked, so expanding a row is a dictionary
+    lookup per term.
+    """
+
+    def __init__(self, triples: List[Triple], parameters: Set[str], optional_parameters: Set[str]):
+        """Initialize the compiled template.
+
+        Args:
+            triples: Body triples, with parameters as PARAM[name] IRIs
+            parameters: All parameter names
+            optional_parameters: Parameters that may be left unbound
+        """
+        self.triples = triples
+        self.parameters = parameters
+        self.optional_parameters = optional_parameters
+        self.required_parameters = parameters - optional_parameters
+        self._param_nodes: Dict[Node, str] = {PARAM[name]: name for name in parameters}
+
+    @classmethod
+    def from_template(cls, template: Template) -> "CompiledTemplate":
+        """Inline a template's dependencies and compile the result.
+
+        Must be called with database access, since dependencies are read from
+        the libraries that define them.
+
+        Args:
+            template: The template to compile
+
+        Returns:
+            A new CompiledTemplate
+        """
+        inlined = template.inline_dependencies()
+        return cls(
+            list(inlined.body.triples((None, None, None))),
+            set(inlined.parameters),
+            set(inlined.optional_args),
+        )
+
+    def expand(self, bindings: Dict[str, Node]) -> List[Triple]:
+        """Substitute one row of bindings into the template body.
+
+        Triples touching an unbound optional parameter are dropped, as
+        Template.evaluate does. Blank nodes are fresh for every row.
+
+        Args:
+            bindings: Parameter name to RDF term
+
+        Returns:
+            The expanded triples
+
+        Raises:
+            BindingError: If a required parameter is unbound
+        """
+        missing = self.required_parameters - bindings.keys()
+        if missing:
+            raise BindingError(f"Missing required parameters: {sorted(missing)}")
+
+        bnodes: Dict[BNode, BNode] = {}
+        expanded = []
+        for triple in self.triples:
+            terms = []
+            for term in triple:
+                name = self._param_nodes.get(term)
+                if name is not None:
+                    term = bindings.get(name)
+                    if term is None:
+                        break
+                elif isinstance(term, BNode):
+                    term = bnodes.setdefault(term, BNode())
+                terms.append(term)
+            else:
+                expanded.append(tuple(terms))
+        return expanded
+
+
+def parse_binding_value(value, namespaces: Dict[str, str], base_namespace: Optional[str]) -> Node:
+    """Turn a binding value from a request or file into an RDF term.
+
+    Args:
+        value: An absolute IRI ("urn:bldg/AHU1", optionally in <>), a prefixed
+            name using one of the namespaces ("bldg:AHU1"), a bare name
+            resolved against base_namespace, or {"literal": ..., "datatype"?,
+            "lang"?} for a literal
+        namespaces: Prefix to namespace IRI
+        base_namespace: Namespace for bare names, or None to reject them
+
+    Returns:
+        The RDF term
+
+    Raises:
+        BindingError: If the value cannot be turned into a valid term
+    """
+    if isinstance(value, dict):
+        if "literal" not in value:
+            raise BindingError(f"Binding object needs a 'literal' key: {value!r}")
+        datatype = value.get("datatype")
+        return Literal(value["literal"], datatype=URIRef(datatype) if datatype else None, lang=value.get("lang"))
+    if not isinstance(value, str):
+        raise BindingError(f"Binding value must be a string or literal object: {value!r}")
+
+    text = value.strip()
+    prefix, sep, local = text.partition(":")
+    if text.startswith("<") and text.endswith(">"):
+        iri = text[1:-1]
+    elif sep and prefix in namespaces:
+        iri = namespaces[prefix] + local
+    elif sep and prefix.lower() in IRI_SCHEMES:
+        iri = text
+    elif sep:
+        raise BindingError(f"Unknown prefix '{prefix}' in {value!r}")
+    elif base_namespace:
+        iri = base_namespace + text
+    else:
+        raise BindingError(f"{value!r} is not an IRI; pass base_namespace to allow bare names")
+    if not iri or _INVALID_IRI_RE.search(iri):
+        raise BindingError(f"Invalid IRI {iri!r}")
+    return URIRef(iri)
+
+
+def read_bindings_file(path: Path) -> Iterator[dict]:
+    """Stream rows of bindings from a CSV or JSON Lines file.
+
+    CSV files need a header row naming the parameters; empty cells leave the
+    parameter unbound. JSON Lines files hold one object per line.
+
+    Args:
+        path: A .csv or .jsonl file
+
+    Yields:
+        One dict of raw binding values per row
+
+    Raises:
+        ValueError: If the file type is not supported
+    """
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                yield {key.strip(): val for key, val in row.items() if key and val not in (None, "")}
+    elif suffix in {".jsonl", ".ndjson"}:
+        with open(path) as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    # Surface as a per-row error rather than aborting the batch
+                    yield {"__error__": f"line {line_no}: invalid JSON: {e}"}
+                    continue
+                yield row if isinstance(row, dict) else {"__error__": f"line {line_no}: expected a JSON object"}
+    else:
+        raise ValueError(f"Unsupported bindings file type '{path.suffix}'; use .csv or .jsonl")
+
+
+_NT_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r"})
+
+
+def ntriples_term(term: Node) -> str:
+    """Write an RDF term in N-Triples syntax."""
+    if isinstance(term, Literal):
+        text = f'"{str(term).translate(_NT_ESCAPES)}"'
+        if term.language:
+            return f"{text}@{term.language}"
+        if term.datatype:
+            return f"{text}^^<{term.datatype}>"
+        return text
+    if isinstance(term, BNode):
+        return f"_:{term}"
+    return f"<{term}>"
+
+
+def write_ntriples(out: TextIO, triples: List[Triple]) -> None:
+    """Append triples to an N-Triples stream."""
+    for s, p, o in triples:
+        out.write(f"{ntriples_term(s)} {ntriples_term(p)} {ntriples_term(o)} .\n")
@@ -0,0 +1,295 @@
+"""Streaming RDF export for BuildingMOTIF MCP.
+
+Triples are written as they are produced, so exporting a graph does not
+build a second copy of it in memory. Three formats are supported:
+
+- "nt": N-Triples
+- "nt.gz": gzip-compressed N-Triples
+- "rdfb": a compact binary encoding. Each distinct term is written once and
+  then referred to by number, and the stream is gzip-compressed. Read it
+  back with read_rdfb, or convert it to N-Triples with
+  ``python -m buildingmotif_mcp.export model.rdfb > model.nt``.
+
+The rdfb stream starts with the bytes ``RDFB\\x01``, followed by one record
+per triple: three term references. A reference is an unsigned LEB128
+varint, either the number (from 1) of a term seen before, or 0 followed by
+a new term: a kind byte and its length-prefixed UTF-8 text. A language
+literal is followed by its language tag, and a typed literal by a reference
+to its datatype IRI.
+"""
+
+import gzip
+import io
+import sys
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+from rdflib import BNode, Literal, URIRef
+from rdflib.term import Node
+
+from buildingmotif_mcp.evaluate import Triple, ntriples_term, write_ntriples
+
+# Formats TripleWriter can stream, by name
+STREAMING_FORMATS = ("nt", "nt.gz", "rdfb")
+
+RDFB_MAGIC = b"RDFB\x01"
+
+# Fast gzip settings; the default level 9 is several times slower for a few percent
+COMPRESS_LEVEL = 6
+
+# Bytes of encoded rdfb records buffered before they are compressed, and
+# read at a time when reading or copying files
+_RDFB_CHUNK_BYTES = 64 * 1024
+
+_IRI, _BNODE, _LITERAL, _LANG_LITERAL, _TYPED_LITERAL = range(1, 6)
+
+
+def format_for_path(path: Path) -> str:
+    """Streaming format implied by a file name: .rdfb, .gz or N-Triples."""
+    name = Path(path).name.lower()
+    if name.endswith(".rdfb"):
+        return "rdfb"
+    if name.endswith(".gz"):
+        return "nt.gz"
+    return "nt"
+
+
+class TripleWriter:
+    """Append triples to a file in a streaming format.
+
+    Use as a context manager; the file is complete once it is closed.
+    """
+
+    def __init__(self, path: Path, format: str = "nt"):
+        """Open the output file.
+
+        Args:
+            path: File to create; its directory is created if needed
+            format: One of STREAMING_FORMATS
+
+        Raises:
+            ValueError: If the format is not a streaming format
+        """
+        if format not in STREAMING_FORMATS:
+            raise ValueError(f"Unsupported streaming format '{format}'. Use one of: {', '.join(STREAMING_FORMATS)}")
+        self.path = Path(path)
+        self.format = format
+        self.triples = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._raw: BinaryIO = open(self.path, "wb")
+        self._gzip: Optional[gzip.GzipFile] = None
+        if format != "nt":
+            self._gzip = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=COMPRESS_LEVEL, mtime=0)
+        binary = self._gzip or self._raw
+        self._text = io.TextIOWrapper(binary, encoding="utf-8", newline="\n") if format != "rdfb" else None
+        self._term_ids: Dict[Node, int] = {}
+        self._buffer = bytearray()
+        if format == "rdfb":
+            self._buffer += RDFB_MAGIC
+
+    def write(self, triples: Iterable[Triple]) -> None:
+        """Append triples to the file."""
+        if self._text is not None:
+            out = self._text
+            for s, p, o in triples:
+                out.write(f"{ntriples_term(s)} {ntriples_term(p)} {ntriples_term(o)} .\n")
+                self.triples += 1
+            return
+
+        buffer = self._buffer
+        for s, p, o in triples:
+            self._write_term(s)
+            self._write_term(p)
+            self._write_term(o)
+            self.triples += 1
+            if len(buffer) >= _RDFB_CHUNK_BYTES:
+                self._gzip.write(buffer)
+                buffer.clear()
+
+    def copy_ntriples(self, source: Path) -> None:
+        """Append an N-Triples file, one triple per line, without parsing it.
+
+        Args:
+            source: File written by write_ntriples
+
+        Raises:
+            ValueError: If this writer does not write N-Triples
+        """
+        if self._text is None:
+            raise ValueError(f"Cannot copy N-Triples into the '{self.format}' format")
+        self._text.flush()
+        binary = self._gzip or self._raw
+        with open(source, "rb") as lines:
+            while True:
+                chunk = lines.read(_RDFB_CHUNK_BYTES)
+                if not chunk:
+                    return
+                binary.write(chunk)
+                self.triples += chunk.count(b"\n")
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        if self._raw.closed:
+            return
+        try:
+            if self._text is not None:
+                self._text.flush()
+                self._text.detach()
+            elif self._buffer:
+                self._gzip.write(self._buffer)
+                self._buffer.clear()
+            if self._gzip is not None:
+                self._gzip.close()
+        finally:
+            self._raw.close()
+
+    @property
+    def bytes(self) -> int:
+        """Size of the file written so far, complete once closed."""
+        return self.path.stat().st_size
+
+    def __enter__(self) -> "TripleWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _write_term(self, term: Node) -> None:
+        """Append a reference to a term, defining the term on first use."""
+        term_id = self._term_ids.get(term)
+        if term_id is not None:
+            _write_varint(self._buffer, term_id)
+            return
+        self._buffer.append(0)
+        if isinstance(term, Literal):
+            if term.language:
+                self._buffer.append(_LANG_LITERAL)
+                _write_text(self._buffer, str(term))
+                _write_text(self._buffer, term.language)
+            elif term.datatype:
+                self._buffer.append(_TYPED_LITERAL)
+                _write_text(self._buffer, str(term))
+                self._write_term(term.datatype)
+            else:
+                self._buffer.append(_LITERAL)
+                _write_text(self._buffer, str(term))
+        else:
+            self._buffer.append(_BNODE if isinstance(term, BNode) else _IRI)
+            _write_text(self._buffer, str(term))
+        # Numbered after its datatype, in the order a reader meets the definitions
+        self._term_ids[term] = len(self._term_ids) + 1
+
+
+def _write_varint(buffer: bytearray, value: int) -> None:
+    """Append an unsigned LEB128 varint."""
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _write_text(buffer: bytearray, text: str) -> None:
+    """Append length-prefixed UTF-8 text."""
+    data = text.encode("utf-8")
+    _write_varint(buffer, len(data))
+    buffer += data
+
+
+class _RdfbReader:
+    """Decodes rdfb records from a decompressed byte stream."""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.data = b""
+        self.pos = 0
+        self.terms: List[Node] = []
+
+    def _fill(self, size: int) -> bool:
+        """Make at least size unread bytes available; False at end of stream."""
+        while len(self.data) - self.pos < size:
+            chunk = self.stream.read(_RDFB_CHUNK_BYTES)
+            if not chunk:
+                return False
+            self.data = self.data[self.pos:] + chunk
+            self.pos = 0
+        return True
+
+    def _byte(self) -> int:
+        if not self._fill(1):
+            raise ValueError("Truncated rdfb stream")
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def _varint(self) -> int:
+        value = shift = 0
+        while True:
+            byte = self._byte()
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def _text(self) -> str:
+        size = self._varint()
+        if not self._fill(size):
+            raise ValueError("Truncated rdfb stream")
+        text = self.data[self.pos:self.pos + size].decode("utf-8")
+        self.pos += size
+        return text
+
+    def _term(self) -> Node:
+        term_id = self._varint()
+        if term_id:
+            return self.terms[term_id - 1]
+        kind = self._byte()
+        if kind == _IRI:
+            term = URIRef(self._text())
+        elif kind == _BNODE:
+            term = BNode(self._text())
+        elif kind == _LITERAL:
+            term = Literal(self._text())
+        elif kind == _LANG_LITERAL:
+            lexical = self._text()
+            term = Literal(lexical, lang=self._text())
+        elif kind == _TYPED_LITERAL:
+            lexical = self._text()
+            term = Literal(lexical, datatype=self._term())
+        else:
+            raise ValueError(f"Unknown rdfb term kind {kind}")
+        self.terms.append(term)
+        return term
+
+    def triples(self) -> Iterator[Triple]:
+        if not self._fill(len(RDFB_MAGIC)) or self.data[:len(RDFB_MAGIC)] != RDFB_MAGIC:
+            raise ValueError("Not an rdfb file")
+        self.pos = len(RDFB_MAGIC)
+        while self._fill(1):
+            yield self._term(), self._term(), self._term()
+
+
+def read_rdfb(path: Path) -> Iterator[Triple]:
+    """Read back the triples of an rdfb file, one at a time.
+
+    Args:
+        path: File written by TripleWriter in the "rdfb" format
+
+    Yields:
+        (subject, predicate, object) triples in the order they were written
+
+    Raises:
+        ValueError: If the file is not a complete rdfb file
+    """
+    with gzip.open(path, "rb") as stream:
+        yield from _RdfbReader(stream).triples()
+
+
+def main() -> None:
+    """Convert an rdfb file to N-Triples on stdout."""
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python -m buildingmotif_mcp.export FILE.rdfb > FILE.nt")
+    write_ntriples(sys.stdout, read_rdfb(Path(sys.argv[1])))
+
+
+if __name__ == "__main__":
+    main()
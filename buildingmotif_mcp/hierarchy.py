@@ -0,0 +1,185 @@
+"""Class hierarchy closure index for BuildingMOTIF MCP."""
+
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+from rdflib import OWL, RDF, RDFS, Graph, URIRef
+
+from buildingmotif_mcp.search import local_name
+
+logger = logging.getLogger(__name__)
+
+
+class ClassHierarchy:
+    """The rdfs:subClassOf hierarchy of one library with its transitive closure.
+
+    Classes are numbered, and every class keeps the set of all its ancestors,
+    so "is X a kind of Y" is one set lookup and listing the superclasses or
+    subclasses of a class reads a precomputed list instead of walking the
+    graph. Ancestors are ordered nearest first.
+    """
+
+    def __init__(self, classes: List[str], parents: List[List[int]], ancestors: Optional[List[List[int]]] = None):
+        """Initialize the index.
+
+        Args:
+            classes: Class IRIs; a class is referred to by its position
+            parents: Direct superclasses of each class
+            ancestors: All superclasses of each class, nearest first
+                (default: computed from parents)
+        """
+        self.classes = classes
+        self.ids: Dict[str, int] = {iri: i for i, iri in enumerate(classes)}
+        self.parents = parents
+        self.ancestors = ancestors if ancestors is not None else self._close(parents)
+        self._ancestor_sets = [frozenset(ids) for ids in self.ancestors]
+
+        self.children: List[List[int]] = [[] for _ in classes]
+        self.descendants: List[List[int]] = [[] for _ in classes]
+        for class_id in range(len(classes)):
+            for parent in parents[class_id]:
+                self.children[parent].append(class_id)
+            for ancestor in self.ancestors[class_id]:
+                self.descendants[ancestor].append(class_id)
+
+        self._by_local_name: Dict[str, List[int]] = {}
+        for class_id, iri in enumerate(classes):
+            self._by_local_name.setdefault(local_name(iri).lower(), []).append(class_id)
+
+    @staticmethod
+    def _close(parents: List[List[int]]) -> List[List[int]]:
+        """Compute the ancestors of every class by breadth-first search, tolerating cycles."""
+        ancestors = []
+        for class_id, direct in enumerate(parents):
+            seen = {class_id}
+            order = []
+            queue = deque(direct)
+            while queue:
+                parent = queue.popleft()
+                if parent in seen:
+                    continue
+                seen.add(parent)
+                order.append(parent)
+                queue.extend(parents[parent])
+            ancestors.append(order)
+        return ancestors
+
+    @classmethod
+    def build(cls, graph: Graph) -> "ClassHierarchy":
+        """Build the index from a library's ontology graph.
+
+        Args:
+            graph: The library's ontology graph
+
+        Returns:
+            A new ClassHierarchy
+        """
+        edges = [
+            (str(child), str(parent))
+            for child, parent in graph.subject_objects(RDFS.subClassOf)
+            # Skip restrictions and other anonymous superclasses
+            if isinstance(child, URIRef) and isinstance(parent, URIRef) and child != parent
+        ]
+        names = {name for edge in edges for name in edge}
+        for class_type in (OWL.Class, RDFS.Class):
+            names.update(str(c) for c in graph.subjects(RDF.type, class_type) if isinstance(c, URIRef))
+        classes = sorted(names)
+        ids = {iri: i for i, iri in enumerate(classes)}
+        parents: List[List[int]] = [[] for _ in classes]
+        for child, parent in sorted(set(edges)):
+            parents[ids[child]].append(ids[parent])
+        return cls(classes, parents)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ClassHierarchy":
+        """Restore an index saved with to_dict."""
+        return cls(data["classes"], data["parents"], data["ancestors"])
+
+    def to_dict(self) -> dict:
+        """Serialize the index, closure included, for the library cache."""
+        return {"classes": self.classes, "parents": self.parents, "ancestors": self.ancestors}
+
+    def __len__(self) -> int:
+        return len(self.classes)
+
+    def __contains__(self, iri: str) -> bool:
+        return iri in self.ids
+
+    def resolve(self, name: str) -> List[str]:
+        """Find the classes a name may refer to.
+
+        Args:
+            name: A class IRI, a prefixed name such as "brick:Temperature_Sensor",
+                or a local name such as "Temperature_Sensor" (case-insensitive)
+
+        Returns:
+            The matching class IRIs; more than one if a local name is ambiguous
+        """
+        if name in self.ids:
+            return [name]
+        if "/" in name or name.startswith("urn:"):
+            # An IRI of a class this library does not define
+            return []
+        key = name.rpartition(":")[2].lower()
+        return [self.classes[i] for i in self._by_local_name.get(key, [])]
+
+    def is_subclass(self, iri: str, superclass_iri: str) -> bool:
+        """True if iri is superclass_iri or one of its subclasses, directly or not."""
+        class_id = self.ids.get(iri)
+        super_id = self.ids.get(superclass_iri)
+        if class_id is None or super_id is None:
+            return False
+        return class_id == super_id or super_id in self._ancestor_sets[class_id]
+
+    def superclasses(self, iri: str, direct: bool = False) -> List[str]:
+        """Superclasses of a class, nearest first; only the direct ones if direct is True."""
+        class_id = self.ids.get(iri)
+        if class_id is None:
+            return []
+        ids = self.parents[class_id] if direct else self.ancestors[class_id]
+        return [self.classes[i] for i in ids]
+
+    def subclasses(self, iri: str, direct: bool = False) -> List[str]:
+        """Subclasses of a class, sorted by IRI; only the direct ones if direct is True."""
+        class_id = self.ids.get(iri)
+        if class_id is None:
+            return []
+        ids = self.children[class_id] if direct else self.descendants[class_id]
+        return sorted(self.classes[i] for i in ids)
+
+
+def related_classes(hierarchies: Iterable[ClassHierarchy], iri: str, upward: bool, direct: bool = False) -> List[str]:
+    """Superclasses or subclasses of a class across several libraries.
+
+    A library may subclass another library's classes (an organization's AHU
+    type under brick:AHU), so the closures of the libraries are chained
+    until no library adds a new class.
+
+    Args:
+        hierarchies: Class hierarchies of the libraries to consult
+        iri: The class
+        upward: True for superclasses, False for subclasses
+        direct: Only direct superclasses or subclasses
+
+    Returns:
+        The related classes, without duplicates; superclasses nearest first
+    """
+    hierarchies = list(hierarchies)
+    found: List[str] = []
+    seen = {iri}
+    frontier = [iri]
+    while frontier:
+        following = []
+        for current in frontier:
+            for hierarchy in hierarchies:
+                step = hierarchy.superclasses(current, direct) if upward else hierarchy.subclasses(current, direct)
+                for related in step:
+                    if related not in seen:
+                        seen.add(related)
+                        found.append(related)
+                        following.append(related)
+        if direct:
+            break
+        frontier = following
+    return found
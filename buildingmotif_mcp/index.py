@@ -0,0 +1,142 @@
+"""Per-library template index for BuildingMOTIF MCP."""
+
+import logging
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Dict, List, Optional, Set
+
+from buildingmotif import get_building_motif
+from buildingmotif.database.tables import DBTemplate, DBTemplateDependency
+from buildingmotif.dataclasses import Library, Template
+from buildingmotif.namespaces import PARAM
+from rdflib import RDF, URIRef
+
+logger = logging.getLogger(__name__)
+
+# Templates read per database session hold while building an index
+_BUILD_BATCH = 50
+
+
+class TemplateIndex:
+    """Precomputed lookups over the templates of one loaded library.
+
+    Built once when a library is loaded so that read paths never go back
+    through BuildingMOTIF's database layer to enumerate templates. Each
+    entry holds the template's database id, its parameter lists, the
+    classes its body gives each parameter and the templates it depends on.
+    Reverse maps from classes and dependency templates to the templates
+    that require them are derived from the entries.
+    """
+
+    def __init__(self, entries: Dict[str, dict]):
+        """Initialize the index.
+
+        Args:
+            entries: Mapping of template name to a dict with "id",
+                "parameters", "optional_parameters", "parameter_classes"
+                and "dependencies"
+        """
+        self.entries = entries
+        self.names: List[str] = sorted(entries)
+
+        by_class: Dict[str, Set[str]] = defaultdict(set)
+        by_dependency: Dict[str, Set[str]] = defaultdict(set)
+        for name, entry in entries.items():
+            for classes in entry["parameter_classes"].values():
+                for class_iri in classes:
+                    by_class[class_iri].add(name)
+            for dependency in entry["dependencies"]:
+                by_dependency[dependency["template"]].add(name)
+        # Class IRI -> templates with a parameter of that class
+        self.by_class: Dict[str, List[str]] = {iri: sorted(names) for iri, names in by_class.items()}
+        # Template name -> templates that depend on it
+        self.by_dependency: Dict[str, List[str]] = {dep: sorted(names) for dep, names in by_dependency.items()}
+
+    @classmethod
+    def build(cls, lib: Library, database: Callable[[], ContextManager] = nullcontext) -> "TemplateIndex":
+        """Build the index by reading every template of a library once.
+
+        Args:
+            lib: The loaded library
+            database: Returns a context manager to hold around each batch of
+                database reads, so other threads can use the database
+                between batches
+
+        Returns:
+            A new TemplateIndex
+        """
+        # Fetch the dependencies of all templates at once rather than one query per template
+        dependencies_by_template: Dict[int, List[dict]] = defaultdict(list)
+        with database():
+            query = (
+                get_building_motif().session.query(DBTemplateDependency)
+                .join(DBTemplate, DBTemplateDependency.template_id == DBTemplate.id)
+                .filter(DBTemplate.library_id == lib.id)
+            )
+            for dependency in query:
+                dependencies_by_template[dependency.template_id].append({
+                    "template": dependency.dependency_template_name,
+                    "library": dependency.dependency_library_name,
+                    # Dependency parameter -> the parameter of this template bound to it
+                    "args": {arg: str(value).replace(PARAM, "", 1) for arg, value in dependency.args.items()},
+                })
+            templates = lib.get_templates()
+
+        entries = {}
+        for start in range(0, len(templates), _BUILD_BATCH):
+            with database():
+                for template in templates[start:start + _BUILD_BATCH]:
+                    entries[str(template.name)] = cls._entry(template, dependencies_by_template[template.id])
+        return cls(entries)
+
+    @staticmethod
+    def _entry(template: Template, dependencies: List[dict]) -> dict:
+        """Index entry of one template."""
+        # Read the body once; every access to it goes back to the database
+        parameters: Set[str] = set()
+        parameter_classes: Dict[str, Set[str]] = defaultdict(set)
+        for s, p, o in template.body:
+            for node in (s, p, o):
+                if node.startswith(PARAM):
+                    parameters.add(node[len(PARAM):])
+            if p == RDF.type and s.startswith(PARAM) and isinstance(o, URIRef) and not o.startswith(PARAM):
+                parameter_classes[s[len(PARAM):]].add(str(o))
+        return {
+            "id": template.id,
+            "parameters": sorted(parameters),
+            "optional_parameters": sorted(template.optional_args),
+            "parameter_classes": {param: sorted(classes) for param, classes in parameter_classes.items()},
+            "dependencies": dependencies,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TemplateIndex":
+        """Restore an index saved with to_dict."""
+        return cls(data["entries"])
+
+    def to_dict(self) -> dict:
+        """Serialize the index for the library cache."""
+        return {"entries": self.entries}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, template_name: str) -> bool:
+        return template_name in self.entries
+
+    def get(self, template_name: str) -> Optional[dict]:
+        """Return the index entry for a template, or None."""
+        return self.entries.get(template_name)
+
+    def templates_for_class(self, class_iri: str) -> List[str]:
+        """Templates with a parameter of the given class."""
+        return self.by_class.get(class_iri, [])
+
+    def dependents(self, template_name: str) -> List[str]:
+        """Templates that depend on the given template."""
+        return self.by_dependency.get(template_name, [])
+
+    def template_id(self, template_name: str) -> Optional[int]:
+        """Return the database id of a template, or None."""
+        entry = self.entries.get(template_name)
+        return entry["id"] if entry else None
@@ -0,0 +1,316 @@
+"""Load generator driving concurrent MCP sessions against BuildingMOTIF MCP.
+
+Each session spawns its own server over stdio (or connects to a shared HTTP
+server), waits for its first successful tool call, and then replays a
+weighted mix of tool calls for a fixed duration. Latencies are measured at
+the client, so they include JSON-RPC framing, response encoding and queueing
+in the server.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import shlex
+import shutil
+import statistics
+import sys
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+from buildingmotif_mcp.stats import ServerStats
+
+logger = logging.getLogger(__name__)
+
+# Replaced in call arguments by a template of the probed library
+TEMPLATE_PLACEHOLDER = "$template"
+
+DEFAULT_MIX = [
+    {"tool": "list_libraries", "arguments": {}, "weight": 1},
+    {"tool": "list_templates", "arguments": {"library_name": "brick", "limit": 50}, "weight": 3},
+    {"tool": "get_template_details", "arguments": {"library_name": "brick", "template_name": TEMPLATE_PLACEHOLDER}, "weight": 4},
+    {"tool": "search_templates", "arguments": {"query": "supply air temperature sensor", "limit": 5}, "weight": 2},
+    {"tool": "find_class_by_keyword", "arguments": {"keyword": "outside air damper", "limit": 5}, "weight": 1},
+    {"tool": "match_point_labels", "arguments": {"labels": ["AHU1_SAT", "VAV-2-14 DMP POS", "CHWS_T"]}, "weight": 1},
+]
+
+
+def _default_command() -> List[str]:
+    """The installed server command, or the server module run by this interpreter."""
+    if shutil.which("buildingmotif-mcp"):
+        return ["buildingmotif-mcp"]
+    return [sys.executable, "-m", "buildingmotif_mcp.main"]
+
+
+def _outcome(text: str) -> str:
+    """Classify a tool response the way the server's own statistics do."""
+    try:
+        result = json.loads(text)
+    except ValueError:
+        # Unexpected exceptions come back as plain "Error: ..." text
+        return "exception"
+    if not isinstance(result, dict):
+        return "ok"
+    if result.get("status") == "loading":
+        return "loading"
+    return "ok" if result.get("success", "error" not in result) else "error"
+
+
+def _resolve(arguments: dict, templates: List[str], rng: random.Random) -> dict:
+    """Fill template placeholders in call arguments."""
+    return {
+        key: rng.choice(templates) if value == TEMPLATE_PLACEHOLDER and templates else value
+        for key, value in arguments.items()
+    }
+
+
+class LoadGenerator:
+    """Runs the sessions of one load test and collects their results."""
+
+    def __init__(
+        self,
+        mix: List[dict],
+        sessions: int = 1,
+        concurrency: int = 4,
+        duration: float = 30.0,
+        command: Optional[List[str]] = None,
+        url: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        call_timeout: float = 120.0,
+        ready_timeout: float = 600.0,
+        server_log: bool = False,
+        seed: int = 0,
+    ):
+        """Configure a load test.
+
+        Args:
+            mix: Weighted tool calls, each {"tool", "arguments", "weight"}
+            sessions: Number of concurrent MCP sessions
+            concurrency: Calls each session keeps in flight at once
+            duration: Seconds each session replays the mix after its first success
+            command: Server command to spawn per session (default: buildingmotif-mcp)
+            url: Streamable HTTP endpoint of a running server, instead of spawning
+            env: Extra environment variables for spawned servers
+            call_timeout: Seconds before a call is counted as timed out
+            ready_timeout: Seconds a session waits for its first successful call
+            server_log: Pass the spawned servers' stderr through
+            seed: Random seed for choosing calls
+        """
+        self.mix = mix
+        self.sessions = sessions
+        self.concurrency = concurrency
+        self.duration = duration
+        self.command = command or _default_command()
+        self.url = url
+        self.env = env or {}
+        self.call_timeout = call_timeout
+        self.ready_timeout = ready_timeout
+        self.server_log = server_log
+        self.seed = seed
+        self.stats = ServerStats()
+        self.startups: List[dict] = []
+        self._load_started: List[float] = []
+        self._load_ended: List[float] = []
+
+    @contextlib.asynccontextmanager
+    async def _connect(self) -> AsyncIterator[Tuple]:
+        """Open the read and write streams of one session."""
+        if self.url is not None:
+            from mcp.client.streamable_http import streamablehttp_client
+
+            async with streamablehttp_client(self.url) as (read, write, _):
+                yield read, write
+            return
+
+        params = StdioServerParameters(
+            command=self.command[0],
+            args=self.command[1:],
+            env={**os.environ, **self.env},
+        )
+        with contextlib.ExitStack() as stack:
+            errlog = sys.stderr if self.server_log else stack.enter_context(open(os.devnull, "w"))
+            async with stdio_client(params, errlog=errlog) as (read, write):
+                yield read, write
+
+    async def _first_success(self, session: ClientSession, library_name: str) -> List[str]:
+        """Call list_templates until it succeeds, which needs the library loaded.
+
+        Returns:
+            Template names of the library, to fill placeholders with
+        """
+        deadline = time.monotonic() + self.ready_timeout
+        while True:
+            result = await session.call_tool("list_templates", {"library_name": library_name, "limit": 200})
+            text = result.content[0].text if result.content else ""
+            if _outcome(text) == "ok":
+                return json.loads(text).get("templates", [])
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"No successful call within {self.ready_timeout:g}s: {text[:200]}")
+            await asyncio.sleep(0.1)
+
+    async def _call(self, session: ClientSession, rng: random.Random, templates: List[str]) -> None:
+        """Make one call from the mix and record it."""
+        entry = rng.choices(self.mix, weights=[e.get("weight", 1) for e in self.mix])[0]
+        arguments = _resolve(entry.get("arguments", {}), templates, rng)
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(session.call_tool(entry["tool"], arguments), self.call_timeout)
+            text = result.content[0].text if result.content else ""
+            outcome = "exception" if result.isError else _outcome(text)
+        except asyncio.TimeoutError:
+            text, outcome = "", "timeout"
+        self.stats.record(entry["tool"], time.perf_counter() - started, len(text.encode("utf-8")), outcome)
+
+    async def _run_session(self, number: int) -> None:
+        """Run one session: connect, wait for the first success, then replay the mix."""
+        rng = random.Random(self.seed + number)
+        library_name = next(
+            (e["arguments"]["library_name"] for e in self.mix if "library_name" in e.get("arguments", {})),
+            "brick",
+        )
+        spawned = time.perf_counter()
+        async with self._connect() as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                initialized = time.perf_counter()
+                await session.list_tools()
+                listed = time.perf_counter()
+                templates = await self._first_success(session, library_name)
+                ready = time.perf_counter()
+                self.startups.append({
+                    "session": number,
+                    "initialize_seconds": round(initialized - spawned, 4),
+                    "list_tools_seconds": round(listed - spawned, 4),
+                    "first_success_seconds": round(ready - spawned, 4),
+                })
+
+                self._load_started.append(ready)
+                deadline = ready + self.duration
+
+                async def worker() -> None:
+                    while time.perf_counter() < deadline:
+                        await self._call(session, rng, templates)
+
+                await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+                self._load_ended.append(time.perf_counter())
+
+    async def run(self) -> dict:
+        """Run every session to completion and summarize the results.
+
+        Returns:
+            dict with per-session startup timings, overall throughput and
+            per-tool counts, throughput and latency percentiles
+        """
+        results = await asyncio.gather(
+            *(self._run_session(number) for number in range(self.sessions)),
+            return_exceptions=True,
+        )
+        failures = [f"session {number}: {error!r}" for number, error in enumerate(results) if isinstance(error, BaseException)]
+        for failure in failures:
+            logger.error(f"Session failed: {failure}")
+
+        snapshot = self.stats.snapshot()
+        elapsed = max(self._load_ended) - min(self._load_started) if self._load_ended else 0.0
+        for tool in snapshot["tools"]:
+            tool["calls_per_second"] = round(tool["calls"] / elapsed, 2) if elapsed else None
+        first_success = [s["first_success_seconds"] for s in self.startups]
+        return {
+            "target": self.url or " ".join(self.command),
+            "sessions": self.sessions,
+            "concurrency": self.concurrency,
+            "duration": self.duration,
+            "failed_sessions": failures,
+            "startup": {
+                "first_success_seconds": {
+                    "min": min(first_success),
+                    "median": round(statistics.median(first_success), 4),
+                    "max": max(first_success),
+                } if first_success else None,
+                "sessions": sorted(self.startups, key=lambda s: s["session"]),
+            },
+            "elapsed_seconds": round(elapsed, 3),
+            "calls": snapshot["calls"],
+            "calls_per_second": round(snapshot["calls"] / elapsed, 2) if elapsed else None,
+            "tools": snapshot["tools"],
+        }
+
+
+def _print_report(report: dict) -> None:
+    """Print a load test report as a table."""
+    print(f"Target: {report['target']}")
+    print(f"{report['sessions']} session(s) x {report['concurrency']} in flight for {report['duration']:g}s")
+    startup = report["startup"]["first_success_seconds"]
+    if startup:
+        print(f"Time to first successful call: min {startup['min']:.2f}s, "
+              f"median {startup['median']:.2f}s, max {startup['max']:.2f}s")
+    print(f"{report['calls']} calls in {report['elapsed_seconds']:.1f}s ({report['calls_per_second']} calls/s)\n")
+    print(f"{'tool':26s} {'calls':>7s} {'err':>5s} {'calls/s':>8s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s} {'bytes':>8s}")
+    for tool in report["tools"]:
+        latency = tool["latency_ms"]
+        errors = tool["calls"] - tool["ok"]
+        print(f"{tool['tool']:26s} {tool['calls']:7d} {errors:5d} {tool['calls_per_second'] or 0:8.1f} "
+              f"{latency['p50']:9.2f} {latency['p95']:9.2f} {latency['p99']:9.2f} {latency['max']:9.2f} "
+              f"{tool['response_bytes']['mean']:8.0f}")
+    for failure in report["failed_sessions"]:
+        print(f"Failed: {failure}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(
+        description="Drive concurrent MCP sessions against a BuildingMOTIF MCP server and report latency per tool."
+    )
+    parser.add_argument("--sessions", type=int, default=1, help="Concurrent MCP sessions (default 1)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Calls each session keeps in flight (default 4)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load per session (default 30)")
+    parser.add_argument("--command", help="Server command to spawn per session (default: buildingmotif-mcp)")
+    parser.add_argument("--url", help="Connect to a running HTTP server (e.g. http://127.0.0.1:8765/mcp) instead")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Environment variable for spawned servers (repeatable)")
+    parser.add_argument("--mix", help="JSON file with a list of {tool, arguments, weight} calls")
+    parser.add_argument("--call-timeout", type=float, default=120.0, help="Seconds before a call times out (default 120)")
+    parser.add_argument("--ready-timeout", type=float, default=600.0,
+                        help="Seconds to wait for the first successful call (default 600)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default 0)")
+    parser.add_argument("--server-log", action="store_true", help="Show the spawned servers' logs")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    mix = DEFAULT_MIX
+    if args.mix:
+        with open(args.mix) as f:
+            mix = json.load(f)
+    env = dict(item.split("=", 1) for item in args.env if "=" in item)
+
+    generator = LoadGenerator(
+        mix,
+        sessions=max(1, args.sessions),
+        concurrency=max(1, args.concurrency),
+        duration=args.duration,
+        command=shlex.split(args.command) if args.command else None,
+        url=args.url,
+        env=env,
+        call_timeout=args.call_timeout,
+        ready_timeout=args.ready_timeout,
+        server_log=args.server_log,
+        seed=args.seed,
+    )
+    report = asyncio.run(generator.run())
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+    if report["failed_sessions"] or not report["calls"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
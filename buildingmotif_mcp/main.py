@@ -19,6 +19,30 @@ def setup_logging() -> None:
     )
 
 
+def _int_env(name: str, default: int, logger: logging.Logger, minimum: int = 1) -> int:
+    """Read an integer setting from the environment."""
+    value = os.getenv(name, "")
+    if not value:
+        return default
+    try:
+        return max(minimum, int(value))
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name} value: {value!r}")
+        return default
+
+
+def _float_env(name: str, default: float, logger: logging.Logger) -> float:
+    """Read a number of seconds from the environment."""
+    value = os.getenv(name, "")
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name} value: {value!r}")
+        return default
+
+
 def main() -> None:
     """Main entry point."""
     setup_logging()
@@ -33,9 +57,118 @@ def main() -> None:
         ontology_paths = [p.strip() for p in env_paths.split(":") if p.strip()]
         logger.info(f"Custom ontology paths from environment: {ontology_paths}")
 
+    # Persistent library cache; set BUILDINGMOTIF_CACHE_DIR=off to disable
+    cache_dir = os.getenv(
+        "BUILDINGMOTIF_CACHE_DIR",
+        str(Path.home() / ".cache" / "buildingmotif_mcp"),
+    )
+    if cache_dir.strip().lower() in {"", "off", "none", "0"}:
+        cache_dir = None
+        logger.info("Library cache disabled")
+
+    # Save templates with their dependencies inlined in the library cache
+    persist_templates = os.getenv("BUILDINGMOTIF_PERSIST_TEMPLATES", "1").strip().lower() in {"1", "true", "yes", "on"}
+
+    # Number of worker processes used to parse libraries at startup
+    load_workers = _int_env("BUILDINGMOTIF_LOAD_WORKERS", 1, logger)
+    if load_workers > 1:
+        logger.info(f"Parallel library loading with {load_workers} worker(s)")
+
+    # "background" loads libraries while the server is already answering,
+    # "lazy" loads each library on first use, "eager" loads all of them at startup
+    load_mode = os.getenv("BUILDINGMOTIF_LOAD_MODE", "background").strip().lower()
+    if load_mode not in {"background", "lazy", "eager"}:
+        logger.warning(f"Unknown BUILDINGMOTIF_LOAD_MODE {load_mode!r}, using 'background'")
+        load_mode = "background"
+
+    # Seconds a tool call waits for a library that is still loading
+    load_timeout = _float_env("BUILDINGMOTIF_LOAD_TIMEOUT", 20.0, logger)
+
+    # Byte budget for cached get_template_details responses
+    response_cache_bytes = _int_env("BUILDINGMOTIF_RESPONSE_CACHE_BYTES", 16 * 1024 * 1024, logger, minimum=0)
+
+    # Tool execution pool: worker threads, admitted calls and timeouts
+    tool_workers = _int_env("BUILDINGMOTIF_TOOL_WORKERS", 4, logger)
+    max_in_flight = _int_env("BUILDINGMOTIF_MAX_IN_FLIGHT", 2 * tool_workers, logger)
+    tool_timeout = _float_env("BUILDINGMOTIF_TOOL_TIMEOUT", 60.0, logger)
+    # Per-tool overrides, e.g. "get_template_details=30,list_templates=10"
+    tool_timeouts = {}
+    for item in os.getenv("BUILDINGMOTIF_TOOL_TIMEOUTS", "").split(","):
+        if not item.strip():
+            continue
+        tool_name, _, value = item.partition("=")
+        try:
+            tool_timeouts[tool_name.strip()] = float(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid BUILDINGMOTIF_TOOL_TIMEOUTS entry: {item!r}")
+
+    # Encode responses without indentation unless a call asks otherwise
+    compact_json = os.getenv("BUILDINGMOTIF_COMPACT_JSON", "").strip().lower() in {"1", "true", "yes", "on"}
+
+    # Reload libraries whose files change while the server runs
+    watch = os.getenv("BUILDINGMOTIF_WATCH", "").strip().lower() in {"1", "true", "yes", "on"}
+    watch_interval = _float_env("BUILDINGMOTIF_WATCH_INTERVAL", 1.0, logger)
+
+    # Memory budget for server-side models, in MiB (0 = no limit); the least
+    # recently used models beyond it are moved to disk until used again
+    model_memory_mb = _int_env("BUILDINGMOTIF_MODEL_MEMORY_MB", 1024, logger, minimum=0)
+    model_memory_bytes = model_memory_mb * 1024 * 1024 if model_memory_mb else None
+    model_spill_dir = os.getenv("BUILDINGMOTIF_MODEL_SPILL_DIR") or None
+
+    # Memory budget for loaded libraries, in MiB (0 = no limit); the least
+    # recently used libraries beyond it are unloaded until used again
+    library_memory_mb = _int_env("BUILDINGMOTIF_LIBRARY_MEMORY_MB", 0, logger, minimum=0)
+    library_memory_bytes = library_memory_mb * 1024 * 1024 if library_memory_mb else None
+
+    # SPARQL queries: seconds before a query is stopped, and the largest page of rows
+    query_timeout = _float_env("BUILDINGMOTIF_QUERY_TIMEOUT", 10.0, logger)
+    query_max_rows = _int_env("BUILDINGMOTIF_QUERY_MAX_ROWS", 1000, logger)
+
+    # Seconds between JSON dumps of server_stats (0 = off), to stderr or a file
+    stats_interval = _float_env("BUILDINGMOTIF_STATS_INTERVAL", 0.0, logger)
+    stats_file = os.getenv("BUILDINGMOTIF_STATS_FILE", "").strip()
+    if stats_file in {"", "-"}:
+        stats_file = None
+
+    # "stdio" (default) serves one client; "http" serves many clients from one process
+    transport = os.getenv("BUILDINGMOTIF_TRANSPORT", "stdio").strip().lower()
+    if transport not in {"stdio", "http"}:
+        logger.warning(f"Unknown BUILDINGMOTIF_TRANSPORT {transport!r}, using 'stdio'")
+        transport = "stdio"
+
     try:
-        server = BuildingMOTIFServer(ontology_paths=ontology_paths)
-        asyncio.run(server.run())
+        server = BuildingMOTIFServer(
+            ontology_paths=ontology_paths,
+            cache_dir=cache_dir,
+            load_workers=load_workers,
+            load_mode=load_mode,
+            load_timeout=load_timeout,
+            response_cache_bytes=response_cache_bytes,
+            tool_workers=tool_workers,
+            max_in_flight=max_in_flight,
+            tool_timeout=tool_timeout,
+            tool_timeouts=tool_timeouts,
+            compact_json=compact_json,
+            watch=watch,
+            watch_interval=watch_interval,
+            model_memory_bytes=model_memory_bytes,
+            model_spill_dir=model_spill_dir,
+            query_timeout=query_timeout,
+            query_max_rows=query_max_rows,
+            persist_templates=persist_templates,
+            stats_interval=stats_interval,
+            stats_file=stats_file,
+            library_memory_bytes=library_memory_bytes,
+        )
+        if transport == "http":
+            asyncio.run(server.run_http(
+                host=os.getenv("BUILDINGMOTIF_HTTP_HOST", "127.0.0.1"),
+                port=_int_env("BUILDINGMOTIF_HTTP_PORT", 8765, logger),
+                uds=os.getenv("BUILDINGMOTIF_HTTP_SOCKET") or None,
+                max_connections=_int_env("BUILDINGMOTIF_MAX_CONNECTIONS", 64, logger),
+            ))
+        else:
+            asyncio.run(server.run())
     except KeyboardInterrupt:
         logger.info("Server interrupted by user")
     except Exception as e:
@@ -0,0 +1,427 @@
+"""Server-side model sessions for BuildingMOTIF MCP."""
+
+import json
+import logging
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from rdflib import RDF, BNode, Graph, Literal, URIRef
+from rdflib.term import Node
+
+from buildingmotif_mcp.evaluate import Triple, ntriples_term, write_ntriples
+from buildingmotif_mcp.validation import ValidationState
+
+logger = logging.getLogger(__name__)
+
+# Memory held by rdflib's in-memory store per triple, including its terms,
+# as measured for typical Brick models
+ESTIMATED_BYTES_PER_TRIPLE = 1300
+
+
+class _KeepBNodeIds(dict):
+    """N-Triples parser blank node context that keeps the ids from the file.
+
+    The parser normally gives every _:label a fresh blank node. Sessions
+    written to disk must come back with the same blank nodes, since their
+    validation reports refer to them.
+    """
+
+    def get(self, key, default=None):
+        return key
+
+
+def _parse_node(text: str) -> Node:
+    """Read back a node written with ntriples_term; only IRIs and blank nodes are expected."""
+    if text.startswith("_:"):
+        return BNode(text[2:])
+    return URIRef(text[1:-1])
+
+
+class ModelSession:
+    """A model being built up across tool calls.
+
+    Besides the graph, a session remembers its last validation report and
+    the nodes touched since then, so the next validation can be incremental.
+    A session evicted from memory has no graph until it is loaded again.
+    """
+
+    def __init__(self, model_id: str):
+        """Initialize an empty model.
+
+        Args:
+            model_id: Identifier clients use to refer to the model
+        """
+        self.model_id = model_id
+        self.graph: Optional[Graph] = Graph()
+        self.validation: Optional[ValidationState] = None
+        self.touched: Set[Node] = set()
+        self.created = time.time()
+        self.last_access = self.created
+        # Triple count, kept while the graph is on disk
+        self.triples = 0
+        # Held while the model is read or changed
+        self.lock = threading.RLock()
+
+    @property
+    def resident(self) -> bool:
+        """True if the model's graph is in memory."""
+        return self.graph is not None
+
+    @property
+    def estimated_bytes(self) -> int:
+        """Estimated memory held by the model's graph; 0 while it is on disk."""
+        return len(self.graph) * ESTIMATED_BYTES_PER_TRIPLE if self.graph is not None else 0
+
+    def add(self, graph: Graph) -> int:
+        """Add the triples of a graph to the model.
+
+        Args:
+            graph: Triples to add
+
+        Returns:
+            Number of triples that were not already in the model
+        """
+        return self.add_triples(graph, graph.namespaces())
+
+    def add_triples(self, triples, namespaces=()) -> int:
+        """Add triples to the model.
+
+        Args:
+            triples: Iterable of (subject, predicate, object)
+            namespaces: Optional (prefix, namespace) pairs to bind
+
+        Returns:
+            Number of triples that were not already in the model
+        """
+        with self.lock:
+            before = len(self.graph)
+            for s, p, o in triples:
+                self.graph.add((s, p, o))
+                self.touched.add(s)
+                # A class gains an instance; that does not change the class's own validation
+                if p != RDF.type and not isinstance(o, Literal):
+                    self.touched.add(o)
+            for prefix, namespace in namespaces:
+                self.graph.bind(prefix, namespace, override=False)
+            self.triples = len(self.graph)
+            self.last_access = time.time()
+            return self.triples - before
+
+    def spill(self, directory: Path) -> int:
+        """Write the model to disk and release its graph.
+
+        The graph goes to <model_id>.nt and the namespaces, validation report
+        and touched nodes to <model_id>.json.
+
+        Args:
+            directory: Directory for the files
+
+        Returns:
+            Bytes written
+        """
+        with self.lock:
+            nt_path, meta_path = self._paths(directory)
+            with open(nt_path, "w", encoding="utf-8") as out:
+                write_ntriples(out, self.graph)
+            meta = {
+                "namespaces": [[prefix, str(ns)] for prefix, ns in self.graph.namespaces()],
+                "touched": [ntriples_term(node) for node in self.touched],
+                "validation": None,
+            }
+            if self.validation is not None:
+                meta["validation"] = {
+                    "shapes_key": self.validation.shapes_key,
+                    "results": self.validation.results,
+                }
+            meta_path.write_text(json.dumps(meta))
+            self.triples = len(self.graph)
+            self.graph = None
+            self.validation = None
+            self.touched = set()
+            return nt_path.stat().st_size + meta_path.stat().st_size
+
+    def load(self, directory: Path) -> None:
+        """Read a spilled model back into memory and remove its files.
+
+        Args:
+            directory: Directory the model was spilled to
+        """
+        with self.lock:
+            nt_path, meta_path = self._paths(directory)
+            meta = json.loads(meta_path.read_text())
+            graph = Graph(bind_namespaces="none")
+            graph.parse(nt_path, format="nt", bnode_context=_KeepBNodeIds())
+            for prefix, namespace in meta["namespaces"]:
+                graph.bind(prefix, namespace)
+            self.touched = {_parse_node(text) for text in meta["touched"]}
+            validation = meta["validation"]
+            if validation is not None:
+                shapes_key = tuple(tuple(item) for item in validation["shapes_key"])
+                self.validation = ValidationState(shapes_key, validation["results"])
+            self.graph = graph
+            self.triples = len(graph)
+            nt_path.unlink()
+            meta_path.unlink()
+
+    def iter_spilled(self, directory: Path, chunk_lines: int = 10000) -> Iterator[Triple]:
+        """Read the triples of a spilled model from disk, without loading the whole graph.
+
+        The caller holds the session lock, so the files stay in place.
+
+        Args:
+            directory: Directory the model was spilled to
+            chunk_lines: Lines parsed at a time
+
+        Yields:
+            (subject, predicate, object) triples
+        """
+        nt_path, _ = self._paths(directory)
+        with open(nt_path, "r", encoding="utf-8") as lines:
+            while True:
+                chunk = "".join(islice(lines, chunk_lines))
+                if not chunk:
+                    return
+                graph = Graph(bind_namespaces="none")
+                graph.parse(data=chunk, format="nt", bnode_context=_KeepBNodeIds())
+                yield from graph
+
+    def spilled_bytes(self, directory: Optional[Path]) -> int:
+        """Size of the model's files on disk, 0 if it is in memory."""
+        if self.graph is not None or directory is None:
+            return 0
+        return sum(path.stat().st_size for path in self._paths(directory) if path.exists())
+
+    def _paths(self, directory: Path):
+        """The graph and metadata file of this model in a spill directory."""
+        return directory / f"{self.model_id}.nt", directory / f"{self.model_id}.json"
+
+
+class ModelStore:
+    """The model sessions held by the server, by id.
+
+    With a memory budget, the least recently used models are written to
+    disk when the estimated size of the models in memory exceeds it, and
+    read back the next time they are used.
+    """
+
+    def __init__(self, memory_budget: Optional[int] = None, spill_dir: Optional[str] = None):
+        """Initialize an empty store.
+
+        Args:
+            memory_budget: Bytes of model graphs to keep in memory (default: no limit)
+            spill_dir: Directory for evicted models (default: a temporary
+                directory created on first eviction and removed by close())
+        """
+        self._models: Dict[str, ModelSession] = {}
+        self._lock = threading.Lock()
+        self.memory_budget = memory_budget
+        self._spill_dir = Path(spill_dir).expanduser() if spill_dir else None
+        self._owns_spill_dir = False
+        self.evictions = 0
+        self.rehydrations = 0
+
+    def create(self, model_id: Optional[str] = None) -> ModelSession:
+        """Create a model session.
+
+        Args:
+            model_id: Identifier to use (default: a generated one)
+
+        Returns:
+            The new session
+
+        Raises:
+            ValueError: If a model with this id already exists or is not a valid file name
+        """
+        model_id = model_id or uuid.uuid4().hex[:12]
+        if Path(model_id).name != model_id or model_id.startswith("."):
+            raise ValueError(f"Invalid model id '{model_id}'")
+        with self._lock:
+            if model_id in self._models:
+                raise ValueError(f"Model '{model_id}' already exists")
+            session = ModelSession(model_id)
+            self._models[model_id] = session
+        logger.info(f"Created model '{model_id}'")
+        return session
+
+    def get(self, model_id: str) -> Optional[ModelSession]:
+        """Return a model session, or None if there is none with this id.
+
+        The session may be on disk; use checkout to work with its graph.
+        """
+        return self._models.get(model_id)
+
+    @contextmanager
+    def checkout(self, model_id: str) -> Iterator[Optional[ModelSession]]:
+        """Use a model with its graph in memory.
+
+        The session is locked for the duration, so it cannot be evicted
+        while in use. Afterwards other models are evicted if the store is
+        over its memory budget.
+
+        Args:
+            model_id: Identifier of the model
+
+        Yields:
+            The session, or None if there is none with this id
+
+        Raises:
+            ValueError: If the model is deleted while waiting for its lock
+        """
+        session = self._models.get(model_id)
+        if session is None:
+            yield None
+            return
+        with session.lock:
+            self._check_current(session)
+            if not session.resident:
+                started = time.perf_counter()
+                session.load(self._spill_dir)
+                self.rehydrations += 1
+                logger.info(
+                    f"Loaded model '{model_id}' from disk ({session.triples} triples) "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+            session.last_access = time.time()
+            yield session
+        self.enforce_budget(keep=session)
+
+    @contextmanager
+    def reading(self, model_id: str) -> Iterator[Optional[Tuple[ModelSession, Iterable[Triple]]]]:
+        """Read a model's triples without moving it into memory.
+
+        A model in memory yields its graph; a model on disk is read from its
+        spill file a chunk at a time. The session is locked for the duration.
+
+        Args:
+            model_id: Identifier of the model
+
+        Yields:
+            The session and an iterable of its triples, or None if there is
+            no model with this id
+
+        Raises:
+            ValueError: If the model is deleted while waiting for its lock
+        """
+        session = self._models.get(model_id)
+        if session is None:
+            yield None
+            return
+        with session.lock:
+            self._check_current(session)
+            if session.resident:
+                session.last_access = time.time()
+                yield session, session.graph
+            else:
+                yield session, session.iter_spilled(self._spill_dir)
+
+    def _check_current(self, session: ModelSession) -> None:
+        """Make sure a session just locked was not deleted while waiting for its lock."""
+        if self._models.get(session.model_id) is not session:
+            raise ValueError(f"Model '{session.model_id}' was deleted while this call was waiting for it")
+
+    def spill_file(self, session: ModelSession) -> Optional[Path]:
+        """The N-Triples file of a model on disk, or None if it is in memory."""
+        if session.resident or self._spill_dir is None:
+            return None
+        return session._paths(self._spill_dir)[0]
+
+    def enforce_budget(self, keep: Optional[ModelSession] = None) -> None:
+        """Evict the least recently used models until the rest fit the memory budget.
+
+        Models in use by another call are skipped.
+
+        Args:
+            keep: A model to keep in memory even if it alone exceeds the
+                budget, normally the one just used
+        """
+        if self.memory_budget is None:
+            return
+        resident = sorted(
+            (session for session in self._sessions() if session.resident),
+            key=lambda session: session.last_access,
+        )
+        total = sum(session.estimated_bytes for session in resident)
+        for session in resident:
+            if total <= self.memory_budget:
+                break
+            if session is keep:
+                continue
+            if not session.lock.acquire(blocking=False):
+                continue
+            try:
+                if not session.resident or self._models.get(session.model_id) is not session:
+                    continue
+                size = session.estimated_bytes
+                written = session.spill(self._get_spill_dir())
+                total -= size
+                self.evictions += 1
+                logger.info(f"Evicted model '{session.model_id}' to disk ({session.triples} triples, {written} bytes)")
+            finally:
+                session.lock.release()
+
+    def delete(self, model_id: str) -> bool:
+        """Drop a model session and its files; returns False if it did not exist."""
+        with self._lock:
+            session = self._models.pop(model_id, None)
+        if session is None:
+            return False
+        with session.lock:
+            if not session.resident and self._spill_dir is not None:
+                for path in session._paths(self._spill_dir):
+                    path.unlink(missing_ok=True)
+            session.graph = None
+        logger.info(f"Deleted model '{model_id}'")
+        return True
+
+    def list(self) -> List[str]:
+        """Ids of all model sessions."""
+        with self._lock:
+            return list(self._models)
+
+    def _sessions(self) -> List[ModelSession]:
+        """Snapshot of all sessions, safe to iterate while models are created or deleted."""
+        with self._lock:
+            return list(self._models.values())
+
+    def stats(self) -> dict:
+        """Size and residency of every model, and totals against the budget."""
+        models = []
+        for session in self._sessions():
+            # Read the graph once: another call may spill the model meanwhile
+            graph = session.graph
+            models.append({
+                "model_id": session.model_id,
+                "triples": len(graph) if graph is not None else session.triples,
+                "resident": graph is not None,
+                "resident_bytes": len(graph) * ESTIMATED_BYTES_PER_TRIPLE if graph is not None else 0,
+                "spilled_bytes": session.spilled_bytes(self._spill_dir),
+                "created": session.created,
+                "last_access": session.last_access,
+            })
+        return {
+            "models": models,
+            "resident_bytes": sum(m["resident_bytes"] for m in models),
+            "memory_budget": self.memory_budget,
+            "evictions": self.evictions,
+            "rehydrations": self.rehydrations,
+        }
+
+    def close(self) -> None:
+        """Remove the temporary spill directory, if one was created."""
+        if self._owns_spill_dir and self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+    def _get_spill_dir(self) -> Path:
+        """The spill directory, created if needed."""
+        if self._spill_dir is None:
+            self._spill_dir = Path(tempfile.mkdtemp(prefix="buildingmotif_models_"))
+            self._owns_spill_dir = True
+        self._spill_dir.mkdir(parents=True, exist_ok=True)
+        return self._spill_dir
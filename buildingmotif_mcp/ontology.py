@@ -1,31 +1,213 @@
 """Ontology and library management for BuildingMOTIF MCP."""
 
+import io
+import multiprocessing
 import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import logging
 import json
 
+import rdflib
+from rdflib.util import guess_format
 from buildingmotif import BuildingMOTIF
-from buildingmotif.dataclasses import Library
+from buildingmotif.dataclasses import Library, Template
+from buildingmotif.database.errors import LibraryNotFound
+
+from buildingmotif_mcp.cache import LibraryCache
+from buildingmotif_mcp.evaluate import CompiledTemplate, write_ntriples
+from buildingmotif_mcp.hierarchy import ClassHierarchy
+from buildingmotif_mcp.index import TemplateIndex
+from buildingmotif_mcp.models import ESTIMATED_BYTES_PER_TRIPLE
+from buildingmotif_mcp.search import SearchIndex, extract_classes
 
 logger = logging.getLogger(__name__)
 
+# Database name given to the previous version of a library while its
+# replacement is stored under the library's own name, followed by its id
+_PARKED_PREFIX = "urn:buildingmotif-mcp:replaced:"
+
+# Graphs of a deleted library removed per database lock hold
+_DELETE_BATCH = 100
+
+
+def _approximate_size(*objects) -> int:
+    """Estimate the bytes held by objects and everything they reference.
+
+    Containers and instance dictionaries are followed; objects shared between
+    them are counted once.
+    """
+    seen = set()
+    stack = list(objects)
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, (str, bytes, int, float)):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+    return total
+
+
+def _ontology_files(directory: Path) -> List[Path]:
+    """List the ontology files directly inside a directory."""
+    return list(directory.glob("*.ttl")) + list(directory.glob("*.rdf")) + list(directory.glob("*.owl"))
+
+
+@dataclass
+class LibrarySource:
+    """A library found during discovery, before it is loaded."""
+
+    name: str
+    path: Path
+    ontology_files: List[Path]
+
+    @property
+    def load_target(self) -> Path:
+        """File or directory handed to Library.load."""
+        # If there's only one file, load it directly; otherwise load the whole directory
+        return self.ontology_files[0] if len(self.ontology_files) == 1 else self.path
+
+
+def _prepare_ontology_graph(source: str, shacl_engine: str) -> rdflib.Graph:
+    """Parse an ontology and run SHACL inference on it.
+
+    This is the part of Library.load that does not touch the database, so it
+    can run in a worker process during parallel loading.
+
+    Args:
+        source: Path to the ontology file
+        shacl_engine: SHACL engine name used by the parent's BuildingMOTIF
+
+    Returns:
+        The expanded ontology graph
+    """
+    from buildingmotif.utils import shacl_inference
+
+    graph = rdflib.Graph()
+    graph.parse(source, format=guess_format(source))
+    return shacl_inference(graph, engine=shacl_engine)
+
 
 class OntologyManager:
     """Manages loading and accessing BuildingMOTIF libraries and ontologies."""
 
-    def __init__(self, db_url: str = "sqlite://", ontology_paths: Optional[List[str]] = None):
+    def __init__(
+        self,
+        db_url: str = "sqlite://",
+        ontology_paths: Optional[List[str]] = None,
+        cache_dir: Optional[str] = None,
+        load_workers: int = 1,
+        lazy: bool = True,
+        persist_templates: bool = True,
+        memory_budget: Optional[int] = None,
+    ):
         """Initialize the ontology manager.
 
         Args:
-            db_url: BuildingMOTIF database URL (default: in-memory SQLite)
+            db_url: BuildingMOTIF database URL (default: a private temporary
+                SQLite file, since BuildingMOTIF's in-memory SQLite database is
+                only visible to the thread that created it)
             ontology_paths: List of paths to ontology directories/files to load
+            cache_dir: Optional directory for the persistent library cache. When
+                set and db_url is left at its default, libraries are stored in an
+                on-disk database and reused on later starts if unchanged.
+            load_workers: Number of worker processes used to parse libraries
+                concurrently at startup (1 loads everything serially)
+            lazy: If True, only discover libraries here and load each one on
+                first use; if False, load all of them before returning
+            persist_templates: Save templates with their dependencies inlined
+                in the library cache, so later runs skip inlining them
+            memory_budget: Estimated bytes of loaded libraries to keep in
+                memory; least recently used libraries beyond it are unloaded
+                and reopened on next use (default: no limit)
         """
+        self.cache = LibraryCache(cache_dir) if cache_dir else None
+        self._tmpdir: Optional[tempfile.TemporaryDirectory] = None
+        if db_url == "sqlite://":
+            if self.cache is not None:
+                db_url = self.cache.db_url
+            else:
+                # Libraries are loaded from background threads, so use a file
+                self._tmpdir = tempfile.TemporaryDirectory(prefix="buildingmotif_mcp-")
+                db_url = f"sqlite:///{Path(self._tmpdir.name) / 'libraries.db'}"
         self.bm = BuildingMOTIF(db_url)
+        # Only in-memory databases get their tables created automatically
+        self.bm.setup_tables()
+        if self.bm.engine.dialect.name == "sqlite":
+            # Let readers proceed while a library is being written
+            with self.bm.engine.connect() as conn:
+                conn.exec_driver_sql("PRAGMA journal_mode=WAL")
         self.libraries: Dict[str, Library] = {}
         self.library_metadata: Dict[str, dict] = {}
+        self.library_sources: Dict[str, LibrarySource] = {}
+        self.template_indexes: Dict[str, TemplateIndex] = {}
+        self.search_indexes: Dict[str, SearchIndex] = {}
+        self.class_hierarchies: Dict[str, ClassHierarchy] = {}
+        # Classes of each library with their labels, definitions and tags
+        self.library_classes: Dict[str, List[dict]] = {}
+        # In-memory copies of merged library graphs, keyed by (name, version) pairs
+        self._shapes_graphs: Dict[tuple, rdflib.Graph] = {}
+        # Bumped every time a library is (re)loaded; caches key on it
+        self.library_versions: Dict[str, int] = {}
+        # Templates with their dependencies inlined, by (library, template), with
+        # the library versions they were compiled from and the seconds it took
+        self._compiled_templates: Dict[Tuple[str, str], Tuple[tuple, CompiledTemplate, float]] = {}
+        self._compiled_lock = threading.Lock()
+        self.persist_templates = persist_templates
+        self.template_cache_stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "compile_seconds": 0.0,
+            "saved_seconds": 0.0,
+        }
+        self.load_errors: Dict[str, str] = {}
+        # Libraries unloaded to save memory, with their database ids to reopen them from
+        self.unloaded: Dict[str, int] = {}
+        self.memory_budget = memory_budget
+        self.unloads = 0
+        # When each library was last used, for unloading the least recently used
+        self._last_used: Dict[str, float] = {}
+        # Measured size of each library's indexes, with the version it was measured at
+        self._index_bytes: Dict[str, Tuple[int, int]] = {}
+        # Timings of each library's last load, and of the startup phases, in seconds
+        self.library_stats: Dict[str, dict] = {}
+        self.startup_stats: Dict[str, float] = {}
+        self._created = time.perf_counter()
         self.ontology_paths = ontology_paths or []
+        self.load_workers = max(1, load_workers)
+        # Parsed graphs being prepared by worker processes, keyed by library name
+        self._prepared: Dict[str, Future] = {}
+        # Libraries stored from their sources but not published yet, with
+        # what to delete or restore afterwards, see _store_library
+        self._pending_swaps: Dict[str, dict] = {}
+        # One lock per library so concurrent first uses load it only once, and
+        # one for the BuildingMOTIF database, which takes a single writer
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._db_lock = threading.RLock()
+        # The one background run of load_all at a time, and when it finishes
+        self._background_thread: Optional[threading.Thread] = None
+        self._background_done = threading.Event()
+        self._background_lock = threading.Lock()
+        # Configured ontology paths found missing, see iter_library_paths
+        self._missing_paths: Set[Path] = set()
 
         # Always add bundled ontologies - handle both dev and installed scenarios
         ontologies_found = False
@@ -76,31 +258,244 @@ class OntologyManager:
             logger.warning("No bundled ontologies found. Some ontology loading may fail.")
 
         logger.info(f"Ontology search paths: {self.ontology_paths}")
-        self._load_ontologies()
+        started = time.perf_counter()
+        self._discover_libraries()
+        self.startup_stats["discover_seconds"] = round(time.perf_counter() - started, 4)
+        logger.info(f"Discovered {len(self.library_sources)} libraries: {list(self.library_sources)}")
+
+        if not lazy:
+            self.load_all()
+
+    def _discover_libraries(self) -> None:
+        """Register every library under the configured paths without loading it.
+
+        Only directory listings and `.metadata` sidecars are read here.
+        """
+        for path in self.iter_library_paths():
+            source = self.make_source(path)
+            self.library_sources[source.name] = source
+            self.library_metadata[source.name] = self._load_metadata(source.ontology_files[0])
+            self._load_locks.setdefault(source.name, threading.Lock())
+
+    @staticmethod
+    def make_source(path: Path) -> LibrarySource:
+        """Describe the library formed by a directory or ontology file."""
+        if path.is_dir():
+            return LibrarySource(name=path.name, path=path, ontology_files=_ontology_files(path))
+        return LibrarySource(name=path.stem, path=path, ontology_files=[path])
+
+    def load_all(self) -> None:
+        """Load every discovered library that has not been loaded yet."""
+        started = time.perf_counter()
+        pending = [source for name, source in self.library_sources.items() if not self.is_ready(name)]
+
+        if self.load_workers > 1 and len(pending) > 1:
+            logger.info(f"Loading {len(pending)} libraries with {self.load_workers} worker processes")
+            # Spawn rather than fork: this process has threads by now, and a
+            # forked child could inherit a lock one of them holds
+            mp_context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=self.load_workers, mp_context=mp_context) as pool:
+                self._submit_prepare_jobs(pool, pending)
+                for source in pending:
+                    self._ensure_loaded(source.name)
+            self._prepared.clear()
+        else:
+            for source in pending:
+                self._ensure_loaded(source.name)
+
+        if self.cache is not None:
+            self._prune_cache()
+            logger.info(self.cache.summary())
+        self.startup_stats.setdefault("load_all_seconds", round(time.perf_counter() - started, 4))
+        if not self.loading_status()["pending"]:
+            self.startup_stats.setdefault("ready_seconds", round(time.perf_counter() - self._created, 4))
+
+    def _prune_cache(self) -> None:
+        """Delete cached libraries that are not among the discovered ones any more.
+
+        Their manifest entries and artifacts are dropped, and their copies
+        in the cache database deleted, along with any library there that
+        nothing refers to, such as a copy left by a reload that crashed.
+        """
+        with self._db_lock:
+            removed = [name for name in self.cache.manifest if name not in self.library_sources]
+            for name in removed:
+                logger.info(f"Dropping library '{name}' from the cache; its files are gone")
+                self.cache.forget(name)
+            if removed:
+                self.cache.save()
+            in_use = {entry["db_id"] for entry in self.cache.manifest.values()}
+            in_use |= {lib.id for lib in self.libraries.values()} | set(self.unloaded.values())
+            for swap in self._pending_swaps.values():
+                in_use |= {swap["new"], swap["parked"][0] if swap["parked"] else None}
+            with self.database():
+                orphans = [lib.id for lib in self.bm.table_connection.get_all_db_libraries() if lib.id not in in_use]
+        for db_id in orphans:
+            try:
+                self._delete_db_library(db_id)
+                logger.info(f"Deleted unused library {db_id} from the cache database")
+            except Exception as e:
+                logger.warning(f"Could not delete unused library {db_id} from the cache database: {e}")
+
+    def _ensure_loaded(self, library_name: str) -> Optional[Library]:
+        """Load a discovered library on first use.
+
+        Args:
+            library_name: Name of the library
 
-    def _load_ontologies(self) -> None:
-        """Load all ontologies from configured paths."""
+        Returns:
+            The Library, or None if it is unknown or failed to load
+        """
+        lib = self.libraries.get(library_name)
+        if lib is not None:
+            self._last_used[library_name] = time.monotonic()
+            return lib
+
+        source = self.library_sources.get(library_name)
+        if source is None:
+            return None
+
+        with self._load_locks[library_name]:
+            # Another caller may have finished loading while we waited
+            if library_name not in self.libraries and library_name not in self.load_errors:
+                if library_name in self.unloaded:
+                    self._reopen_library(library_name)
+                if library_name not in self.libraries:
+                    if source.path.is_dir():
+                        self._load_from_directory(source.path)
+                    else:
+                        self._load_file(source.path)
+        lib = self.libraries.get(library_name)
+        if lib is not None:
+            self._last_used[library_name] = time.monotonic()
+            self._enforce_memory_budget(keep=[library_name])
+        return lib
+
+    @contextmanager
+    def database(self) -> Iterator[None]:
+        """Serialize a block of BuildingMOTIF database access across threads.
+
+        Even reading a template body writes namespace bindings through
+        rdflib-sqlalchemy, so every access takes the database lock, and the
+        calling thread's session is committed afterwards so that it never
+        keeps SQLite's write lock.
+        """
+        with self._db_lock:
+            try:
+                yield
+                self.bm.session.commit()
+            except BaseException:
+                self.bm.session.rollback()
+                raise
+
+    def is_loaded(self, library_name: str) -> bool:
+        """Return True if a library has been loaded."""
+        return library_name in self.libraries
+
+    def is_ready(self, library_name: str) -> bool:
+        """Return True if a library has finished loading, successfully or not.
+
+        An unloaded library counts as ready, since it is reopened on use.
+        """
+        return library_name in self.libraries or library_name in self.load_errors or library_name in self.unloaded
+
+    def start_background_load(self) -> threading.Event:
+        """Load all discovered libraries in a daemon thread.
+
+        Callers can keep serving requests meanwhile; get_library on a library
+        that is not loaded yet loads it directly instead of waiting its turn.
+        Only one background load runs at a time: while one is running, or
+        when no library is pending, this starts nothing.
+
+        Returns:
+            An event set once the current background load has finished
+        """
+        with self._background_lock:
+            running = self._background_thread is not None and self._background_thread.is_alive()
+            if running or not self.loading_status()["pending"]:
+                if not running:
+                    self._background_done.set()
+                return self._background_done
+            self._background_done = threading.Event()
+            self._background_thread = threading.Thread(
+                target=self._background_load, args=(self._background_done,), name="library-loader", daemon=True
+            )
+            self._background_thread.start()
+            return self._background_done
+
+    def _background_load(self, done: threading.Event) -> None:
+        """Body of the background loading thread."""
+        try:
+            self.load_all()
+        except Exception:
+            logger.exception("Background library loading failed")
+        finally:
+            # Release this thread's database session
+            self.bm.Session.remove()
+            done.set()
+
+    def loading_status(self) -> dict:
+        """Summarize how many libraries are ready.
+
+        Returns:
+            Dictionary with ready/loaded/failed/total counts and pending names
+        """
+        pending = [name for name in self.library_sources if not self.is_ready(name)]
+        return {
+            "ready": len(self.library_sources) - len(pending),
+            "total": len(self.library_sources),
+            "loaded": len(self.libraries),
+            "unloaded": len(self.unloaded),
+            "failed": len(self.load_errors),
+            "pending": pending,
+        }
+
+    def iter_library_paths(self) -> Iterator[Path]:
+        """Yield the directories and files under the configured paths that form libraries.
+
+        A configured path that does not exist is logged when it is first
+        found missing and again when it comes back, not on every call.
+        """
         for path_str in self.ontology_paths:
             path = Path(path_str)
             if not path.exists():
-                logger.warning(f"Ontology path does not exist: {path}")
+                if path not in self._missing_paths:
+                    self._missing_paths.add(path)
+                    logger.warning(f"Ontology path does not exist: {path}")
                 continue
+            if path in self._missing_paths:
+                self._missing_paths.discard(path)
+                logger.info(f"Ontology path exists again: {path}")
 
             if path.is_dir():
                 # Check if this directory contains TTL files directly
-                ttl_files = list(path.glob("*.ttl")) + list(path.glob("*.rdf")) + list(path.glob("*.owl"))
-                if ttl_files:
+                if _ontology_files(path):
                     # Directory contains ontology files
-                    self._load_from_directory(path)
+                    yield path
                 else:
                     # Check subdirectories
                     for subdir in path.iterdir():
-                        if subdir.is_dir():
-                            sub_ttl_files = list(subdir.glob("*.ttl")) + list(subdir.glob("*.rdf")) + list(subdir.glob("*.owl"))
-                            if sub_ttl_files:
-                                self._load_from_directory(subdir)
+                        if subdir.is_dir() and _ontology_files(subdir):
+                            yield subdir
             elif path.suffix.lower() in {".ttl", ".rdf", ".owl"}:
-                self._load_file(path)
+                yield path
+
+    def _submit_prepare_jobs(self, pool: ProcessPoolExecutor, sources: List[LibrarySource]) -> None:
+        """Start parsing every library that is not already cached in the worker pool.
+
+        Registration in the BuildingMOTIF database still happens in this
+        process (BuildingMOTIF is a per-process singleton), in configuration
+        order, as each parsed graph becomes available.
+        """
+        for source in sources:
+            if self.cache is not None:
+                content_hash = self.cache.compute_hash(source.ontology_files)
+                if self.cache.lookup(source.name, content_hash) is not None:
+                    continue
+
+            self._prepared[source.name] = pool.submit(
+                _prepare_ontology_graph, str(source.load_target), self.bm.shacl_engine
+            )
 
     def _load_from_directory(self, directory: Path) -> None:
         """Load all ontology files from a directory.
@@ -112,7 +507,7 @@ class OntologyManager:
         logger.info(f"Loading ontologies from directory: {directory} (name: {library_name})")
 
         # Find ontology files
-        ontology_files = list(directory.glob("*.ttl")) + list(directory.glob("*.rdf")) + list(directory.glob("*.owl"))
+        ontology_files = _ontology_files(directory)
         
         if not ontology_files:
             logger.warning(f"No ontology files found in {directory}")
@@ -121,21 +516,20 @@ class OntologyManager:
         try:
             # If there's only one file, load it directly; otherwise load the whole directory
             if len(ontology_files) == 1:
-                lib = Library.load(ontology_graph=str(ontology_files[0]))
+                lib, graph = self._load_library(library_name, ontology_files[0], ontology_files)
                 file_for_metadata = ontology_files[0]
             else:
-                lib = Library.load(ontology_graph=str(directory))
+                lib, graph = self._load_library(library_name, directory, ontology_files)
                 file_for_metadata = ontology_files[0]
             
-            self.libraries[library_name] = lib
-            
             # Load metadata if available
             metadata = self._load_metadata(file_for_metadata)
             self.library_metadata[library_name] = metadata
             
-            logger.info(f"Loaded library '{library_name}' with {len(lib.get_templates())} templates")
+            self._register_loaded(library_name, lib, graph=graph)
         except Exception as e:
             logger.error(f"Error loading library from {directory}: {e}")
+            self.load_errors[library_name] = str(e)
 
     def _load_file(self, file_path: Path) -> None:
         """Load a single ontology file.
@@ -147,16 +541,515 @@ class OntologyManager:
         logger.info(f"Loading ontology file: {file_path}")
 
         try:
-            lib = Library.load(ontology_graph=str(file_path))
+            lib, graph = self._load_library(library_name, file_path, [file_path])
             
             # Load metadata if available
             metadata = self._load_metadata(file_path)
             self.library_metadata[library_name] = metadata
             
-            self.libraries[library_name] = lib
-            logger.info(f"Loaded library '{library_name}' with {len(lib.get_templates())} templates")
+            self._register_loaded(library_name, lib, graph=graph)
         except Exception as e:
             logger.error(f"Error loading ontology from {file_path}: {e}")
+            self.load_errors[library_name] = str(e)
+
+    def reload_library(self, path: Path) -> bool:
+        """Load a library again after its files changed, or add a new one.
+
+        A library that was discovered but never loaded is left to load on
+        first use. For a loaded library, the new version is parsed and
+        indexed while the old one keeps being served, and is stored in the
+        database next to it. The database lock is only taken to store the
+        new version and, once its indexes are ready, to publish it and
+        delete the old one, so a tool call reading template bodies sees
+        either the old library or the new one; a call that looked up the old
+        index before the swap looks the template up again in the new one. If
+        the reload fails, the old version keeps being served.
+
+        Args:
+            path: Library directory or ontology file that changed
+
+        Returns:
+            True if the library was (re)loaded
+        """
+        source = self.make_source(path)
+        if not source.ontology_files:
+            logger.warning(f"No ontology files left in {path}; keeping library '{source.name}'")
+            return False
+
+        self._load_locks.setdefault(source.name, threading.Lock())
+        with self._load_locks[source.name]:
+            known = source.name in self.library_sources
+            self.library_sources[source.name] = source
+            self.library_metadata[source.name] = self._load_metadata(source.ontology_files[0])
+            if known and not self.is_ready(source.name):
+                # Never loaded yet; the new files are picked up on first use
+                return False
+            previous_error = self.load_errors.pop(source.name, None)
+            version = self.library_versions.get(source.name)
+            if source.path.is_dir():
+                self._load_from_directory(source.path)
+            else:
+                self._load_file(source.path)
+
+            if self.library_versions.get(source.name) == version:
+                if source.name in self.libraries:
+                    # Keep serving the last good version
+                    logger.warning(
+                        f"Reload of library '{source.name}' failed; still serving the previous version: "
+                        f"{self.load_errors.pop(source.name, None)}"
+                    )
+                elif previous_error is not None and source.name not in self.load_errors:
+                    self.load_errors[source.name] = previous_error
+                return False
+
+        logger.info(f"Reloaded library '{source.name}' (version {self.library_versions[source.name]})")
+        return True
+
+    def remove_library(self, library_name: str) -> None:
+        """Forget a library whose files were deleted, and delete it from the database and cache.
+
+        Args:
+            library_name: Name of the library
+        """
+        with self._db_lock:
+            lib = self.libraries.get(library_name)
+            db_ids = {lib.id if lib is not None else None, self.unloaded.get(library_name)}
+            if self.cache is not None:
+                db_ids.add(self.cache.stale_id(library_name))
+                self.cache.forget(library_name)
+                self.cache.save()
+            self.library_sources.pop(library_name, None)
+            self.libraries.pop(library_name, None)
+            self.template_indexes.pop(library_name, None)
+            self.search_indexes.pop(library_name, None)
+            self.class_hierarchies.pop(library_name, None)
+            self.library_classes.pop(library_name, None)
+            self.load_errors.pop(library_name, None)
+            self.library_stats.pop(library_name, None)
+            self.unloaded.pop(library_name, None)
+            self._index_bytes.pop(library_name, None)
+            self._last_used.pop(library_name, None)
+            self.library_versions[library_name] = self.library_versions.get(library_name, 0) + 1
+            self._drop_compiled_templates(library_name)
+        for db_id in db_ids - {None}:
+            try:
+                self._delete_db_library(db_id)
+            except Exception as e:
+                logger.warning(f"Could not delete library '{library_name}' from the database: {e}")
+        logger.info(f"Removed library '{library_name}'")
+
+    def _register_loaded(
+        self, library_name: str, lib: Library, reopened: bool = False, graph: Optional[rdflib.Graph] = None
+    ) -> None:
+        """Index a freshly loaded library and make it visible to readers.
+
+        The indexes are built without holding the database lock for long;
+        it is taken to publish them and to delete the versions of the
+        library the new one replaces.
+
+        Args:
+            library_name: Name of the library
+            lib: The loaded library
+            reopened: The library was unloaded and reopened unchanged, so
+                caches keyed on its version stay valid
+            graph: The library's graph as parsed, to read its classes from
+                instead of the database
+        """
+        started = time.perf_counter()
+        try:
+            index = self._build_template_index(library_name, lib)
+            classes, hierarchy, triples = self._build_class_indexes(library_name, lib, graph)
+            search_index = SearchIndex.build(index, classes)
+        except Exception:
+            self._undo_swap(library_name)
+            raise
+        stats = self.library_stats.setdefault(library_name, {})
+        stats.update(
+            index_seconds=round(time.perf_counter() - started, 4),
+            templates=len(index),
+            classes=len(classes),
+            triples=triples,
+            loads=stats.get("loads", 0) + 1,
+            loaded_at=time.time(),
+        )
+        if reopened:
+            self.template_indexes[library_name] = index
+            self.search_indexes[library_name] = search_index
+            self.class_hierarchies[library_name] = hierarchy
+            self.library_classes[library_name] = classes
+            self.libraries[library_name] = lib
+            self.unloaded.pop(library_name, None)
+            logger.info(f"Reopened library '{library_name}' with {len(index)} templates")
+            return
+        with self._db_lock:
+            previous = self.libraries.get(library_name)
+            replaced = {previous.id if previous is not None else None, self.unloaded.get(library_name)}
+            # Publish the indexes first; readers treat presence in self.libraries as ready
+            self.template_indexes[library_name] = index
+            self.search_indexes[library_name] = search_index
+            self.class_hierarchies[library_name] = hierarchy
+            self.library_classes[library_name] = classes
+            self.library_versions[library_name] = self.library_versions.get(library_name, 0) + 1
+            self.libraries[library_name] = lib
+            self.unloaded.pop(library_name, None)
+            self._drop_compiled_templates(library_name)
+        logger.info(f"Loaded library '{library_name}' with {len(index)} templates")
+        self._finish_swap(library_name, lib, replaced)
+
+    def _finish_swap(self, library_name: str, lib: Library, replaced: set) -> None:
+        """Delete the database copies of a library that a new version replaced.
+
+        Called after the new version is published, with the library's load lock held.
+
+        Args:
+            library_name: Name of the library
+            lib: The version now served
+            replaced: Database ids the library was served from before
+        """
+        swap = self._pending_swaps.pop(library_name, None)
+        if swap is not None:
+            replaced = replaced | swap["replaced"]
+        for db_id in replaced - {None, lib.id}:
+            try:
+                self._delete_db_library(db_id)
+                logger.info(f"Deleted replaced copy {db_id} of library '{library_name}'")
+            except Exception as e:
+                logger.warning(f"Could not delete replaced copy {db_id} of library '{library_name}': {e}")
+
+    def _undo_swap(self, library_name: str) -> None:
+        """Delete a library version that failed to index, and restore the one it replaced."""
+        swap = self._pending_swaps.pop(library_name, None)
+        if swap is None:
+            return
+        try:
+            self._delete_db_library(swap["new"])
+            if swap["parked"] is not None:
+                with self.database():
+                    self.bm.table_connection.update_db_library_name(*swap["parked"])
+        except Exception as e:
+            logger.warning(f"Could not restore the previous copy of library '{library_name}': {e}")
+        if self.cache is not None:
+            with self._db_lock:
+                if swap["manifest"] is None:
+                    self.cache.forget(library_name)
+                else:
+                    self.cache.manifest[library_name] = swap["manifest"]
+                self.cache.save()
+
+    def _delete_db_library(self, db_id: int) -> None:
+        """Delete a library from the database, with its shapes and template bodies.
+
+        Deleting the library row removes its templates and shape collection
+        rows, but not the graphs they point to. Once the rows are gone
+        nothing refers to those graphs, so they are deleted in batches,
+        letting other threads use the database in between.
+
+        Raises:
+            LibraryNotFound: If there is no library with this id
+        """
+        tables = self.bm.table_connection
+        with self.database():
+            db_library = tables.get_db_library(db_id)
+            graph_ids = [db_library.shape_collection.graph_id] + [template.body_id for template in db_library.templates]
+            tables.delete_db_library(db_id)
+        for start in range(0, len(graph_ids), _DELETE_BATCH):
+            with self.database():
+                for graph_id in graph_ids[start:start + _DELETE_BATCH]:
+                    self.bm.graph_connection.delete_graph(graph_id)
+
+    def _build_template_index(self, library_name: str, lib: Library) -> TemplateIndex:
+        """Build a library's template index, or restore it from the cache."""
+        if self.cache is not None:
+            saved = self.cache.load_artifact(library_name, "templates")
+            if saved is not None:
+                return TemplateIndex.from_dict(saved)
+
+        index = TemplateIndex.build(lib, self.database)
+        if self.cache is not None:
+            self.cache.save_artifact(library_name, "templates", index.to_dict())
+        return index
+
+    def _build_class_indexes(
+        self, library_name: str, lib: Library, graph: Optional[rdflib.Graph] = None
+    ) -> Tuple[List[dict], ClassHierarchy, int]:
+        """Read a library's classes and class hierarchy, or restore them from the cache.
+
+        Args:
+            library_name: Name of the library
+            lib: The loaded library
+            graph: The library's graph as parsed, if at hand; otherwise it is
+                read from the database
+
+        Returns:
+            The classes for the search index, the class hierarchy, and the
+            number of triples in the library's graph
+        """
+        if self.cache is not None:
+            saved_classes = self.cache.load_artifact(library_name, "classes")
+            saved_hierarchy = self.cache.load_artifact(library_name, "hierarchy")
+            if saved_classes is not None and saved_hierarchy is not None and "triples" in saved_classes:
+                return saved_classes["classes"], ClassHierarchy.from_dict(saved_hierarchy), saved_classes["triples"]
+
+        if graph is not None:
+            # The parsed graph is what was stored as the library's shape collection
+            classes = extract_classes(graph)
+            hierarchy = ClassHierarchy.build(graph)
+            triples = len(graph)
+        else:
+            with self.database():
+                graph = lib.get_shape_collection().graph
+                classes = extract_classes(graph)
+                hierarchy = ClassHierarchy.build(graph)
+                triples = len(graph)
+        if self.cache is not None:
+            self.cache.save_artifact(library_name, "classes", {"classes": classes, "triples": triples})
+            self.cache.save_artifact(library_name, "hierarchy", hierarchy.to_dict())
+        return classes, hierarchy, triples
+
+    def _reopen_library(self, library_name: str) -> None:
+        """Reopen an unloaded library from the database, or forget it if that fails."""
+        db_id = self.unloaded[library_name]
+        started = time.perf_counter()
+        try:
+            with self.database():
+                lib = Library.load(db_id=db_id)
+        except Exception as e:
+            logger.warning(f"Could not reopen library '{library_name}', loading it again: {e}")
+            self.unloaded.pop(library_name, None)
+            return
+        self.library_stats.setdefault(library_name, {}).update(
+            load_seconds=round(time.perf_counter() - started, 4),
+            from_cache=True,
+        )
+        self._register_loaded(library_name, lib, reopened=True)
+
+    def unload_library(self, library_name: str) -> bool:
+        """Release a loaded library's indexes, graph copies and compiled templates.
+
+        The library stays in the BuildingMOTIF database, which is on disk, and
+        is reopened from there on next use: parsing and inference are not
+        repeated, and with the library cache its indexes are restored too.
+
+        Args:
+            library_name: Name of the library
+
+        Returns:
+            True if the library was unloaded, False if it was not loaded
+        """
+        lock = self._load_locks.get(library_name)
+        if lock is None:
+            return False
+        with lock:
+            return self._unload(library_name)
+
+    def _unload(self, library_name: str) -> bool:
+        """Unload a library; the caller holds its load lock."""
+        with self._db_lock:
+            lib = self.libraries.pop(library_name, None)
+            if lib is None:
+                return False
+            self.unloaded[library_name] = lib.id
+            self.template_indexes.pop(library_name, None)
+            self.search_indexes.pop(library_name, None)
+            self.class_hierarchies.pop(library_name, None)
+            self.library_classes.pop(library_name, None)
+            self._index_bytes.pop(library_name, None)
+            self._shapes_graphs = {
+                key: graph for key, graph in self._shapes_graphs.items()
+                if all(name != library_name for name, _ in key)
+            }
+            self._compiled_templates = {
+                key: cached for key, cached in self._compiled_templates.items() if key[0] != library_name
+            }
+            self.unloads += 1
+        logger.info(f"Unloaded library '{library_name}'")
+        return True
+
+    def library_memory(self, library_name: str) -> Optional[dict]:
+        """Estimate the memory a loaded library holds in this process.
+
+        Counts its indexes, measured once per library version, the in-memory
+        copies of its graph kept for validation, and its compiled templates.
+        The BuildingMOTIF database is on disk and is not counted.
+
+        Args:
+            library_name: Name of the library
+
+        Returns:
+            dict with "index_bytes", "graph_bytes", "template_bytes" and their
+            sum "resident_bytes", or None if the library is not loaded
+        """
+        version = self.library_versions.get(library_name)
+        measured = self._index_bytes.get(library_name)
+        if measured is None or measured[0] != version:
+            parts = (
+                self.template_indexes.get(library_name),
+                self.search_indexes.get(library_name),
+                self.class_hierarchies.get(library_name),
+                self.library_classes.get(library_name),
+            )
+            if library_name not in self.libraries or any(part is None for part in parts):
+                return None
+            measured = self._index_bytes[library_name] = (version, _approximate_size(*parts))
+
+        triples = self.library_stats.get(library_name, {}).get("triples") or 0
+        graph_copies = sum(1 for key in list(self._shapes_graphs) if any(name == library_name for name, _ in key))
+        compiled = [cached[1] for key, cached in list(self._compiled_templates.items()) if key[0] == library_name]
+        memory = {
+            "index_bytes": measured[1],
+            "graph_bytes": graph_copies * triples * ESTIMATED_BYTES_PER_TRIPLE,
+            "template_bytes": _approximate_size(*compiled) if compiled else 0,
+        }
+        memory["resident_bytes"] = sum(memory.values())
+        return memory
+
+    def memory_status(self) -> dict:
+        """Summarize the memory held by loaded libraries against the budget."""
+        libraries = {}
+        for name in list(self.libraries):
+            memory = self.library_memory(name)
+            if memory is not None:
+                libraries[name] = memory["resident_bytes"]
+        return {
+            "resident_bytes": sum(libraries.values()),
+            "memory_budget": self.memory_budget,
+            "libraries": libraries,
+            "unloaded": sorted(self.unloaded),
+            "unloads": self.unloads,
+        }
+
+    def _enforce_memory_budget(self, keep: List[str] = ()) -> None:
+        """Unload least recently used libraries until the loaded ones fit the budget.
+
+        Libraries being loaded or unloaded by another thread are skipped.
+
+        Args:
+            keep: Libraries to keep loaded even if they alone exceed the
+                budget, normally the ones just used
+        """
+        if self.memory_budget is None:
+            return
+        sizes = self.memory_status()["libraries"]
+        total = sum(sizes.values())
+        for name in sorted(sizes, key=lambda name: self._last_used.get(name, 0.0)):
+            if total <= self.memory_budget:
+                break
+            if name in keep:
+                continue
+            lock = self._load_locks.get(name)
+            if lock is None or not lock.acquire(blocking=False):
+                continue
+            try:
+                if self._unload(name):
+                    total -= sizes[name]
+            finally:
+                lock.release()
+
+    def _load_library(
+        self, library_name: str, source: Path, ontology_files: List[Path]
+    ) -> Tuple[Library, Optional[rdflib.Graph]]:
+        """Load a library, reusing the cached copy if its files are unchanged.
+
+        Parsing and inference happen without the database lock, which is
+        only taken to store the result.
+
+        Args:
+            library_name: Name of the library
+            source: File or directory to parse
+            ontology_files: Ontology files whose contents identify the library
+
+        Returns:
+            The loaded Library, and its parsed graph, or None if it was
+            reopened from the cache
+        """
+        started = time.perf_counter()
+        lib = graph = content_hash = None
+        if self.cache is not None:
+            content_hash = self.cache.compute_hash(ontology_files)
+            lib = self._open_cached(library_name, content_hash)
+        if lib is None:
+            if self.cache is not None:
+                self.cache.misses.append(library_name)
+            graph = self._prepare_graph(library_name, source)
+            lib = self._store_library(library_name, graph, source, content_hash)
+        self.library_stats.setdefault(library_name, {}).update(
+            load_seconds=round(time.perf_counter() - started, 4),
+            from_cache=graph is None,
+        )
+        return lib, graph
+
+    def _open_cached(self, library_name: str, content_hash: str) -> Optional[Library]:
+        """Reopen a library from the cache database if its sources are unchanged."""
+        db_id = self.cache.lookup(library_name, content_hash)
+        if db_id is None:
+            return None
+        try:
+            with self.database():
+                lib = Library.load(db_id=db_id)
+        except Exception as e:
+            logger.warning(f"Cached copy of library '{library_name}' is unusable, reloading: {e}")
+            return None
+        self.cache.hits.append(library_name)
+        logger.info(f"Reusing cached library '{library_name}'")
+        return lib
+
+    def _prepare_graph(self, library_name: str, source: Path) -> rdflib.Graph:
+        """Parse a library and run SHACL inference, or take the graph a worker prepared."""
+        prepared = self._prepared.pop(library_name, None)
+        if prepared is not None:
+            # Re-raises any error from the worker, so it is logged for this library only
+            return prepared.result()
+        return _prepare_ontology_graph(str(source), self.bm.shacl_engine)
+
+    def _store_library(
+        self, library_name: str, graph: rdflib.Graph, source: Path, content_hash: Optional[str]
+    ) -> Library:
+        """Store a parsed library in the database as a new copy.
+
+        BuildingMOTIF names a library after its ontology IRI and would load
+        a new version into the existing library of that name, keeping the
+        old version's shapes. So that library is renamed out of the way
+        first. It stays readable by id for calls still using the old
+        indexes until _register_loaded publishes the new version and
+        deletes it, or _undo_swap restores it. The new copy is committed
+        and, with a cache, recorded in the manifest before returning.
+
+        Args:
+            library_name: Name of the library
+            graph: The parsed and inferred graph
+            source: File or directory the library was loaded from
+            content_hash: Hash of the source files, when caching
+
+        Returns:
+            The stored Library
+        """
+        ontology_name = graph.value(predicate=rdflib.RDF.type, object=rdflib.OWL.Ontology, any=False)
+        ontology_name = str(ontology_name or rdflib.URIRef("urn:unnamed/"))
+        tables = self.bm.table_connection
+        with self._db_lock:
+            parked = None
+            try:
+                try:
+                    existing = tables.get_db_library_by_name(ontology_name)
+                    parked = (existing.id, existing.name)
+                    tables.update_db_library_name(existing.id, f"{_PARKED_PREFIX}{existing.id}")
+                except LibraryNotFound:
+                    pass
+                lib = Library.load(ontology_graph=graph, run_shacl_inference=False)
+                # Commit so that sessions in other threads can see the library
+                self.bm.session.commit()
+            except Exception:
+                self.bm.session.rollback()
+                raise
+
+            swap = {"new": lib.id, "parked": parked, "manifest": None, "replaced": set()}
+            if self.cache is not None:
+                swap["manifest"] = self.cache.manifest.get(library_name)
+                swap["replaced"].add(self.cache.stale_id(library_name))
+                self.cache.store(library_name, content_hash, lib.id, source)
+                self.cache.save()
+            self._pending_swaps[library_name] = swap
+        return lib
 
     def _load_metadata(self, ontology_file: Path) -> dict:
         """Load metadata for an ontology file.
@@ -186,7 +1079,7 @@ class OntologyManager:
         }
 
     def get_library(self, library_name: str) -> Optional[Library]:
-        """Get a loaded library by name.
+        """Get a library by name, loading it on first use.
 
         Args:
             library_name: Name of the library
@@ -194,39 +1087,58 @@ class OntologyManager:
         Returns:
             The Library object or None if not found
         """
-        return self.libraries.get(library_name)
+        return self._ensure_loaded(library_name)
 
     def list_libraries(self) -> List[str]:
-        """List all loaded library names.
+        """List all known library names, loaded or only discovered.
         
         Returns:
             List of library names
         """
-        return list(self.libraries.keys())
+        return list(self.library_sources.keys())
 
     def get_library_info(self, library_name: str) -> Optional[dict]:
         """Get detailed information about a library including metadata.
 
+        This does not load the library; the template count, triple count and
+        resident size are None until it has been loaded.
+
         Args:
             library_name: Name of the library
 
         Returns:
             Dictionary with library info or None if not found
         """
-        lib = self.get_library(library_name)
-        if not lib:
+        if library_name not in self.library_sources:
             return None
         
         metadata = self.library_metadata.get(library_name, {})
-        
-        return {
+
+        if library_name in self.libraries:
+            status = "loaded"
+        elif library_name in self.load_errors:
+            status = "failed"
+        elif library_name in self.unloaded:
+            status = "unloaded"
+        else:
+            status = "discovered"
+
+        stats = self.library_stats.get(library_name, {})
+        memory = self.library_memory(library_name) if status == "loaded" else None
+        info = {
             "name": library_name,
-            "template_count": len(lib.get_templates()),
+            "status": status,
+            "template_count": stats.get("templates") if status in {"loaded", "unloaded"} else None,
+            "triples": stats.get("triples") if status in {"loaded", "unloaded"} else None,
+            "resident_bytes": memory["resident_bytes"] if memory else (0 if status == "unloaded" else None),
             "metadata": metadata
         }
+        if status == "failed":
+            info["error"] = self.load_errors[library_name]
+        return info
 
     def get_all_libraries_info(self) -> List[dict]:
-        """Get information about all loaded libraries.
+        """Get information about all known libraries.
 
         Returns:
             List of dictionaries with library info and metadata
@@ -237,6 +1149,290 @@ class OntologyManager:
             if info:
                 result.append(info)
         return result
+
+    def get_template_index(self, library_name: str) -> Optional[TemplateIndex]:
+        """Get the template index of a library, loading the library on first use.
+
+        Args:
+            library_name: Name of the library
+
+        Returns:
+            The TemplateIndex or None if the library is not available
+        """
+        if self._ensure_loaded(library_name) is None:
+            return None
+        return self.template_indexes.get(library_name)
+
+    def get_search_index(self, library_name: str) -> Optional[SearchIndex]:
+        """Get the search index of a library, loading the library on first use.
+
+        Args:
+            library_name: Name of the library
+
+        Returns:
+            The SearchIndex, or None if the library is unknown or failed to load
+        """
+        if self._ensure_loaded(library_name) is None:
+            return None
+        return self.search_indexes.get(library_name)
+
+    def get_class_hierarchy(self, library_name: str) -> Optional[ClassHierarchy]:
+        """Get the class hierarchy of a library, loading the library on first use.
+
+        Args:
+            library_name: Name of the library
+
+        Returns:
+            The ClassHierarchy, or None if the library is unknown or failed to load
+        """
+        if self._ensure_loaded(library_name) is None:
+            return None
+        return self.class_hierarchies.get(library_name)
+
+    def get_library_classes(self, library_name: str) -> Optional[List[dict]]:
+        """Get a library's classes with their labels, definitions and tags, loading it on first use.
+
+        Args:
+            library_name: Name of the library
+
+        Returns:
+            List of class dicts, or None if the library is unknown or failed to load
+        """
+        if self._ensure_loaded(library_name) is None:
+            return None
+        return self.library_classes.get(library_name)
+
+    def get_shapes_graph(self, library_names: Optional[List[str]] = None) -> tuple:
+        """Get the merged shapes and ontology graph of some libraries for validation.
+
+        The graphs are copied out of the database once and kept in memory
+        until one of the libraries is reloaded.
+
+        Args:
+            library_names: Libraries to include (default: all that load successfully)
+
+        Returns:
+            Tuple of a key identifying the libraries and their versions, and the graph
+
+        Raises:
+            ValueError: If a named library is unknown or failed to load, or
+                was replaced twice while its shapes were read
+        """
+        if library_names is None:
+            library_names = [name for name in self.list_libraries() if self.get_library(name) is not None]
+        # A library swapped or unloaded before the database lock is taken is fetched again
+        for _ in range(2):
+            libraries = {}
+            for name in library_names:
+                libraries[name] = self.get_library(name)
+                if libraries[name] is None:
+                    raise ValueError(f"Library '{name}' is not available")
+
+            key = tuple(sorted((name, self.library_versions.get(name)) for name in library_names))
+            graph = self._shapes_graphs.get(key)
+            if graph is not None:
+                return key, graph
+            graph = rdflib.Graph()
+            with self.database():
+                # Libraries are only swapped under the database lock
+                if any(self.libraries.get(name) is not lib for name, lib in libraries.items()):
+                    continue
+                for name in library_names:
+                    graph += libraries[name].get_shape_collection().graph
+            # Drop graphs built from superseded library versions
+            self._shapes_graphs = {
+                other: g for other, g in self._shapes_graphs.items()
+                if all(self.library_versions.get(name) == version for name, version in other)
+            }
+            self._shapes_graphs[key] = graph
+            self._enforce_memory_budget(keep=library_names)
+            return key, graph
+        raise ValueError(f"Libraries {library_names} changed while their shapes were read; try again")
+
+    def template_version(self, library_name: str, template_name: str) -> tuple:
+        """Identify the library versions a template's inlined form depends on.
+
+        A template without dependencies only depends on its own library. One
+        with dependencies may inline templates from any library, so it
+        depends on all of them.
+
+        Args:
+            library_name: Name of the library
+            template_name: Name of the template
+
+        Returns:
+            Sorted (library, version) pairs
+        """
+        index = self.get_template_index(library_name)
+        return self._template_version(library_name, index.get(template_name) if index is not None else None)
+
+    def _template_version(self, library_name: str, entry: Optional[dict]) -> tuple:
+        """template_version for a template index entry; reads no library, so safe under the database lock."""
+        # Unloaded libraries keep their versions, so they count as well
+        names = [library_name] if entry is None or not entry["dependencies"] else list(self.library_versions)
+        return tuple(sorted((name, self.library_versions.get(name)) for name in names))
+
+    def get_compiled_template(self, library_name: str, template_name: str) -> Tuple[CompiledTemplate, str]:
+        """Get a template with its dependencies inlined, compiling it at most once.
+
+        Compiled templates are kept per library version, and, with a library
+        cache, saved next to it so that later runs skip inlining as well.
+
+        Loading a library takes its load lock and then the database lock, so
+        the index is read before taking the database lock, which is only held
+        to read and inline the template; saved templates are read and written
+        outside it.
+
+        Args:
+            library_name: Name of the library
+            template_name: Name of the template
+
+        Returns:
+            The compiled template, and where it came from: "memory", "disk"
+            or "compiled"
+
+        Raises:
+            ValueError: If the template cannot be loaded
+        """
+        key = (library_name, template_name)
+        # A library swapped or unloaded after its index was read needs a fresh index
+        for _ in range(2):
+            index = self.get_template_index(library_name)
+            if index is None:
+                raise ValueError(f"Library '{library_name}' is not available")
+            entry = index.get(template_name)
+            if entry is None:
+                raise ValueError(f"Template '{template_name}' not found in library '{library_name}'")
+            version = self._template_version(library_name, entry)
+            cached = self._compiled_templates.get(key)
+            if cached is not None and cached[0] == version:
+                self._count_template_hit("hits", cached[2])
+                return cached[1], "memory"
+
+            started = time.perf_counter()
+            saved = self._load_saved_template(library_name, template_name)
+            if saved is not None:
+                compiled, compile_seconds = saved
+                self._count_template_hit("disk_hits", compile_seconds - (time.perf_counter() - started))
+                with self._db_lock:
+                    if self._is_current(library_name, index, entry, version):
+                        self._compiled_templates[key] = (version, compiled, compile_seconds)
+                return compiled, "disk"
+
+            with self.database():
+                # Libraries are only swapped under the database lock, so the
+                # template ids in the index are valid until it is released
+                if not self._is_current(library_name, index, entry, version):
+                    continue
+                compiled = CompiledTemplate.from_template(Template.load(entry["id"]))
+                compile_seconds = time.perf_counter() - started
+                self._compiled_templates[key] = (version, compiled, compile_seconds)
+                sources = self._template_sources(library_name, entry)
+            with self._compiled_lock:
+                self.template_cache_stats["misses"] += 1
+                self.template_cache_stats["compile_seconds"] += compile_seconds
+            if sources is not None:
+                self._save_template(library_name, template_name, compiled, compile_seconds, *sources)
+            return compiled, "compiled"
+        raise ValueError(f"Library '{library_name}' changed while template '{template_name}' was compiled; try again")
+
+    def _is_current(self, library_name: str, index: TemplateIndex, entry: dict, version: tuple) -> bool:
+        """True if an index read earlier is still the one served, at the given versions."""
+        return self.template_indexes.get(library_name) is index and self._template_version(library_name, entry) == version
+
+    def _count_template_hit(self, kind: str, saved_seconds: float) -> None:
+        """Record a compiled template served from memory or disk."""
+        with self._compiled_lock:
+            self.template_cache_stats[kind] += 1
+            self.template_cache_stats["saved_seconds"] += max(0.0, saved_seconds)
+
+    def _drop_compiled_templates(self, library_name: str) -> None:
+        """Forget compiled templates a (re)loaded or removed library may have changed."""
+        self._compiled_templates = {
+            key: cached for key, cached in self._compiled_templates.items()
+            # Templates with dependencies depend on every library
+            if key[0] != library_name and len(cached[0]) == 1
+        }
+
+    def _library_hashes(self) -> Dict[str, str]:
+        """Source hashes of the loaded libraries recorded in the library cache."""
+        return {
+            name: self.cache.manifest[name]["hash"]
+            for name in self.libraries if name in self.cache.manifest
+        }
+
+    def _load_saved_template(self, library_name: str, template_name: str) -> Optional[Tuple[CompiledTemplate, float]]:
+        """Restore a compiled template from the library cache, if saved for the current sources."""
+        if self.cache is None or not self.persist_templates:
+            return None
+        entry = self.cache.load_artifact(library_name, "inlined", key=template_name)
+        if entry is None:
+            return None
+        # Templates with dependencies were inlined from other libraries too
+        if entry["libraries"] is not None and entry["libraries"] != self._library_hashes():
+            return None
+        graph = rdflib.Graph()
+        graph.parse(data=entry["body"], format="nt")
+        compiled = CompiledTemplate(list(graph), set(entry["parameters"]), set(entry["optional_parameters"]))
+        return compiled, entry["compile_seconds"]
+
+    def _template_sources(self, library_name: str, entry: dict) -> Optional[Tuple[dict, Optional[Dict[str, str]]]]:
+        """The cache entries a template compiled now is derived from, for _save_template.
+
+        Call with the database lock held, so that the manifest matches the
+        libraries served.
+
+        Returns:
+            The library's manifest entry and, for templates with dependencies,
+            the hashes of all loaded libraries; None if the template should
+            not be saved
+        """
+        if self.cache is None or not self.persist_templates:
+            return None
+        if self._pending_swaps:
+            # A template inlined while a library is being replaced may mix both versions
+            return None
+        manifest_entry = self.cache.manifest.get(library_name)
+        if manifest_entry is None:
+            return None
+        return dict(manifest_entry), self._library_hashes() if entry["dependencies"] else None
+
+    def _save_template(
+        self,
+        library_name: str,
+        template_name: str,
+        compiled: CompiledTemplate,
+        compile_seconds: float,
+        manifest_entry: dict,
+        libraries: Optional[Dict[str, str]],
+    ) -> None:
+        """Save a compiled template in the library cache, in a file of its own.
+
+        Args:
+            library_name: Name of the library
+            template_name: Name of the template
+            compiled: The compiled template
+            compile_seconds: Time it took to compile
+            manifest_entry: Manifest entry of the library it was compiled
+                from; if the library is stored again meanwhile, the saved
+                template is not used for the new sources
+            libraries: Hashes of the libraries it was inlined from, for
+                templates with dependencies
+        """
+        body = io.StringIO()
+        write_ntriples(body, compiled.triples)
+        saved = {
+            "body": body.getvalue(),
+            "parameters": sorted(compiled.parameters),
+            "optional_parameters": sorted(compiled.optional_parameters),
+            "compile_seconds": compile_seconds,
+            "libraries": libraries,
+        }
+        try:
+            self.cache.save_artifact(library_name, "inlined", saved, key=template_name, entry=manifest_entry)
+        except OSError as e:
+            logger.warning(f"Could not save inlined template '{template_name}': {e}")
+
     def list_templates(self, library_name: str) -> List[str]:
         """List all template names in a library.
 
@@ -244,14 +1440,45 @@ class OntologyManager:
             library_name: Name of the library
 
         Returns:
-            List of template names (URIs as strings)
+            Sorted list of template names (URIs as strings); do not modify
         """
-        lib = self.get_library(library_name)
-        if not lib:
+        index = self.get_template_index(library_name)
+        if index is None:
             return []
 
-        templates = lib.get_templates()
-        return [str(template.name) for template in templates]
+        return index.names
+
+    @contextmanager
+    def reading_template(self, library_name: str, template_name: str) -> Iterator[Optional[Tuple[dict, Template]]]:
+        """Read a template with the database lock held.
+
+        Template bodies are read lazily from the database, so use the
+        template inside the block. Loading a library takes its load lock and
+        then the database lock, so the index is looked up, loading the
+        library if needed, before taking the lock.
+
+        Args:
+            library_name: Name of the library
+            template_name: Name of the template
+
+        Yields:
+            The template's index entry and the Template, or None if the
+            library or template is not available
+        """
+        # A library swapped or unloaded after its index was read needs a fresh index
+        for _ in range(2):
+            index = self.get_template_index(library_name)
+            entry = index.get(template_name) if index is not None else None
+            if entry is None:
+                break
+            with self.database():
+                # Libraries are only swapped under the database lock, so the
+                # template ids in the index are valid until it is released
+                if self.template_indexes.get(library_name) is not index:
+                    continue
+                yield entry, Template.load(entry["id"])
+                return
+        yield None
 
     def get_template_by_name(self, library_name: str, template_name: str):
         """Get a specific template from a library.
@@ -263,12 +1490,9 @@ class OntologyManager:
         Returns:
             The Template object or None if not found
         """
-        lib = self.get_library(library_name)
-        if not lib:
-            return None
-
         try:
-            return lib.get_template_by_name(template_name)
+            with self.reading_template(library_name, template_name) as found:
+                return found[1] if found is not None else None
         except Exception as e:
             logger.error(f"Error getting template '{template_name}' from library '{library_name}': {e}")
             return None
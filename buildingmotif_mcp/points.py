@@ -0,0 +1,252 @@
+"""Bulk matching of BMS point labels to Brick point classes for BuildingMOTIF MCP."""
+
+import csv
+import heapq
+import json
+import logging
+import math
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from buildingmotif_mcp.search import local_name, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Abbreviations common in BMS point names, expanded to the words Brick uses
+ABBREVIATIONS = {
+    "sat": "supply air temperature",
+    "sa": "supply air",
+    "sf": "supply fan",
+    "rat": "return air temperature",
+    "ra": "return air",
+    "rf": "return fan",
+    "mat": "mixed air temperature",
+    "ma": "mixed air",
+    "oat": "outside air temperature",
+    "oa": "outside air",
+    "dat": "discharge air temperature",
+    "da": "discharge air",
+    "eat": "exhaust air temperature",
+    "ea": "exhaust air",
+    "ef": "exhaust fan",
+    "zat": "zone air temperature",
+    "znt": "zone temperature",
+    "zn": "zone",
+    "rm": "room",
+    "t": "temperature",
+    "tmp": "temperature",
+    "temp": "temperature",
+    "p": "pressure",
+    "pr": "pressure",
+    "press": "pressure",
+    "sp": "setpoint",
+    "spt": "setpoint",
+    "stpt": "setpoint",
+    "setpt": "setpoint",
+    "rh": "relative humidity",
+    "hum": "humidity",
+    "dp": "differential pressure",
+    "sts": "status",
+    "stat": "status",
+    "st": "status",
+    "cmd": "command",
+    "alm": "alarm",
+    "flt": "filter",
+    "spd": "speed",
+    "flw": "flow",
+    "cfm": "air flow",
+    "dmp": "damper",
+    "dpr": "damper",
+    "pos": "position",
+    "vlv": "valve",
+    "chw": "chilled water",
+    "chws": "chilled water supply",
+    "chwr": "chilled water return",
+    "hw": "hot water",
+    "hws": "hot water supply",
+    "hwr": "hot water return",
+    "cw": "condenser water",
+    "htg": "heating",
+    "ht": "heating",
+    "clg": "cooling",
+    "cl": "cooling",
+    "occ": "occupancy",
+    "unocc": "unoccupied",
+    "enb": "enable",
+    "en": "enable",
+    "eff": "effective",
+    "lvl": "level",
+    "kw": "power",
+    "kwh": "energy",
+    "amps": "current",
+    "amp": "current",
+    "volt": "voltage",
+    "hz": "frequency",
+    "co2": "co2",
+}
+
+# Tokens naming the kind of point; a label without one is most likely a sensor
+POINT_KINDS = {"sensor", "setpoint", "command", "status", "alarm", "parameter"}
+
+
+# Chemical formulas whose digits must stay with the letters ("CO2" is not "CO")
+_FORMULA_PREFIXES = {"co", "no", "o", "h"}
+
+
+def point_tokens(text: str) -> List[str]:
+    """Tokenize a label or class name, dropping numbers but keeping formulas like "co2"."""
+    tokens = []
+    for token in tokenize(text):
+        if token.isdigit():
+            if tokens and tokens[-1] in _FORMULA_PREFIXES and len(token) == 1:
+                tokens[-1] += token
+            continue
+        tokens.append(token)
+    return tokens
+
+
+def label_tokens(label: str) -> List[str]:
+    """Tokenize a point label, dropping numbers and expanding abbreviations.
+
+    "AHU1_SAT" gives ["ahu", "supply", "air", "temperature"].
+
+    Args:
+        label: A BMS point label
+
+    Returns:
+        List of tokens
+    """
+    tokens = []
+    for token in point_tokens(label):
+        tokens.extend(ABBREVIATIONS.get(token, token).split())
+    return tokens
+
+
+class PointIndex:
+    """Token index over point classes for scoring point labels.
+
+    Each class is described by the tokens of its name, label and tags. A
+    label is scored against a class by the cosine of their token sets, with
+    tokens weighted by inverse document frequency, so a class that matches
+    the label's words without adding many of its own ranks first. Labels
+    whose tokens only differ in numbers (AHU1_SAT, AHU2_SAT) share a lookup.
+    """
+
+    def __init__(self, classes: List[dict], memo_size: int = 100_000):
+        """Build the index.
+
+        Args:
+            classes: Dicts with "iri" and optionally "label" and "tags"
+            memo_size: Number of distinct token sets whose matches are remembered
+        """
+        self.classes = [cls["iri"] for cls in classes]
+        tokens_by_class: List[Set[str]] = []
+        for cls in classes:
+            tokens = set(point_tokens(local_name(cls["iri"])))
+            tokens.update(point_tokens(cls.get("label") or ""))
+            for tag in cls.get("tags") or []:
+                tokens.update(point_tokens(tag))
+            tokens_by_class.append(tokens)
+
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for class_no, tokens in enumerate(tokens_by_class):
+            for token in tokens:
+                self.postings[token].append(class_no)
+        n_classes = max(1, len(classes))
+        self.idf = {token: math.log(1 + n_classes / len(ids)) for token, ids in self.postings.items()}
+        self.norms = [math.sqrt(sum(self.idf[t] ** 2 for t in tokens)) or 1.0 for tokens in tokens_by_class]
+        self.memo_size = memo_size
+        self._memo: Dict[Tuple[frozenset, int], List[Tuple[str, float]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.classes)
+
+    def match(self, label: str, top_k: int = 3) -> Tuple[List[Tuple[str, float]], List[str]]:
+        """Find the point classes that best match a label.
+
+        Args:
+            label: A BMS point label
+            top_k: Number of candidates
+
+        Returns:
+            Up to top_k (class IRI, score) pairs, best first, with scores
+            between 0 and 1; and the label tokens no class uses
+        """
+        tokens = set(label_tokens(label))
+        known = frozenset(t for t in tokens if t in self.postings)
+        unknown = sorted(tokens - known)
+        if known and not known & POINT_KINDS and "sensor" in self.postings:
+            known = known | {"sensor"}
+
+        key = (known, top_k)
+        matches = self._memo.get(key)
+        if matches is None:
+            matches = self._score(known, top_k)
+            if len(self._memo) >= self.memo_size:
+                self._memo.clear()
+            self._memo[key] = matches
+        return matches, unknown
+
+    def _score(self, tokens: frozenset, top_k: int) -> List[Tuple[str, float]]:
+        """Rank classes by IDF-weighted cosine similarity to a token set."""
+        if not tokens:
+            return []
+        overlap: Dict[int, float] = defaultdict(float)
+        for token in tokens:
+            weight = self.idf[token] ** 2
+            for class_no in self.postings[token]:
+                overlap[class_no] += weight
+        query_norm = math.sqrt(sum(self.idf[t] ** 2 for t in tokens))
+        best = heapq.nlargest(
+            top_k,
+            overlap.items(),
+            key=lambda item: (item[1] / self.norms[item[0]], -len(self.classes[item[0]])),
+        )
+        return [
+            (self.classes[class_no], round(score / (self.norms[class_no] * query_norm), 4))
+            for class_no, score in best
+        ]
+
+
+def read_labels(path: Path, column: Optional[str] = None) -> Iterator[str]:
+    """Stream point labels from a CSV or JSON Lines file.
+
+    Args:
+        path: A .csv file with a header row, or a .jsonl file of objects or strings
+        column: Column or key holding the label (default: "label" if present,
+            else the first CSV column)
+
+    Yields:
+        One label per row; empty for rows without one
+
+    Raises:
+        ValueError: If the file type is not supported or the column is missing
+    """
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        with open(path, newline="") as f:
+            reader = csv.DictReader(f)
+            fields = reader.fieldnames or []
+            if column is None:
+                column = "label" if "label" in fields else (fields[0] if fields else None)
+            if column not in fields:
+                raise ValueError(f"Column '{column}' not found in {path.name}; columns: {fields}")
+            for row in reader:
+                yield (row.get(column) or "").strip()
+    elif suffix in {".jsonl", ".ndjson"}:
+        key = column or "label"
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    value = json.loads(line)
+                except json.JSONDecodeError:
+                    yield ""
+                    continue
+                if isinstance(value, dict):
+                    value = value.get(key)
+                yield value.strip() if isinstance(value, str) else ""
+    else:
+        raise ValueError(f"Unsupported labels file type '{path.suffix}'; use .csv or .jsonl")
@@ -0,0 +1,265 @@
+"""Keyword search over templates and ontology classes for BuildingMOTIF MCP."""
+
+import heapq
+import logging
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from buildingmotif.namespaces import BRICK
+from rdflib import OWL, RDF, RDFS, Graph, URIRef
+from rdflib.namespace import SKOS
+
+from buildingmotif_mcp.index import TemplateIndex
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of a token match in each field of a document
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "label": 3.0,
+    "parameters": 1.0,
+    "definition": 1.0,
+}
+
+# Score multipliers by how a query token matched an indexed token
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.7
+TYPO_MATCH = 0.5
+
+_SPLIT_RE = re.compile(r"[^0-9A-Za-z]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase search tokens.
+
+    Splits on punctuation, underscores and camel case, so that
+    "Supply_Air_Temperature_Sensor", "supplyAirTemp" and "supply air temp"
+    share tokens.
+
+    Args:
+        text: Free text, a name or an IRI
+
+    Returns:
+        List of tokens in order of appearance
+    """
+    tokens = []
+    for part in _SPLIT_RE.split(text):
+        tokens.extend(t.lower() for t in _CAMEL_RE.findall(part))
+    return tokens
+
+
+def local_name(iri: str) -> str:
+    """Return the part of an IRI after the last '#' or '/'."""
+    return re.split(r"[#/]", iri)[-1] or iri
+
+
+def _deletes(token: str) -> Set[str]:
+    """All strings obtained by deleting one character from a token."""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def extract_classes(graph: Graph) -> List[dict]:
+    """Collect the classes of an ontology graph with their labels and definitions.
+
+    Args:
+        graph: The library's ontology graph
+
+    Returns:
+        List of dicts with "iri", "label", "definition" and "tags" (the local
+        names of Brick's brick:hasAssociatedTag values)
+    """
+    classes = set(graph.subjects(RDF.type, OWL.Class)) | set(graph.subjects(RDF.type, RDFS.Class))
+    labels = {s: str(o) for s, o in graph.subject_objects(RDFS.label) if s in classes}
+    definitions = {s: str(o) for s, o in graph.subject_objects(SKOS.definition) if s in classes}
+    tags: Dict[URIRef, List[str]] = defaultdict(list)
+    for s, o in graph.subject_objects(BRICK.hasAssociatedTag):
+        if s in classes:
+            tags[s].append(local_name(str(o)))
+    return [
+        {
+            "iri": str(cls),
+            "label": labels.get(cls, ""),
+            "definition": definitions.get(cls, ""),
+            "tags": sorted(tags.get(cls, [])),
+        }
+        for cls in sorted(classes, key=str)
+        # Skip anonymous classes such as owl:unionOf blank nodes
+        if isinstance(cls, URIRef)
+    ]
+
+
+class SearchIndex:
+    """Inverted index over the documents of one library.
+
+    A document is either a template (name and parameter names) or a class
+    (IRI, rdfs:label and skos:definition). Query tokens match indexed tokens
+    exactly, by prefix, or within one edit; a single-deletion index makes the
+    typo lookup a handful of dictionary probes instead of a vocabulary scan.
+    """
+
+    def __init__(self, documents: List[dict]):
+        """Build the index.
+
+        Args:
+            documents: Dicts with "kind" ("template" or "class"), "id" and
+                "fields", a mapping of field name to text
+        """
+        self.documents = documents
+        # token -> {doc number: summed field weight}
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for doc_no, doc in enumerate(documents):
+            for field, text in doc["fields"].items():
+                weight = FIELD_WEIGHTS.get(field, 1.0)
+                for token in set(tokenize(text)):
+                    postings = self.postings[token]
+                    postings[doc_no] = postings.get(doc_no, 0.0) + weight
+        self.vocabulary: List[str] = sorted(self.postings)
+        self._deletion_index: Dict[str, List[str]] = defaultdict(list)
+        for token in self.vocabulary:
+            if len(token) > 3:
+                for variant in _deletes(token):
+                    self._deletion_index[variant].append(token)
+        self._idf = {
+            token: math.log(1 + len(documents) / len(postings))
+            for token, postings in self.postings.items()
+        }
+
+    @classmethod
+    def build(cls, template_index: TemplateIndex, classes: List[dict]) -> "SearchIndex":
+        """Build the index for a library from its template index and classes.
+
+        Args:
+            template_index: The library's template index
+            classes: Classes as returned by extract_classes
+
+        Returns:
+            A new SearchIndex
+        """
+        documents = []
+        for name in template_index.names:
+            entry = template_index.get(name)
+            documents.append({
+                "kind": "template",
+                "id": name,
+                "fields": {
+                    "name": local_name(name),
+                    "parameters": " ".join(entry["parameters"]),
+                },
+            })
+        for cls_info in classes:
+            documents.append({
+                "kind": "class",
+                "id": cls_info["iri"],
+                "fields": {
+                    "name": local_name(cls_info["iri"]),
+                    "label": cls_info["label"],
+                    "definition": cls_info["definition"],
+                },
+            })
+        return cls(documents)
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Indexed tokens matching a query token, with their match quality."""
+        matches: Dict[str, float] = {}
+        if token in self.postings:
+            matches[token] = EXACT_MATCH
+        if len(token) >= 3:
+            start = bisect_left(self.vocabulary, token)
+            for candidate in self.vocabulary[start:start + 50]:
+                if not candidate.startswith(token):
+                    break
+                matches.setdefault(candidate, PREFIX_MATCH)
+        if len(token) > 3 and not matches:
+            # Candidates within one insertion, deletion, substitution or transposition
+            candidates: Set[str] = set(self._deletion_index.get(token, ()))
+            for variant in _deletes(token):
+                if variant in self.postings:
+                    candidates.add(variant)
+                candidates.update(self._deletion_index.get(variant, ()))
+            for candidate in candidates:
+                matches.setdefault(candidate, TYPO_MATCH)
+        return list(matches.items())
+
+    def search(self, query: str, kind: str, limit: int = 10) -> List[Tuple[float, dict]]:
+        """Rank the documents of one kind against a query.
+
+        Args:
+            query: Free-text query
+            kind: "template" or "class"
+            limit: Maximum number of results
+
+        Returns:
+            Up to limit (score, document) pairs, best first
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, int] = defaultdict(int)
+        for token in dict.fromkeys(tokens):
+            seen: Set[int] = set()
+            expansions = self._expand(token)
+            if not expansions:
+                continue
+            # One idf per query token, so a rare prefix or typo match cannot
+            # outscore an exact match of the same word
+            idf = min(self._idf[indexed] for indexed, _ in expansions)
+            for indexed, quality in expansions:
+                for doc_no, weight in self.postings[indexed].items():
+                    if self.documents[doc_no]["kind"] != kind:
+                        continue
+                    scores[doc_no] += quality * idf * weight
+                    seen.add(doc_no)
+            for doc_no in seen:
+                matched[doc_no] += 1
+        n_tokens = len(set(tokens))
+        # Favour documents matching more of the query, then shorter names
+        ranked = heapq.nlargest(
+            limit,
+            scores.items(),
+            key=lambda item: (
+                item[1] * matched[item[0]] / n_tokens,
+                -len(self.documents[item[0]]["id"]),
+            ),
+        )
+        return [
+            (round(score * matched[doc_no] / n_tokens, 4), self.documents[doc_no])
+            for doc_no, score in ranked
+        ]
+
+
+def search_libraries(
+    indexes: Dict[str, SearchIndex],
+    query: str,
+    kind: str,
+    limit: int = 10,
+    library_names: Optional[Iterable[str]] = None,
+) -> List[dict]:
+    """Search several libraries and merge their top results.
+
+    Args:
+        indexes: Search index per library name
+        query: Free-text query
+        kind: "template" or "class"
+        limit: Maximum number of results overall
+        library_names: Libraries to search (default: all indexed libraries)
+
+    Returns:
+        List of result dicts with "library", "id", "score" and the document's "fields"
+    """
+    results = []
+    for library_name in library_names if library_names is not None else list(indexes):
+        index = indexes.get(library_name)
+        if index is None:
+            continue
+        for score, doc in index.search(query, kind, limit):
+            results.append((score, library_name, doc))
+    results.sort(key=lambda r: (-r[0], len(r[2]["id"])))
+    return [
+        {"library": library_name, "id": doc["id"], "score": score, "fields": doc["fields"]}
+        for score, library_name, doc in results[:limit]
+    ]
@@ -1,31 +1,134 @@
 """Core MCP server implementation for BuildingMOTIF."""
 
+import asyncio
 import logging
 import sys
-from typing import Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import TextContent, Tool
 
+from buildingmotif_mcp.cache import ResponseCache
+from buildingmotif_mcp.models import ModelStore
 from buildingmotif_mcp.ontology import OntologyManager
-from buildingmotif_mcp.tools import BuildingMOTIFTools
+from buildingmotif_mcp.sparql import SparqlEngine
+from buildingmotif_mcp.stats import ServerStats, StatsReporter
+from buildingmotif_mcp.tools import TEMPLATE_FIELDS, BuildingMOTIFTools
+from buildingmotif_mcp.watcher import LibraryWatcher
 
 logger = logging.getLogger(__name__)
 
+# Tools that need loaded libraries and wait for them while loading is in progress
+LIBRARY_TOOLS = {
+    "list_templates",
+    "get_template_details",
+    "evaluate_template",
+    "validate_model",
+    "search_templates",
+    "match_templates",
+    "find_class_by_keyword",
+    "is_subclass_of",
+    "get_superclasses",
+    "get_subclasses",
+    "sparql_query",
+    "match_point_labels",
+}
+
 
 class BuildingMOTIFServer:
     """MCP server for BuildingMOTIF operations."""
 
-    def __init__(self, ontology_paths=None):
+    def __init__(
+        self,
+        ontology_paths=None,
+        cache_dir=None,
+        load_workers=1,
+        load_mode="background",
+        load_timeout=20.0,
+        response_cache_bytes=16 * 1024 * 1024,
+        tool_workers=4,
+        max_in_flight=8,
+        tool_timeout=60.0,
+        tool_timeouts: Optional[Dict[str, float]] = None,
+        compact_json=False,
+        watch=False,
+        watch_interval=1.0,
+        model_memory_bytes: Optional[int] = None,
+        model_spill_dir: Optional[str] = None,
+        query_timeout=10.0,
+        query_max_rows=1000,
+        persist_templates=True,
+        stats_interval=0.0,
+        stats_file: Optional[str] = None,
+        library_memory_bytes: Optional[int] = None,
+    ):
         """Initialize the MCP server.
         
         Args:
             ontology_paths: Optional list of custom ontology paths to load
+            cache_dir: Optional directory for the persistent library cache
+            load_workers: Number of worker processes used to load libraries
+            load_mode: "background" loads all libraries in a background thread
+                once the server runs, "lazy" loads each on first use, and
+                "eager" loads all of them before the server starts
+            load_timeout: Seconds a tool call waits for a library that is still
+                loading before it returns a "loading" response
+            response_cache_bytes: Byte budget for cached get_template_details
+                responses (0 disables the cache)
+            tool_workers: Number of threads that execute tool calls
+            max_in_flight: Maximum number of tool calls admitted at once;
+                further calls wait without blocking the event loop
+            tool_timeout: Default seconds before a tool call is abandoned
+            tool_timeouts: Optional per-tool overrides of tool_timeout
+            compact_json: Encode responses without indentation by default;
+                a call can override this with its "compact" argument
+            watch: Reload libraries whose ontology files change while running
+            watch_interval: Seconds between checks for changed files
+            model_memory_bytes: Estimated bytes of server-side models to keep
+                in memory; least recently used models beyond it are moved to
+                disk (default: no limit)
+            model_spill_dir: Directory for models moved to disk (default: a
+                temporary directory)
+            query_timeout: Seconds a SPARQL query may run before it is stopped
+            query_max_rows: Largest page of rows a SPARQL query may return
+            persist_templates: Save templates with their dependencies inlined
+                in the library cache
+            stats_interval: Seconds between JSON dumps of server_stats
+                (0 disables them)
+            stats_file: File the dumps are appended to (default: stderr)
+            library_memory_bytes: Estimated bytes of loaded libraries to keep
+                in memory; least recently used libraries beyond it are
+                unloaded until next used (default: no limit)
         """
         self.server = Server("buildingmotif-mcp")
-        self.ontology_manager = OntologyManager(ontology_paths=ontology_paths)
-        self.tools = BuildingMOTIFTools(self.ontology_manager)
+        self.load_mode = load_mode
+        self.load_timeout = load_timeout
+        self.ontology_manager = OntologyManager(
+            ontology_paths=ontology_paths,
+            cache_dir=cache_dir,
+            load_workers=load_workers,
+            lazy=load_mode != "eager",
+            persist_templates=persist_templates,
+            memory_budget=library_memory_bytes,
+        )
+        self.tools = BuildingMOTIFTools(
+            self.ontology_manager,
+            ModelStore(memory_budget=model_memory_bytes, spill_dir=model_spill_dir),
+            SparqlEngine(timeout=query_timeout, max_rows=query_max_rows),
+            loaded_only=load_mode == "lazy",
+        )
+        self.response_cache = ResponseCache(response_cache_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=tool_workers, thread_name_prefix="tool")
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self.tool_timeout = tool_timeout
+        self.tool_timeouts = tool_timeouts or {}
+        self.compact_json = compact_json
+        self.watcher = LibraryWatcher(self.ontology_manager, interval=watch_interval) if watch else None
+        self.stats = ServerStats()
+        self.stats_reporter = StatsReporter(self.server_stats, stats_interval, stats_file) if stats_interval > 0 else None
 
         # Register MCP handlers
         self._register_tools()
@@ -33,16 +136,35 @@ class BuildingMOTIFServer:
     def _register_tools(self) -> None:
         """Register all available MCP tools."""
 
+        # What calls that name no library use
+        if self.load_mode == "lazy":
+            all_libraries = "the libraries loaded so far (use load_library to add others)"
+        else:
+            all_libraries = "all libraries"
+
         @self.server.list_tools()
         async def list_tools() -> list[Tool]:
             """List available tools."""
             return [
                 Tool(
                     name="list_libraries",
-                    description="List all available BuildingMOTIF libraries that have been loaded",
+                    description="List every discovered BuildingMOTIF library without loading any. Libraries are loaded on first use, so each entry has a 'status': 'discovered' (not loaded yet), 'loaded', 'unloaded' (released to save memory, reopened on next use) or 'failed' (with an 'error'). Entries also give 'name', 'metadata' (description, type, tags), 'template_count' and 'triples' (null until loaded), and 'resident_bytes', the memory the library holds in the server.",
                     inputSchema={
                         "type": "object",
-                        "properties": {},
+                        "properties": {
+                            "limit": {
+                                "type": "integer",
+                                "description": "(Optional) Maximum number of items to return. The response then includes 'total' and a 'next_cursor' for the next page.",
+                            },
+                            "cursor": {
+                                "type": "string",
+                                "description": "(Optional) 'next_cursor' from a previous call, to fetch the next page",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
                     },
                 ),
                 Tool(
@@ -53,8 +175,20 @@ class BuildingMOTIFServer:
                         "properties": {
                             "library_name": {
                                 "type": "string",
-                                "description": "(Optional) Name of the library to query (e.g., 'brick', 'ashrae-223'). If not provided, returns all templates from all libraries.",
-                            }
+                                "description": f"(Optional) Name of the library to query (e.g., 'brick', 'ashrae-223'). If not provided, returns the templates of {all_libraries}.",
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "(Optional) Maximum number of items to return. The response then includes 'total' and a 'next_cursor' for the next page.",
+                            },
+                            "cursor": {
+                                "type": "string",
+                                "description": "(Optional) 'next_cursor' from a previous call, to fetch the next page",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
                         },
                     },
                 ),
@@ -72,48 +206,969 @@ class BuildingMOTIFServer:
                                 "type": "string",
                                 "description": "Name or URI of the template",
                             },
+                            "fields": {
+                                "type": "array",
+                                "items": {
+                                    "type": "string",
+                                    "enum": list(TEMPLATE_FIELDS),
+                                },
+                                "description": "(Optional) Fields to return; default parameters, description and body. Use ['parameters'] to skip the Turtle body, or add 'inlined_body' for the body with its dependencies inlined.",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["library_name", "template_name"],
+                    },
+                ),
+                Tool(
+                    name="evaluate_template",
+                    description="Evaluate a template for one or many rows of parameter bindings in a single call and return the resulting RDF. The template and its dependencies are resolved once, so thousands of rows (e.g. every VAV in a building) are cheap. Give rows inline as 'bindings' or as a CSV/JSONL 'bindings_file'; write large results to an 'output_file' (N-Triples, .gz or .rdfb). Failed rows are reported individually.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "library_name": {
+                                "type": "string",
+                                "description": "Name of the library",
+                            },
+                            "template_name": {
+                                "type": "string",
+                                "description": "Name or URI of the template",
+                            },
+                            "bindings": {
+                                "type": "array",
+                                "items": {"type": "object"},
+                                "description": "Rows of {parameter: value}. Values are IRIs ('urn:bldg/AHU1', '<http://...>'), prefixed names using 'namespaces' ('bldg:AHU1'), bare names resolved against 'base_namespace', or {'literal': ..., 'datatype': ...}.",
+                            },
+                            "bindings_file": {
+                                "type": "string",
+                                "description": "Path to a .csv file (header row of parameter names; empty cells leave a parameter unbound) or a .jsonl file with one row object per line. Use instead of 'bindings'.",
+                            },
+                            "output_file": {
+                                "type": "string",
+                                "description": "(Optional) Path of a file to write: gzip-compressed N-Triples if it ends in .gz, compact binary if it ends in .rdfb, N-Triples otherwise. If omitted, the graph is returned as Turtle.",
+                            },
+                            "model_id": {
+                                "type": "string",
+                                "description": "(Optional) Add the triples to this model from create_model instead of returning them",
+                            },
+                            "namespaces": {
+                                "type": "object",
+                                "description": "(Optional) Prefixes for binding values, e.g. {'bldg': 'urn:bldg/'}",
+                            },
+                            "base_namespace": {
+                                "type": "string",
+                                "description": "(Optional) Namespace for binding values that are bare names, e.g. 'urn:bldg/'",
+                            },
+                            "max_errors": {
+                                "type": "integer",
+                                "description": "(Optional) Maximum number of row errors to list (default 100)",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
                         },
                         "required": ["library_name", "template_name"],
                     },
                 ),
+                Tool(
+                    name="create_model",
+                    description="Create a model held by the server, to build up across calls with add_to_model and check with validate_model instead of resending the whole model each time.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "model_id": {
+                                "type": "string",
+                                "description": "(Optional) Identifier for the model. Generated if not provided.",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                    },
+                ),
+                Tool(
+                    name="add_to_model",
+                    description="Add RDF triples to a model created with create_model.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "model_id": {
+                                "type": "string",
+                                "description": "Identifier of the model",
+                            },
+                            "rdf_content": {
+                                "type": "string",
+                                "description": "RDF to add",
+                            },
+                            "format": {
+                                "type": "string",
+                                "description": "(Optional) RDF syntax of rdf_content, e.g. 'turtle' (default), 'nt', 'json-ld'",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["model_id", "rdf_content"],
+                    },
+                ),
+                Tool(
+                    name="validate_model",
+                    description="Validate a model against the SHACL shapes of the loaded libraries. For a model from create_model, only the nodes affected by triples added since the last validation are checked again (mode 'incremental'); use mode 'full' to re-check everything. The response says which mode ran and how long it took.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "model_id": {
+                                "type": "string",
+                                "description": "Identifier of a model created with create_model",
+                            },
+                            "rdf_content": {
+                                "type": "string",
+                                "description": "Turtle to validate once, instead of a model_id",
+                            },
+                            "library_names": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": f"(Optional) Libraries whose shapes to validate against. Default: {all_libraries}.",
+                            },
+                            "mode": {
+                                "type": "string",
+                                "enum": ["auto", "incremental", "full"],
+                                "description": "(Optional) 'auto' (default) validates incrementally when a previous report exists",
+                            },
+                            "max_results": {
+                                "type": "integer",
+                                "description": "(Optional) Maximum number of validation results to list (default 100)",
+                            },
+                            "workers": {
+                                "type": "integer",
+                                "description": "(Optional) Processes to spread a full validation over (default 1). Worth it for models with thousands of entities; the response lists per-shard timings.",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                    },
+                ),
+                Tool(
+                    name="query_model",
+                    description="Run a SPARQL query (SELECT, ASK, CONSTRUCT or DESCRIBE) against a model created with create_model.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "model_id": {
+                                "type": "string",
+                                "description": "Identifier of the model",
+                            },
+                            "query": {
+                                "type": "string",
+                                "description": "SPARQL query",
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "(Optional) Maximum number of rows or triples to return (default 100)",
+                            },
+                            "cursor": {
+                                "type": "string",
+                                "description": "(Optional) 'next_cursor' from a previous call, to fetch the next page",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["model_id", "query"],
+                    },
+                ),
+                Tool(
+                    name="sparql_query",
+                    description="Run a read-only SPARQL query (SELECT, ASK, CONSTRUCT or DESCRIBE) against the union of the loaded ontologies, one library, or a model from create_model. Prefixes rdf, rdfs, owl, xsd, sh, skos, brick, s223, qudt and unit are predeclared. Results come in pages; each page runs the query again and skips the rows before the cursor, so late pages of a large result are slow: prefer a narrower query or a larger limit. Queries are stopped when they exceed the time limit.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "query": {
+                                "type": "string",
+                                "description": "SPARQL query",
+                            },
+                            "library_name": {
+                                "type": "string",
+                                "description": f"(Optional) Query only this library. Default: {all_libraries}.",
+                            },
+                            "model_id": {
+                                "type": "string",
+                                "description": "(Optional) Query this model instead of the libraries",
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "(Optional) Maximum number of rows or triples per page (default 100)",
+                            },
+                            "cursor": {
+                                "type": "string",
+                                "description": "(Optional) 'next_cursor' from a previous call, to fetch the next page",
+                            },
+                            "timeout": {
+                                "type": "number",
+                                "description": "(Optional) Seconds the query may run, up to the server's limit",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["query"],
+                    },
+                ),
+                Tool(
+                    name="export_model",
+                    description="Serialize a model created with create_model, returning the RDF or writing it to a file. For large models, write to a file as 'nt', 'nt.gz' or compact binary 'rdfb': the export streams without copying the model in memory and returns only the path, triple count, size and time.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "model_id": {
+                                "type": "string",
+                                "description": "Identifier of the model",
+                            },
+                            "format": {
+                                "type": "string",
+                                "description": "(Optional) RDF syntax, e.g. 'turtle' (default), 'nt', 'json-ld', 'xml'; with output_file also 'nt.gz' (gzip-compressed N-Triples) or 'rdfb' (compact binary)",
+                            },
+                            "output_file": {
+                                "type": "string",
+                                "description": "(Optional) Path to write the model to. If omitted, the RDF is returned.",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["model_id"],
+                    },
+                ),
+                Tool(
+                    name="delete_model",
+                    description="Delete a model created with create_model.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "model_id": {
+                                "type": "string",
+                                "description": "Identifier of the model",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["model_id"],
+                    },
+                ),
+                Tool(
+                    name="model_stats",
+                    description="Show every model's triple count, estimated memory and whether it is in memory or was moved to disk to stay within the server's memory budget.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                    },
+                ),
+                Tool(
+                    name="search_templates",
+                    description="Search templates by keyword (e.g. 'supply air temperature sensor'). Matches template and parameter names, tolerating partial words and small typos, and returns the best matches first.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "query": {
+                                "type": "string",
+                                "description": "Keywords to search for",
+                            },
+                            "library_name": {
+                                "type": "string",
+                                "description": f"(Optional) Library to search. If not provided, searches {all_libraries}.",
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "(Optional) Maximum number of results (default 10)",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["query"],
+                    },
+                ),
+                Tool(
+                    name="match_templates",
+                    description="Find the templates that can be filled with the points and equipment you have. Give the classes available (e.g. ['VAV', 'Supply_Air_Temperature_Sensor']); templates are ranked by the share of their typed parameters those classes satisfy, with subclasses counting for their superclasses. Each result lists satisfied, missing and unconstrained parameters.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "classes": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "Available classes, as IRIs, prefixed names ('brick:VAV') or local names ('VAV')",
+                            },
+                            "library_name": {
+                                "type": "string",
+                                "description": f"(Optional) Library whose templates to rank. If not provided, ranks the templates of {all_libraries}.",
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "(Optional) Maximum number of results (default 10)",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["classes"],
+                    },
+                ),
+                Tool(
+                    name="find_class_by_keyword",
+                    description="Search ontology classes by name, label and definition (e.g. 'outside air damper'), tolerating partial words and small typos, and return the best matches first.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "keyword": {
+                                "type": "string",
+                                "description": "Keywords to search for",
+                            },
+                            "library_name": {
+                                "type": "string",
+                                "description": f"(Optional) Library to search. If not provided, searches {all_libraries}.",
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "(Optional) Maximum number of results (default 10)",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["keyword"],
+                    },
+                ),
+                Tool(
+                    name="is_subclass_of",
+                    description="Check whether a class is a kind of another class (e.g. is Supply_Air_Temperature_Sensor a Temperature_Sensor?), following rdfs:subClassOf transitively. Answered from a precomputed index.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "class_name": {
+                                "type": "string",
+                                "description": "Class IRI, prefixed name ('brick:Temperature_Sensor') or local name ('Temperature_Sensor')",
+                            },
+                            "superclass_name": {
+                                "type": "string",
+                                "description": "The possible superclass, in the same forms as class_name",
+                            },
+                            "library_name": {
+                                "type": "string",
+                                "description": f"(Optional) Library whose class hierarchy to use. Default: {all_libraries}.",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["class_name", "superclass_name"],
+                    },
+                ),
+                Tool(
+                    name="get_superclasses",
+                    description="List the superclasses (ancestors) of a class, nearest first.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "class_name": {
+                                "type": "string",
+                                "description": "Class IRI, prefixed name ('brick:Temperature_Sensor') or local name ('Temperature_Sensor')",
+                            },
+                            "library_name": {
+                                "type": "string",
+                                "description": f"(Optional) Library whose class hierarchy to use. Default: {all_libraries}.",
+                            },
+                            "direct": {
+                                "type": "boolean",
+                                "description": "(Optional) Only direct superclasses (default false: all of them)",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["class_name"],
+                    },
+                ),
+                Tool(
+                    name="get_subclasses",
+                    description="List the subclasses of a class, e.g. every kind of Air_Temperature_Sensor.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "class_name": {
+                                "type": "string",
+                                "description": "Class IRI, prefixed name ('brick:Temperature_Sensor') or local name ('Temperature_Sensor')",
+                            },
+                            "library_name": {
+                                "type": "string",
+                                "description": f"(Optional) Library whose class hierarchy to use. Default: {all_libraries}.",
+                            },
+                            "direct": {
+                                "type": "boolean",
+                                "description": "(Optional) Only direct subclasses (default false: all of them)",
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "(Optional) Maximum number of items to return. The response then includes 'total' and a 'next_cursor' for the next page.",
+                            },
+                            "cursor": {
+                                "type": "string",
+                                "description": "(Optional) 'next_cursor' from a previous call, to fetch the next page",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["class_name"],
+                    },
+                ),
+                Tool(
+                    name="match_point_labels",
+                    description=f"Match BMS point labels (e.g. 'AHU1_SAT', 'VAV-2-14 DMP POS') to Brick point classes in bulk, from the point classes of {all_libraries}. Abbreviations are expanded and each label gets its top candidate classes with scores. Pass the labels directly or as a CSV/JSON Lines file; large lists can be written to a JSON Lines output file.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "labels": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "(Optional) Point labels to match",
+                            },
+                            "labels_file": {
+                                "type": "string",
+                                "description": "(Optional) Path to a .csv or .jsonl file of labels, instead of labels",
+                            },
+                            "label_column": {
+                                "type": "string",
+                                "description": "(Optional) Column or key holding the label. Default: 'label', or the first CSV column.",
+                            },
+                            "output_file": {
+                                "type": "string",
+                                "description": "(Optional) Path of a JSON Lines file to write one result per label to. If omitted, results are returned.",
+                            },
+                            "top_k": {
+                                "type": "integer",
+                                "description": "(Optional) Number of candidate classes per label (default 3)",
+                            },
+                            "max_results": {
+                                "type": "integer",
+                                "description": "(Optional) Maximum number of results returned without output_file (default 1000)",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                    },
+                ),
+                Tool(
+                    name="load_library",
+                    description="Load a library now instead of on first use, or reopen one that was unloaded. Returns its template and triple counts and estimated memory, and any libraries unloaded to stay within the server's library memory budget.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "library_name": {
+                                "type": "string",
+                                "description": "Name of the library",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["library_name"],
+                    },
+                ),
+                Tool(
+                    name="unload_library",
+                    description="Release the memory a loaded library holds (indexes, validation graphs, compiled templates). It stays available and is reopened from the database on next use.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "library_name": {
+                                "type": "string",
+                                "description": "Name of the library",
+                            },
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                        "required": ["library_name"],
+                    },
+                ),
+                Tool(
+                    name="server_stats",
+                    description="Report server performance: per-tool call and error counts, p50/p95/p99 latency and response sizes, per-library load times and template counts, startup phase timings, and cache hit rates",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "compact": {
+                                "type": "boolean",
+                                "description": "(Optional) Return JSON without indentation to save space",
+                            },
+                        },
+                    },
+                ),
             ]
 
         @self.server.call_tool()
         async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             """Handle tool calls."""
             logger.info(f"Tool called: {name} with arguments: {arguments}")
+            started = time.perf_counter()
 
             try:
-                if name == "list_libraries":
-                    result = self.tools.list_libraries()
-                elif name == "list_templates":
-                    result = self.tools.list_templates(arguments.get("library_name"))
-                elif name == "get_template_details":
-                    result = self.tools.get_template_details(
-                        arguments["library_name"],
-                        arguments["template_name"],
-                    )
+                loading = None
+                if name in LIBRARY_TOOLS:
+                    loading = await self._wait_for_libraries(arguments.get("library_name"))
+                if loading is not None:
+                    text, outcome = self._format_result(loading), "loading"
                 else:
-                    result = {"error": f"Unknown tool: {name}"}
-
-                return [TextContent(type="text", text=self._format_result(result))]
+                    text, ok = await self._run_tool(name, arguments)
+                    outcome = "ok" if ok else "error"
 
+            except asyncio.TimeoutError:
+                timeout = self.tool_timeouts.get(name, self.tool_timeout)
+                logger.warning(f"Tool {name} timed out after {timeout:g}s")
+                result = {"success": False, "error": f"Tool '{name}' timed out after {timeout:g}s"}
+                text, outcome = self._format_result(result), "timeout"
             except Exception as e:
                 logger.exception(f"Error calling tool {name}")
-                return [TextContent(type="text", text=f"Error: {str(e)}")]
+                text, outcome = f"Error: {str(e)}", "exception"
 
-    def _format_result(self, result: dict) -> str:
-        """Format result for MCP response."""
+            self.stats.record(name, time.perf_counter() - started, len(text.encode("utf-8")), outcome)
+            return [TextContent(type="text", text=text)]
+
+    def _dispatch(self, name: str, arguments: dict) -> Tuple[str, bool]:
+        """Execute a tool and render its response. Runs in a worker thread.
+
+        Returns:
+            The response text, and whether the tool succeeded
+        """
+        compact = arguments.get("compact", self.compact_json)
+        if name == "list_libraries":
+            result = self.tools.list_libraries(
+                arguments.get("limit"),
+                arguments.get("cursor"),
+            )
+        elif name == "list_templates":
+            result = self.tools.list_templates(
+                arguments.get("library_name"),
+                arguments.get("limit"),
+                arguments.get("cursor"),
+            )
+        elif name == "get_template_details":
+            return self._get_template_details_text(
+                arguments["library_name"],
+                arguments["template_name"],
+                arguments.get("fields"),
+                compact,
+            )
+        elif name == "evaluate_template":
+            result = self.tools.evaluate_template(
+                arguments["library_name"],
+                arguments["template_name"],
+                bindings=arguments.get("bindings"),
+                bindings_file=arguments.get("bindings_file"),
+                output_file=arguments.get("output_file"),
+                namespaces=arguments.get("namespaces"),
+                base_namespace=arguments.get("base_namespace"),
+                max_errors=arguments.get("max_errors", 100),
+                model_id=arguments.get("model_id"),
+            )
+        elif name == "create_model":
+            result = self.tools.create_model(arguments.get("model_id"))
+        elif name == "add_to_model":
+            result = self.tools.add_to_model(
+                arguments["model_id"],
+                arguments["rdf_content"],
+                arguments.get("format", "turtle"),
+            )
+        elif name == "validate_model":
+            result = self.tools.validate_model(
+                model_id=arguments.get("model_id"),
+                rdf_content=arguments.get("rdf_content"),
+                library_names=arguments.get("library_names"),
+                mode=arguments.get("mode", "auto"),
+                max_results=arguments.get("max_results", 100),
+                workers=arguments.get("workers", 1),
+            )
+        elif name == "query_model":
+            result = self.tools.query_model(
+                arguments["model_id"],
+                arguments["query"],
+                arguments.get("limit", 100),
+                arguments.get("cursor"),
+            )
+        elif name == "sparql_query":
+            result = self.tools.sparql_query(
+                arguments["query"],
+                library_name=arguments.get("library_name"),
+                model_id=arguments.get("model_id"),
+                limit=arguments.get("limit", 100),
+                cursor=arguments.get("cursor"),
+                timeout=arguments.get("timeout"),
+            )
+        elif name == "export_model":
+            result = self.tools.export_model(
+                arguments["model_id"],
+                arguments.get("format", "turtle"),
+                arguments.get("output_file"),
+            )
+        elif name == "delete_model":
+            result = self.tools.delete_model(arguments["model_id"])
+        elif name == "model_stats":
+            result = self.tools.model_stats()
+        elif name == "search_templates":
+            result = self.tools.search_templates(
+                arguments["query"],
+                arguments.get("library_name"),
+                arguments.get("limit", 10),
+            )
+        elif name == "match_templates":
+            result = self.tools.match_templates(
+                arguments["classes"],
+                arguments.get("library_name"),
+                arguments.get("limit", 10),
+            )
+        elif name == "find_class_by_keyword":
+            result = self.tools.find_class_by_keyword(
+                arguments["keyword"],
+                arguments.get("library_name"),
+                arguments.get("limit", 10),
+            )
+        elif name == "is_subclass_of":
+            result = self.tools.is_subclass_of(
+                arguments["class_name"],
+                arguments["superclass_name"],
+                arguments.get("library_name"),
+            )
+        elif name == "get_superclasses":
+            result = self.tools.get_superclasses(
+                arguments["class_name"],
+                arguments.get("library_name"),
+                arguments.get("direct", False),
+            )
+        elif name == "get_subclasses":
+            result = self.tools.get_subclasses(
+                arguments["class_name"],
+                arguments.get("library_name"),
+                arguments.get("direct", False),
+                arguments.get("limit"),
+                arguments.get("cursor"),
+            )
+        elif name == "match_point_labels":
+            result = self.tools.match_point_labels(
+                arguments.get("labels"),
+                arguments.get("labels_file"),
+                arguments.get("label_column"),
+                arguments.get("output_file"),
+                arguments.get("top_k", 3),
+                arguments.get("max_results", 1000),
+            )
+        elif name == "load_library":
+            result = self.tools.load_library(arguments["library_name"])
+        elif name == "unload_library":
+            result = self.tools.unload_library(arguments["library_name"])
+        elif name == "server_stats":
+            result = self.server_stats()
+        else:
+            result = {"error": f"Unknown tool: {name}"}
+
+        return self._format_result(result, compact), bool(result.get("success", "error" not in result))
+
+    def server_stats(self) -> dict:
+        """Collect tool call, library load and cache statistics.
+
+        Returns:
+            dict with per-tool statistics (slowest in total first), per-library
+            load timings, startup phase timings, loading status, library
+            memory and cache stats
+        """
+        om = self.ontology_manager
+        libraries = [
+            {"library": name, "version": om.library_versions.get(name), **stats}
+            for name, stats in list(om.library_stats.items())
+        ]
+        libraries.sort(key=lambda lib: lib.get("load_seconds", 0) + lib.get("index_seconds", 0), reverse=True)
+        models = self.tools.models.stats()
+        return {
+            "success": True,
+            **self.stats.snapshot(),
+            "libraries": libraries,
+            "startup": dict(om.startup_stats),
+            "loading": om.loading_status(),
+            "memory": om.memory_status(),
+            "caches": {
+                "responses": self.response_cache.stats(),
+                "inlined_templates": dict(om.template_cache_stats),
+                "sparql_queries": self.tools.sparql.cache.stats(),
+                "libraries": {
+                    "hits": len(om.cache.hits),
+                    "misses": len(om.cache.misses),
+                } if om.cache is not None else None,
+            },
+            "models": {
+                "count": len(models["models"]),
+                "resident_bytes": models["resident_bytes"],
+                "evictions": models["evictions"],
+                "rehydrations": models["rehydrations"],
+            },
+        }
+
+    async def _run_tool(self, name: str, arguments: dict) -> Tuple[str, bool]:
+        """Run a tool in the worker pool without blocking the event loop.
+
+        At most max_in_flight calls hold a slot at once; a slot is only given
+        back when the worker thread is done, so abandoned calls still count.
+        Cancelling the call (e.g. on an MCP cancellation notification) drops it
+        if it has not started yet and stops waiting for it otherwise.
+
+        Raises:
+            asyncio.TimeoutError: If the tool does not finish within its timeout
+        """
+        loop = asyncio.get_running_loop()
+        timeout = self.tool_timeouts.get(name, self.tool_timeout)
+
+        async def run() -> Tuple[str, bool]:
+            await self._in_flight.acquire()
+            try:
+                future = self.executor.submit(self._dispatch, name, arguments)
+            except BaseException:
+                self._in_flight.release()
+                raise
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._in_flight.release))
+            return await asyncio.wrap_future(future)
+
+        return await asyncio.wait_for(run(), timeout=timeout)
+
+    async def _wait_for_libraries(self, library_name: Optional[str]) -> Optional[dict]:
+        """Wait, off the event loop, for the libraries a tool call needs.
+
+        Args:
+            library_name: Library the call needs, or None for all libraries
+
+        Returns:
+            None once the libraries are ready, or a structured "loading"
+            response if they are not ready within the load timeout
+        """
+        om = self.ontology_manager
+        # Waits run in the tool pool, so they count against its bounded concurrency
+        loop = asyncio.get_running_loop()
+        if library_name is not None:
+            if library_name not in om.library_sources or om.is_ready(library_name):
+                return None
+            # Shield the load so it keeps going after we stop waiting for it
+            task = loop.run_in_executor(self.executor, om.get_library, library_name)
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout=self.load_timeout)
+                return None
+            except asyncio.TimeoutError:
+                pass
+        else:
+            # In lazy mode, calls without a library only use the libraries loaded so far
+            if self.load_mode == "lazy" or not om.loading_status()["pending"]:
+                return None
+            # Every call waits on the same background load rather than starting its own
+            done = om.start_background_load()
+            if await loop.run_in_executor(self.executor, done.wait, self.load_timeout):
+                return None
+
+        status = om.loading_status()
+        return {
+            "success": False,
+            "status": "loading",
+            "message": f"Libraries are still loading: {status['ready']} of {status['total']} ready. Retry shortly.",
+            **status,
+        }
+
+    def _get_template_details_text(
+        self,
+        library_name: str,
+        template_name: str,
+        fields: Optional[List[str]] = None,
+        compact: bool = False,
+    ) -> Tuple[str, bool]:
+        """Render get_template_details, reusing a cached rendering when possible.
+
+        Only successful responses are cached. The key includes the library
+        version, so reloading a library makes its old entries unreachable,
+        and the requested fields and encoding, which change the text. An
+        inlined body also depends on the libraries its dependencies come from.
+
+        Returns:
+            The response text, and whether the lookup succeeded
+        """
+        version = self.ontology_manager.library_versions.get(library_name)
+        if fields is not None and "inlined_body" in fields and library_name in self.ontology_manager.template_indexes:
+            version = self.ontology_manager.template_version(library_name, template_name)
+        key = (
+            "get_template_details",
+            library_name,
+            template_name,
+            version,
+            tuple(sorted(fields)) if fields is not None else None,
+            bool(compact),
+        )
+        text = self.response_cache.get(key)
+        if text is not None:
+            return text, True
+
+        result = self.tools.get_template_details(library_name, template_name, fields)
+        text = self._format_result(result, compact)
+        if result.get("success"):
+            self.response_cache.put(key, text)
+        return text, bool(result.get("success"))
+
+    def _format_result(self, result: dict, compact: Optional[bool] = None) -> str:
+        """Format result for MCP response.
+
+        Args:
+            result: Tool result
+            compact: Encode without whitespace (default: the server setting)
+        """
         import json
 
+        if compact is None:
+            compact = self.compact_json
+        if compact:
+            return json.dumps(result, separators=(",", ":"))
         return json.dumps(result, indent=2)
 
     async def run(self) -> None:
-        """Run the MCP server."""
-        async with stdio_server() as (read_stream, write_stream):
-            logger.info("BuildingMOTIF MCP server started")
-            await self.server.run(
-                read_stream,
-                write_stream,
-                self.server.create_initialization_options(),
-            )
+        """Run the MCP server over stdio."""
+        self._start()
+        try:
+            async with stdio_server() as (read_stream, write_stream):
+                logger.info("BuildingMOTIF MCP server started")
+                await self.server.run(
+                    read_stream,
+                    write_stream,
+                    self.server.create_initialization_options(),
+                )
+        finally:
+            self._shutdown()
+
+    async def run_http(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        uds: Optional[str] = None,
+        max_connections: int = 64,
+        shutdown_timeout: float = 10.0,
+    ) -> None:
+        """Run one long-lived server that many MCP clients share over HTTP.
+
+        Every session is served by this process, so all clients share one
+        OntologyManager and its loaded libraries. Streamable HTTP is served
+        at /mcp and the older SSE transport at /sse (posting to /messages/).
+
+        Args:
+            host: Interface to listen on (ignored when uds is given)
+            port: TCP port to listen on (ignored when uds is given)
+            uds: Optional unix socket path to listen on instead of TCP
+            max_connections: Concurrent HTTP connections, including open SSE
+                streams, beyond which new requests get 503 responses
+            shutdown_timeout: Seconds to let open sessions finish on SIGINT/SIGTERM
+        """
+        import contextlib
+
+        import uvicorn
+        from mcp.server.sse import SseServerTransport
+        from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+        from starlette.applications import Starlette
+        from starlette.responses import Response
+        from starlette.routing import Mount, Route
+
+        session_manager = StreamableHTTPSessionManager(app=self.server)
+        sse = SseServerTransport("/messages/")
+
+        class StreamableHTTPEndpoint:
+            """ASGI endpoint handing requests to the session manager."""
+
+            async def __call__(self, scope, receive, send):
+                await session_manager.handle_request(scope, receive, send)
+
+        async def handle_sse(request):
+            async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+                await self.server.run(
+                    read_stream,
+                    write_stream,
+                    self.server.create_initialization_options(),
+                )
+            return Response()
+
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            async with session_manager.run():
+                yield
+
+        app = Starlette(
+            routes=[
+                Route("/mcp", endpoint=StreamableHTTPEndpoint()),
+                Route("/sse", endpoint=handle_sse, methods=["GET"]),
+                Mount("/messages/", app=sse.handle_post_message),
+            ],
+            lifespan=lifespan,
+        )
+        config = uvicorn.Config(
+            app,
+            host=host,
+            port=port,
+            uds=uds,
+            limit_concurrency=max_connections,
+            timeout_graceful_shutdown=shutdown_timeout,
+            log_level="warning",
+        )
+
+        self._start()
+        try:
+            address = uds or f"http://{host}:{port}"
+            logger.info(f"BuildingMOTIF MCP server listening on {address} (/mcp, /sse)")
+            await uvicorn.Server(config).serve()
+        finally:
+            self._shutdown()
+
+    def _start(self) -> None:
+        """Start work shared by all transports."""
+        if self.load_mode == "background":
+            self.ontology_manager.start_background_load()
+        if self.watcher is not None:
+            self.watcher.start()
+        if self.stats_reporter is not None:
+            self.stats_reporter.start()
+
+    def _shutdown(self) -> None:
+        """Stop the worker pool and file watcher and log final statistics."""
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.stats_reporter is not None:
+            self.stats_reporter.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.tools.sharded_validator.shutdown()
+        self.tools.models.close()
+        logger.info(f"Response cache: {self.response_cache.stats()}")
+        logger.info(f"Inlined template cache: {self.ontology_manager.template_cache_stats}")
@@ -0,0 +1,183 @@
+"""Read-only SPARQL queries over libraries and models for BuildingMOTIF MCP."""
+
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from buildingmotif.namespaces import BRICK, OWL, QUDT, RDF, RDFS, S223, SH, SKOS, UNIT, XSD
+from rdflib import Graph
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.sparql import Query
+
+logger = logging.getLogger(__name__)
+
+# Prefixes every query may use without declaring them
+DEFAULT_PREFIXES = {
+    "rdf": RDF,
+    "rdfs": RDFS,
+    "owl": OWL,
+    "xsd": XSD,
+    "sh": SH,
+    "skos": SKOS,
+    "brick": BRICK,
+    "s223": S223,
+    "qudt": QUDT,
+    "unit": UNIT,
+}
+
+# Check the deadline once per this many triples read from one pattern
+_DEADLINE_CHECK_INTERVAL = 1000
+
+
+class QueryTimeout(Exception):
+    """A query ran past its deadline."""
+
+
+class _DeadlineGraph(Graph):
+    """A view of a graph that stops a query once its deadline has passed.
+
+    rdflib evaluates every triple pattern through Graph.triples, so checking
+    the clock there interrupts joins and scans that would otherwise keep a
+    worker thread busy long after the caller gave up.
+    """
+
+    def __init__(self, graph: Graph, deadline: float):
+        super().__init__(store=graph.store, identifier=graph.identifier, namespace_manager=graph.namespace_manager)
+        self._deadline = deadline
+
+    def triples(self, triple):
+        for count, found in enumerate(super().triples(triple)):
+            if count % _DEADLINE_CHECK_INTERVAL == 0 and time.monotonic() > self._deadline:
+                raise QueryTimeout()
+            yield found
+
+
+class PreparedQueryCache:
+    """LRU cache of parsed and translated SPARQL queries, keyed by query text."""
+
+    def __init__(self, max_entries: int = 256):
+        """Initialize an empty cache.
+
+        Args:
+            max_entries: Number of prepared queries to keep
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Query]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str) -> Tuple[Query, bool]:
+        """Return the prepared form of a query, preparing it on a miss.
+
+        Args:
+            query: SPARQL query text
+
+        Returns:
+            The prepared query, and whether it came from the cache
+
+        Raises:
+            ValueError: If the query cannot be parsed or is not a read-only query form
+        """
+        with self._lock:
+            prepared = self._entries.get(query)
+            if prepared is not None:
+                self._entries.move_to_end(query)
+                self.hits += 1
+                return prepared, True
+
+        try:
+            # prepareQuery only accepts SELECT, ASK, CONSTRUCT and DESCRIBE, so updates are rejected here
+            prepared = prepareQuery(query, initNs=DEFAULT_PREFIXES)
+        except Exception as e:
+            raise ValueError(f"Invalid or unsupported query (only SELECT, ASK, CONSTRUCT and DESCRIBE are allowed): {e}")
+
+        with self._lock:
+            self.misses += 1
+            self._entries[query] = prepared
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return prepared, False
+
+    def stats(self) -> dict:
+        """Hit and miss counts."""
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class SparqlEngine:
+    """Runs read-only SPARQL queries with a prepared-query cache, row limits and a timeout."""
+
+    def __init__(self, timeout: float = 10.0, max_rows: int = 1000, cache_size: int = 256):
+        """Initialize the engine.
+
+        Args:
+            timeout: Default seconds a query may run
+            max_rows: Largest page of rows (or triples) a query may return
+            cache_size: Number of prepared queries to keep
+        """
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.cache = PreparedQueryCache(cache_size)
+
+    def run(self, graph: Graph, query: str, offset: int = 0, limit: int = 100, timeout: Optional[float] = None) -> dict:
+        """Run a query and return one page of its results.
+
+        Pages are cut from the result sequence: every call runs the query
+        again and skips `offset` rows, so a page costs as much as all pages
+        before it. For queries without ORDER BY only the rows up to the end
+        of the page are computed.
+
+        Args:
+            graph: Graph to query; it is not modified
+            query: SPARQL query text
+            offset: Number of rows (or triples) to skip
+            limit: Page size, capped at max_rows
+            timeout: Seconds the query may run (default: the engine's timeout,
+                and never more than it)
+
+        Returns:
+            dict with "type", the page ("rows" and "variables", "boolean", or
+            "graph" and "triples"), "has_more", "elapsed_seconds" and "cached"
+
+        Raises:
+            ValueError: If the query is invalid
+            QueryTimeout: If the query runs past its timeout
+        """
+        limit = max(1, min(limit, self.max_rows))
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        started = time.perf_counter()
+        prepared, cached = self.cache.get(query)
+
+        view = _DeadlineGraph(graph, time.monotonic() + timeout)
+        result = view.query(prepared)
+        response: Dict = {"type": result.type}
+        if result.type == "ASK":
+            response["boolean"] = bool(result.askAnswer)
+            response["has_more"] = False
+        elif result.type == "SELECT":
+            variables = [str(var) for var in result.vars]
+            page = list(itertools.islice(result, offset, offset + limit + 1))
+            response["variables"] = variables
+            response["rows"] = [
+                {var: str(value) if value is not None else None for var, value in zip(variables, row)}
+                for row in page[:limit]
+            ]
+            response["has_more"] = len(page) > limit
+        else:
+            page = list(itertools.islice(result, offset, offset + limit + 1))
+            out = Graph()
+            for prefix, namespace in graph.namespaces():
+                out.bind(prefix, namespace)
+            for triple in page[:limit]:
+                out.add(triple)
+            response["triples"] = len(out)
+            response["graph"] = out.serialize(format="turtle")
+            response["has_more"] = len(page) > limit
+
+        response["elapsed_seconds"] = round(time.perf_counter() - started, 4)
+        response["cached"] = cached
+        return response
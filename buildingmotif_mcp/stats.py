@@ -0,0 +1,195 @@
+"""Tool call statistics and periodic stats dumps for BuildingMOTIF MCP."""
+
+import json
+import logging
+import math
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of a tool call
+OUTCOMES = ("ok", "error", "loading", "timeout", "exception")
+
+
+class Histogram:
+    """Counts of values in logarithmic buckets, for percentiles in constant memory.
+
+    Bucket i holds values up to min_value * factor**i, so a percentile is
+    read as the upper bound of its bucket and is within one bucket width
+    (10% with the default factor) of the exact value.
+    """
+
+    def __init__(self, min_value: float, factor: float = 1.1, buckets: int = 250):
+        """Initialize an empty histogram.
+
+        Args:
+            min_value: Upper bound of the first bucket
+            factor: Ratio between the bounds of neighbouring buckets
+            buckets: Number of buckets; larger values go in the last one
+        """
+        self.min_value = min_value
+        self.factor = factor
+        self._log_factor = math.log(factor)
+        self.counts: List[int] = [0] * buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        """Record one value."""
+        if value <= self.min_value:
+            bucket = 0
+        else:
+            bucket = min(len(self.counts) - 1, math.ceil(math.log(value / self.min_value) / self._log_factor))
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Estimate the value below which a fraction q of the values fall; None if empty."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.min_value * self.factor ** bucket, self.max)
+        return self.max
+
+    def summary(self, scale: float = 1.0, digits: int = 2) -> dict:
+        """Mean, p50, p95, p99 and max, multiplied by scale (e.g. 1000 for ms)."""
+
+        def scaled(value: Optional[float]) -> Optional[float]:
+            return round(value * scale, digits) if value is not None else None
+
+        return {
+            "mean": scaled(self.total / self.count if self.count else None),
+            "p50": scaled(self.percentile(0.50)),
+            "p95": scaled(self.percentile(0.95)),
+            "p99": scaled(self.percentile(0.99)),
+            "max": scaled(self.max if self.count else None),
+        }
+
+
+class ToolStats:
+    """Call counts, latencies and response sizes of one tool."""
+
+    def __init__(self):
+        self.outcomes: Counter = Counter()
+        # Seconds from receiving the call to having the response text
+        self.latency = Histogram(min_value=1e-5)
+        self.response_bytes = Histogram(min_value=16)
+
+    def to_dict(self) -> dict:
+        """Summarize the tool's calls."""
+        return {
+            "calls": self.latency.count,
+            **{outcome: self.outcomes[outcome] for outcome in OUTCOMES},
+            "total_seconds": round(self.latency.total, 4),
+            "latency_ms": self.latency.summary(scale=1000),
+            "response_bytes": {
+                "total": int(self.response_bytes.total),
+                **self.response_bytes.summary(digits=0),
+            },
+        }
+
+
+class ServerStats:
+    """Statistics of every tool call the server has answered."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._tools: Dict[str, ToolStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, tool: str, seconds: float, response_bytes: int, outcome: str) -> None:
+        """Record one tool call.
+
+        Args:
+            tool: Tool name
+            seconds: Time taken to answer the call
+            response_bytes: Size of the response text in UTF-8 bytes
+            outcome: One of OUTCOMES
+        """
+        with self._lock:
+            stats = self._tools.get(tool)
+            if stats is None:
+                stats = self._tools[tool] = ToolStats()
+            stats.outcomes[outcome] += 1
+            stats.latency.add(seconds)
+            stats.response_bytes.add(response_bytes)
+
+    def snapshot(self) -> dict:
+        """Per-tool statistics, the tools taking the most time in total first."""
+        with self._lock:
+            tools = [{"tool": name, **stats.to_dict()} for name, stats in self._tools.items()]
+        tools.sort(key=lambda t: t["total_seconds"], reverse=True)
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "calls": sum(t["calls"] for t in tools),
+            "tools": tools,
+        }
+
+
+class StatsReporter:
+    """Write a stats snapshot as one JSON line at a fixed interval.
+
+    Lines go to stderr, which MCP clients usually log, or are appended to a
+    file. A last line is written when the reporter stops.
+    """
+
+    def __init__(self, collect: Callable[[], dict], interval: float, path: Optional[str] = None):
+        """Initialize the reporter.
+
+        Args:
+            collect: Returns the snapshot to write
+            interval: Seconds between lines
+            path: File to append to (default: stderr)
+        """
+        self.collect = collect
+        self.interval = interval
+        self.path = Path(path).expanduser() if path else None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start writing in a daemon thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="stats-reporter", daemon=True)
+        self._thread.start()
+        logger.info(f"Writing server stats every {self.interval:g}s to {self.path or 'stderr'}")
+
+    def stop(self) -> None:
+        """Stop the thread and write a final line."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        self.write()
+
+    def _run(self) -> None:
+        """Body of the reporting thread."""
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self) -> None:
+        """Write one snapshot now."""
+        try:
+            line = json.dumps({"time": time.time(), **self.collect()}, separators=(",", ":"))
+            if self.path is None:
+                print(line, file=sys.stderr, flush=True)
+            else:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as out:
+                    out.write(line + "\n")
+        except Exception:
+            logger.exception("Error writing server stats")
@@ -1,60 +1,268 @@
 """MCP tools for BuildingMOTIF operations."""
 
+import base64
+import json
 import logging
-from typing import List
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import rdflib
+from buildingmotif.namespaces import BRICK
+from buildingmotif.utils import bind_prefixes
+
+from buildingmotif_mcp.evaluate import (
+    BindingError,
+    CompiledTemplate,
+    parse_binding_value,
+    read_bindings_file,
+)
+from buildingmotif_mcp.export import STREAMING_FORMATS, TripleWriter, format_for_path
+from buildingmotif_mcp.hierarchy import ClassHierarchy, related_classes
+from buildingmotif_mcp.index import TemplateIndex
+from buildingmotif_mcp.models import ModelStore
 from buildingmotif_mcp.ontology import OntologyManager
+from buildingmotif_mcp.points import PointIndex, read_labels
+from buildingmotif_mcp.search import search_libraries
+from buildingmotif_mcp.sparql import QueryTimeout, SparqlEngine
+from buildingmotif_mcp.validation import ShardedValidator, run_shacl, validate_model_graph
 
 logger = logging.getLogger(__name__)
 
+# Fields get_template_details returns when no projection is requested
+DEFAULT_TEMPLATE_FIELDS = ("parameters", "description", "body")
+# Fields a caller may request from get_template_details
+TEMPLATE_FIELDS = ("parameters", "optional_parameters", "description", "body", "inlined_body")
+
+
+def encode_cursor(offset: int) -> str:
+    """Encode a list offset as an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Decode a pagination cursor into a list offset.
+
+    Args:
+        cursor: Cursor returned as next_cursor by a previous call, or None
+
+    Returns:
+        The offset to resume from (0 for no cursor)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if not cursor:
+        return 0
+    try:
+        prefix, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        if prefix != "offset" or int(offset) < 0:
+            raise ValueError
+        return int(offset)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def paginate(items: list, limit: Optional[int], cursor: Optional[str]) -> Tuple[list, dict]:
+    """Slice one page out of a list.
+
+    Args:
+        items: The full list
+        limit: Page size, or None for everything after the cursor
+        cursor: Cursor from a previous page, or None to start at the beginning
+
+    Returns:
+        The page and a dict with "total" and "next_cursor" (None on the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed or limit is not positive
+    """
+    if limit is not None and limit < 1:
+        raise ValueError("limit must be at least 1")
+    start = decode_cursor(cursor)
+    end = len(items) if limit is None else start + limit
+    page = items[start:end]
+    return page, {
+        "total": len(items),
+        "next_cursor": encode_cursor(end) if end < len(items) else None,
+    }
+
 
 class BuildingMOTIFTools:
     """MCP tools for BuildingMOTIF operations."""
 
-    def __init__(self, ontology_manager: OntologyManager):
+    def __init__(
+        self,
+        ontology_manager: OntologyManager,
+        models: Optional[ModelStore] = None,
+        sparql: Optional[SparqlEngine] = None,
+        loaded_only: bool = False,
+    ):
         """Initialize tools with an ontology manager.
 
         Args:
             ontology_manager: OntologyManager instance
+            models: Store for server-side models (default: one without a memory budget)
+            sparql: Engine for SPARQL queries (default: 10s timeout, 1000 rows per page)
+            loaded_only: Calls that name no library use only the libraries
+                loaded so far, instead of loading every discovered one
         """
         self.om = ontology_manager
+        self.models = models if models is not None else ModelStore()
+        self.sparql = sparql if sparql is not None else SparqlEngine()
+        self.loaded_only = loaded_only
+        # (library versions, PointIndex) for match_point_labels
+        self._point_index: Optional[Tuple[tuple, PointIndex]] = None
+        self._point_index_lock = threading.Lock()
+        self.sharded_validator = ShardedValidator()
 
-    def list_libraries(self) -> dict:
+    def list_libraries(self, limit: int = None, cursor: str = None) -> dict:
         """List all available libraries with metadata.
 
+        Args:
+            limit: Maximum number of libraries to return (optional - default all)
+            cursor: next_cursor from a previous call, to continue from there
+
         Returns:
             dict with detailed library information including metadata
         """
-        libraries_info = self.om.get_all_libraries_info()
+        try:
+            libraries_info, page = paginate(self.om.get_all_libraries_info(), limit, cursor)
+        except ValueError as e:
+            return {"success": False, "error": str(e), "libraries": []}
 
-        return {
+        result = {
             "success": True,
             "count": len(libraries_info),
             "libraries": libraries_info,
         }
+        if limit is not None or cursor:
+            result.update(page)
+        return result
+
+    def load_library(self, library_name: str) -> dict:
+        """Load a library now, or reopen it if it was unloaded.
+
+        With a memory budget, loading it may unload the least recently used
+        other libraries.
+
+        Args:
+            library_name: Name of the library
+
+        Returns:
+            dict with the library's status, size and the libraries unloaded
+            to make room for it
+        """
+        available_libraries = self.om.list_libraries()
+        if library_name not in available_libraries:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' not found. Available libraries: {available_libraries}",
+            }
+
+        unloaded_before = set(self.om.unloaded)
+        started = time.perf_counter()
+        if self.om.get_library(library_name) is None:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' failed to load: {self.om.load_errors.get(library_name)}",
+            }
+        elapsed = time.perf_counter() - started
+
+        info = self.om.get_library_info(library_name)
+        return {
+            "success": True,
+            "library": library_name,
+            "status": info["status"],
+            "template_count": info["template_count"],
+            "triples": info["triples"],
+            "resident_bytes": info["resident_bytes"],
+            "elapsed_seconds": round(elapsed, 4),
+            "unloaded": sorted(set(self.om.unloaded) - unloaded_before),
+        }
+
+    def unload_library(self, library_name: str) -> dict:
+        """Release the memory a loaded library holds until it is next used.
+
+        Args:
+            library_name: Name of the library
 
-    def list_templates(self, library_name: str = None) -> dict:
+        Returns:
+            dict with the estimated bytes released and the remaining memory use
+        """
+        available_libraries = self.om.list_libraries()
+        if library_name not in available_libraries:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' not found. Available libraries: {available_libraries}",
+            }
+
+        memory = self.om.library_memory(library_name)
+        if not self.om.unload_library(library_name):
+            return {"success": False, "error": f"Library '{library_name}' is not loaded"}
+        return {
+            "success": True,
+            "library": library_name,
+            "released_bytes": memory["resident_bytes"] if memory else None,
+            "memory": self.om.memory_status(),
+        }
+
+    def list_templates(self, library_name: str = None, limit: int = None, cursor: str = None) -> dict:
         """List all available templates in a library, or all templates if no library specified.
 
+        When limit or cursor is given the response is one page of the list,
+        with "total" and a "next_cursor" to pass back for the next page.
+
         Args:
             library_name: Name of the library to query (optional - if not provided, returns all templates)
+            limit: Maximum number of templates to return (optional - default all)
+            cursor: next_cursor from a previous call, to continue from there
 
         Returns:
             dict with templates list and metadata
         """
+        paged = limit is not None or bool(cursor)
+
         # If no library specified, return all templates from all libraries
         if library_name is None:
-            all_templates = {}
-            for lib_name in self.om.list_libraries():
-                templates = self.om.list_templates(lib_name)
-                all_templates[lib_name] = templates
+            if not paged:
+                all_templates = {}
+                for lib_name in self._default_libraries():
+                    templates = self.om.list_templates(lib_name)
+                    all_templates[lib_name] = templates
 
-            total_count = sum(len(templates) for templates in all_templates.values())
+                total_count = sum(len(templates) for templates in all_templates.values())
+
+                return {
+                    "success": True,
+                    "library": "all",
+                    "count": total_count,
+                    "templates_by_library": all_templates,
+                }
+
+            # Page through the templates of all libraries as one list
+            pairs = [
+                (lib_name, template)
+                for lib_name in self._default_libraries()
+                for template in self.om.list_templates(lib_name)
+            ]
+            try:
+                pairs, page = paginate(pairs, limit, cursor)
+            except ValueError as e:
+                return {"success": False, "error": str(e), "templates_by_library": {}}
+
+            all_templates = {}
+            for lib_name, template in pairs:
+                all_templates.setdefault(lib_name, []).append(template)
 
             return {
                 "success": True,
                 "library": "all",
-                "count": total_count,
+                "count": len(pairs),
                 "templates_by_library": all_templates,
+                **page,
             }
 
         # Return templates from specific library
@@ -67,25 +275,52 @@ class BuildingMOTIFTools:
                 "templates": [],
             }
 
+        if self.om.get_library(library_name) is None:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' failed to load: {self.om.load_errors.get(library_name)}",
+                "templates": [],
+            }
+
         templates = self.om.list_templates(library_name)
+        try:
+            templates, page = paginate(templates, limit, cursor)
+        except ValueError as e:
+            return {"success": False, "error": str(e), "templates": []}
 
-        return {
+        result = {
             "success": True,
             "library": library_name,
             "count": len(templates),
             "templates": templates,
         }
+        if paged:
+            result.update(page)
+        return result
 
-    def get_template_details(self, library_name: str, template_name: str) -> dict:
+    def get_template_details(self, library_name: str, template_name: str, fields: List[str] = None) -> dict:
         """Get detailed information about a specific template.
 
         Args:
             library_name: Name of the library
             template_name: Name/URI of the template
+            fields: Fields to include (optional - default parameters, description
+                and body). Leaving out description and body answers from the
+                template index without reading the template. "inlined_body"
+                adds the body with dependencies inlined, from the compiled
+                template cache.
 
         Returns:
             dict with template details including parameters and structure
         """
+        fields = list(DEFAULT_TEMPLATE_FIELDS) if fields is None else fields
+        unknown = [field for field in fields if field not in TEMPLATE_FIELDS]
+        if unknown:
+            return {
+                "success": False,
+                "error": f"Unknown fields {unknown}. Available fields: {list(TEMPLATE_FIELDS)}",
+            }
+
         available_libraries = self.om.list_libraries()
 
         if library_name not in available_libraries:
@@ -94,10 +329,23 @@ class BuildingMOTIFTools:
                 "error": f"Library '{library_name}' not found. Available libraries: {available_libraries}",
             }
 
-        template = self.om.get_template_by_name(library_name, template_name)
+        if self.om.get_library(library_name) is None:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' failed to load: {self.om.load_errors.get(library_name)}",
+            }
+
+        index = self.om.get_template_index(library_name)
+        if index is None:
+            # The library was removed or failed to reload since it was checked
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' is no longer available",
+            }
+        entry = index.get(template_name)
 
-        if not template:
-            available_templates = self.om.list_templates(library_name)
+        if entry is None:
+            available_templates = index.names
             return {
                 "success": False,
                 "error": f"Template '{template_name}' not found in library '{library_name}'.",
@@ -105,20 +353,1112 @@ class BuildingMOTIFTools:
             }
 
         try:
-            parameters = list(template.parameters) if hasattr(template, "parameters") else []
-            body_ttl = template.body.serialize(format="turtle") if hasattr(template, "body") else ""
-
-            return {
+            result = {
                 "success": True,
                 "library": library_name,
-                "template": str(template.name),
-                "parameters": parameters,
-                "description": template.description if hasattr(template, "description") else "",
-                "body": body_ttl,
+                "template": template_name,
             }
+            if "parameters" in fields:
+                result["parameters"] = entry["parameters"]
+            if "optional_parameters" in fields:
+                result["optional_parameters"] = entry["optional_parameters"]
+
+            if "inlined_body" in fields:
+                compiled, _ = self.om.get_compiled_template(library_name, template_name)
+                graph = rdflib.Graph()
+                bind_prefixes(graph)
+                graph.addN(triple + (graph,) for triple in compiled.triples)
+                result["inlined_body"] = graph.serialize(format="turtle")
+                result["inlined_parameters"] = sorted(compiled.parameters)
+
+            if "description" in fields or "body" in fields:
+                # The template body is read lazily from the database
+                with self.om.reading_template(library_name, template_name) as found:
+                    if found is None:
+                        raise ValueError(f"Template '{template_name}' could not be loaded")
+                    entry, template = found
+                    if "parameters" in fields:
+                        result["parameters"] = entry["parameters"]
+                    if "optional_parameters" in fields:
+                        result["optional_parameters"] = entry["optional_parameters"]
+                    if "description" in fields:
+                        result["description"] = template.description if hasattr(template, "description") else ""
+                    if "body" in fields:
+                        result["body"] = template.body.serialize(format="turtle") if hasattr(template, "body") else ""
+
+            return result
         except Exception as e:
             logger.error(f"Error getting template details: {e}")
             return {
                 "success": False,
                 "error": f"Error retrieving template details: {str(e)}",
             }
+
+    def evaluate_template(
+        self,
+        library_name: str,
+        template_name: str,
+        bindings: List[dict] = None,
+        bindings_file: str = None,
+        output_file: str = None,
+        namespaces: Dict[str, str] = None,
+        base_namespace: str = None,
+        max_errors: int = 100,
+        model_id: str = None,
+    ) -> dict:
+        """Evaluate a template for many rows of parameter bindings in one call.
+
+        The template and its dependencies are resolved once, and kept for
+        later calls; each row then only substitutes its bindings. Rows that
+        fail are reported and skipped.
+
+        Args:
+            library_name: Name of the library
+            template_name: Name/URI of the template
+            bindings: List of {parameter: value} rows
+            bindings_file: Path to a .csv (header row of parameter names) or
+                .jsonl file of rows, instead of bindings
+            output_file: Optional path of a file to stream the triples to:
+                gzip-compressed N-Triples if it ends in .gz, rdfb if it ends
+                in .rdfb, N-Triples otherwise; without it or model_id the
+                graph is returned as Turtle
+            namespaces: Optional prefix -> namespace IRI map for prefixed values
+            base_namespace: Optional namespace for values that are bare names
+            max_errors: Maximum number of row errors listed in the response
+            model_id: Optional model created with create_model to add the
+                triples to, instead of returning them
+
+        Returns:
+            dict with the graph, output file or model, per-row errors and throughput stats
+        """
+        if (bindings is None) == (bindings_file is None):
+            return {
+                "success": False,
+                "error": "Provide exactly one of 'bindings' or 'bindings_file'.",
+            }
+        if output_file is not None and model_id is not None:
+            return {
+                "success": False,
+                "error": "Provide at most one of 'output_file' or 'model_id'.",
+            }
+        if model_id is not None and self.models.get(model_id) is None:
+            return self._model_not_found(model_id)
+
+        error = self._template_error(library_name, template_name)
+        if error is not None:
+            return error
+
+        namespaces = namespaces or {}
+        started = time.perf_counter()
+        try:
+            compiled, compiled_from = self.om.get_compiled_template(library_name, template_name)
+        except Exception as e:
+            logger.error(f"Error compiling template '{template_name}': {e}")
+            return {
+                "success": False,
+                "error": f"Error resolving template '{template_name}': {str(e)}",
+            }
+        compile_seconds = time.perf_counter() - started
+
+        try:
+            rows = bindings if bindings is not None else read_bindings_file(Path(bindings_file).expanduser())
+            if output_file is not None:
+                output_path = Path(output_file).expanduser()
+                with TripleWriter(output_path, format_for_path(output_path)) as writer:
+                    stats = self._expand_rows(compiled, rows, namespaces, base_namespace, max_errors,
+                                              writer.write)
+            elif model_id is not None:
+                with self.models.checkout(model_id) as session:
+                    if session is None:
+                        return self._model_not_found(model_id)
+                    stats = self._expand_rows(compiled, rows, namespaces, base_namespace, max_errors,
+                                              session.add_triples)
+                    for prefix, namespace in namespaces.items():
+                        session.graph.bind(prefix, namespace, override=False)
+                    model_triples = len(session.graph)
+            else:
+                graph = rdflib.Graph()
+                stats = self._expand_rows(compiled, rows, namespaces, base_namespace, max_errors,
+                                          lambda triples: graph.addN(triple + (graph,) for triple in triples))
+        except (OSError, ValueError) as e:
+            return {
+                "success": False,
+                "error": f"Error evaluating bindings: {str(e)}",
+            }
+
+        elapsed = time.perf_counter() - started
+        result = {
+            "success": True,
+            "library": library_name,
+            "template": template_name,
+            "rows": stats["rows"],
+            "rows_ok": stats["rows_ok"],
+            "rows_failed": stats["rows_failed"],
+            "triples": stats["triples"],
+            "errors": stats["errors"],
+            "stats": {
+                "compile_seconds": round(compile_seconds, 4),
+                "compiled_from": compiled_from,
+                "elapsed_seconds": round(elapsed, 4),
+                "rows_per_second": round(stats["rows"] / elapsed, 1) if elapsed else None,
+                "triples_per_second": round(stats["triples"] / elapsed, 1) if elapsed else None,
+            },
+        }
+        if output_file is not None:
+            result["output_file"] = str(output_path)
+            result["format"] = writer.format
+            result["bytes"] = writer.bytes
+        elif model_id is not None:
+            result["model_id"] = model_id
+            result["model_triples"] = model_triples
+        else:
+            bind_prefixes(graph)
+            for prefix, namespace in namespaces.items():
+                graph.bind(prefix, namespace)
+            result["graph"] = graph.serialize(format="turtle")
+        return result
+
+    def _expand_rows(
+        self,
+        compiled: CompiledTemplate,
+        rows: Iterable[dict],
+        namespaces: Dict[str, str],
+        base_namespace: Optional[str],
+        max_errors: int,
+        emit: Callable[[list], None],
+    ) -> dict:
+        """Expand every row of bindings, passing the triples of good rows to emit."""
+        stats = {"rows": 0, "rows_ok": 0, "rows_failed": 0, "triples": 0, "errors": []}
+        for row_no, row in enumerate(rows):
+            stats["rows"] += 1
+            try:
+                if not isinstance(row, dict):
+                    raise BindingError(f"Row must be an object of parameter bindings, got {type(row).__name__}")
+                if "__error__" in row:
+                    raise BindingError(row["__error__"])
+                unknown = set(row) - compiled.parameters
+                if unknown:
+                    raise BindingError(f"Unknown parameters: {sorted(unknown)}")
+                terms = {
+                    param: parse_binding_value(value, namespaces, base_namespace)
+                    for param, value in row.items()
+                }
+                triples = compiled.expand(terms)
+            except BindingError as e:
+                stats["rows_failed"] += 1
+                if len(stats["errors"]) < max_errors:
+                    stats["errors"].append({"row": row_no, "error": str(e)})
+                continue
+            emit(triples)
+            stats["rows_ok"] += 1
+            stats["triples"] += len(triples)
+        return stats
+
+    def _template_error(self, library_name: str, template_name: str) -> Optional[dict]:
+        """Return an error dict if a template cannot be used, else None."""
+        available_libraries = self.om.list_libraries()
+        if library_name not in available_libraries:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' not found. Available libraries: {available_libraries}",
+            }
+
+        index = self.om.get_template_index(library_name)
+        if index is None:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' failed to load: {self.om.load_errors.get(library_name)}",
+            }
+
+        if template_name not in index:
+            return {
+                "success": False,
+                "error": f"Template '{template_name}' not found in library '{library_name}'.",
+                "hint": "Use search_templates to find template names.",
+            }
+        return None
+
+    def create_model(self, model_id: str = None) -> dict:
+        """Create a server-side model that can be added to and validated across calls.
+
+        Args:
+            model_id: Identifier for the model (optional - generated if not provided)
+
+        Returns:
+            dict with the model id
+        """
+        try:
+            session = self.models.create(model_id)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+
+        return {
+            "success": True,
+            "model_id": session.model_id,
+        }
+
+    def add_to_model(self, model_id: str, rdf_content: str, format: str = "turtle") -> dict:
+        """Add RDF to a model.
+
+        Args:
+            model_id: Identifier of the model
+            rdf_content: RDF to add
+            format: RDF syntax of rdf_content (default turtle)
+
+        Returns:
+            dict with the number of triples added and the model size
+        """
+        if self.models.get(model_id) is None:
+            return self._model_not_found(model_id)
+
+        try:
+            graph = rdflib.Graph()
+            graph.parse(data=rdf_content, format=format)
+        except Exception as e:
+            return {"success": False, "error": f"Could not parse RDF: {str(e)}"}
+
+        with self.models.checkout(model_id) as session:
+            if session is None:
+                return self._model_not_found(model_id)
+            added = session.add(graph)
+            triples = len(session.graph)
+        return {
+            "success": True,
+            "model_id": model_id,
+            "triples_added": added,
+            "triples": triples,
+        }
+
+    def validate_model(
+        self,
+        model_id: str = None,
+        rdf_content: str = None,
+        library_names: List[str] = None,
+        mode: str = "auto",
+        max_results: int = 100,
+        workers: int = 1,
+    ) -> dict:
+        """Validate a model against the SHACL shapes of the loaded libraries.
+
+        For a model created with create_model, only the focus nodes affected
+        by triples added since the last validation are checked again, and
+        their results merged into the previous report. With more than one
+        worker, full runs split the model into shards validated in parallel
+        processes.
+
+        Args:
+            model_id: Identifier of a model created with create_model
+            rdf_content: Turtle to validate once, instead of a model
+            library_names: Libraries whose shapes to use (optional - default all)
+            mode: "auto" (incremental when possible), "incremental" or "full"
+            max_results: Maximum number of validation results listed
+            workers: Worker processes for a full run (capped at the CPU count)
+
+        Returns:
+            dict with conformance, the mode that ran, its duration and the results
+        """
+        if (model_id is None) == (rdf_content is None):
+            return {
+                "success": False,
+                "error": "Provide exactly one of 'model_id' or 'rdf_content'.",
+            }
+        if mode not in {"auto", "incremental", "full"}:
+            return {
+                "success": False,
+                "error": f"Unknown mode '{mode}'. Use 'auto', 'incremental' or 'full'.",
+            }
+        if not isinstance(workers, int) or workers < 1:
+            return {
+                "success": False,
+                "error": f"workers must be a positive integer, got {workers!r}",
+            }
+        workers = min(workers, os.cpu_count() or 1)
+        if library_names is None and self.loaded_only:
+            library_names = self._default_libraries()
+            if not library_names:
+                return self._no_library_loaded()
+
+        try:
+            shapes_key, shapes_graph = self.om.get_shapes_graph(library_names)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+
+        try:
+            if model_id is None:
+                graph = rdflib.Graph()
+                graph.parse(data=rdf_content, format="turtle")
+                if workers > 1:
+                    results, run = self.sharded_validator.validate(graph, shapes_graph, shapes_key, workers)
+                else:
+                    started = time.perf_counter()
+                    results = run_shacl(graph, shapes_graph)
+                    run = {"mode": "full", "focus_nodes": None, "elapsed_seconds": round(time.perf_counter() - started, 4)}
+                conforms = not any(r["severity"] == "Violation" for r in results)
+            else:
+                with self.models.checkout(model_id) as session:
+                    if session is None:
+                        return self._model_not_found(model_id)
+                    state, run = validate_model_graph(
+                        session.graph, shapes_graph, shapes_key, session.validation, session.touched, mode,
+                        sharded=self.sharded_validator, workers=workers,
+                    )
+                    session.validation = state
+                    session.touched = set()
+                    results = state.results
+                    conforms = state.conforms
+        except Exception as e:
+            logger.error(f"Error validating model: {e}")
+            return {
+                "success": False,
+                "error": f"Error validating model: {str(e)}",
+            }
+
+        return {
+            "success": True,
+            "model_id": model_id,
+            "conforms": conforms,
+            "libraries": [name for name, _ in shapes_key],
+            **run,
+            "result_count": len(results),
+            "results": results[:max_results],
+        }
+
+    def query_model(self, model_id: str, query: str, limit: int = 100, cursor: str = None) -> dict:
+        """Run a SPARQL query against a model.
+
+        Same as sparql_query with a model_id.
+
+        Args:
+            model_id: Identifier of the model
+            query: SPARQL SELECT, ASK, CONSTRUCT or DESCRIBE query
+            limit: Maximum number of rows (or triples) returned
+            cursor: next_cursor from a previous call, to continue from there
+
+        Returns:
+            dict with the rows of a SELECT, the answer of an ASK, or the graph
+            of a CONSTRUCT/DESCRIBE as Turtle
+        """
+        return self.sparql_query(query, model_id=model_id, limit=limit, cursor=cursor)
+
+    def sparql_query(
+        self,
+        query: str,
+        library_name: str = None,
+        model_id: str = None,
+        limit: int = 100,
+        cursor: str = None,
+        timeout: float = None,
+    ) -> dict:
+        """Run a read-only SPARQL query against the libraries or a model.
+
+        Args:
+            query: SPARQL SELECT, ASK, CONSTRUCT or DESCRIBE query; common
+                prefixes (rdf, rdfs, owl, sh, brick, s223, ...) are predeclared
+            library_name: Query only this library's ontology graph
+                (optional - default the union of all loaded libraries)
+            model_id: Query this model from create_model instead of the libraries
+            limit: Maximum number of rows (or triples) returned
+            cursor: next_cursor from a previous call, to continue from there
+            timeout: Seconds the query may run (capped at the server's limit)
+
+        Returns:
+            dict with one page of results, "next_cursor", "elapsed_seconds"
+            and whether the parsed query came from the cache
+        """
+        if library_name is not None and model_id is not None:
+            return {
+                "success": False,
+                "error": "Provide at most one of 'library_name' or 'model_id'.",
+            }
+        try:
+            offset = decode_cursor(cursor)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+
+        if model_id is not None:
+            with self.models.checkout(model_id) as session:
+                if session is None:
+                    return self._model_not_found(model_id)
+                result = self._run_query(session.graph, query, offset, limit, timeout)
+            target = {"model_id": model_id}
+        else:
+            library_names = [library_name] if library_name else None
+            if library_names is None and self.loaded_only:
+                library_names = self._default_libraries()
+                if not library_names:
+                    return self._no_library_loaded()
+            try:
+                shapes_key, graph = self.om.get_shapes_graph(library_names)
+            except ValueError as e:
+                return {"success": False, "error": str(e)}
+            result = self._run_query(graph, query, offset, limit, timeout)
+            target = {"libraries": [name for name, _ in shapes_key]}
+
+        if result.get("success") is False:
+            return result
+        has_more = result.pop("has_more")
+        count = len(result["rows"]) if "rows" in result else result.get("triples", 0)
+        return {
+            "success": True,
+            **target,
+            **result,
+            "count": count,
+            "next_cursor": encode_cursor(offset + count) if has_more else None,
+        }
+
+    def _run_query(self, graph: rdflib.Graph, query: str, offset: int, limit: int, timeout: Optional[float]) -> dict:
+        """Run a query with the SPARQL engine, turning failures into an error dict."""
+        started = time.perf_counter()
+        try:
+            return self.sparql.run(graph, query, offset, limit, timeout)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+        except QueryTimeout:
+            elapsed = time.perf_counter() - started
+            logger.warning(f"SPARQL query stopped after {elapsed:.1f}s")
+            return {
+                "success": False,
+                "error": f"Query stopped after {elapsed:.1f}s; it exceeded the time limit. Narrow it or add LIMIT.",
+                "elapsed_seconds": round(elapsed, 4),
+            }
+        except Exception as e:
+            logger.error(f"Error running SPARQL query: {e}")
+            return {"success": False, "error": f"Error running query: {str(e)}"}
+
+    def export_model(self, model_id: str, format: str = "turtle", output_file: str = None) -> dict:
+        """Serialize a model.
+
+        With output_file and a streaming format ("nt", "nt.gz" or "rdfb"),
+        triples are written as they are read, so the export does not build a
+        second copy of the model in memory, and a model moved to disk is read
+        from there without being loaded back.
+
+        Args:
+            model_id: Identifier of the model
+            format: RDF syntax, e.g. "turtle" (default), "nt", "json-ld",
+                "xml", or "nt.gz" / "rdfb" with output_file
+            output_file: Optional path to write to; without it the RDF is returned
+
+        Returns:
+            dict with the RDF, or the path, triple count, size and time of the written file
+        """
+        if output_file is not None and format in STREAMING_FORMATS:
+            return self._stream_model(model_id, format, Path(output_file).expanduser())
+        if format in STREAMING_FORMATS and format != "nt":
+            return {
+                "success": False,
+                "error": f"Format '{format}' is only written to a file; provide 'output_file'.",
+            }
+
+        with self.models.checkout(model_id) as session:
+            if session is None:
+                return self._model_not_found(model_id)
+            try:
+                if output_file is None:
+                    return {
+                        "success": True,
+                        "model_id": model_id,
+                        "format": format,
+                        "triples": len(session.graph),
+                        "rdf_content": session.graph.serialize(format=format),
+                    }
+                started = time.perf_counter()
+                output_path = Path(output_file).expanduser()
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                session.graph.serialize(destination=str(output_path), format=format)
+                return {
+                    "success": True,
+                    "model_id": model_id,
+                    "format": format,
+                    "triples": len(session.graph),
+                    "output_file": str(output_path),
+                    "bytes": output_path.stat().st_size,
+                    "elapsed_seconds": round(time.perf_counter() - started, 4),
+                }
+            except Exception as e:
+                logger.error(f"Error exporting model '{model_id}': {e}")
+                return {"success": False, "error": f"Error exporting model: {str(e)}"}
+
+    def _stream_model(self, model_id: str, format: str, output_path: Path) -> dict:
+        """Write a model to a file in a streaming format."""
+        started = time.perf_counter()
+        with self.models.reading(model_id) as reading:
+            if reading is None:
+                return self._model_not_found(model_id)
+            session, triples = reading
+            spill_file = self.models.spill_file(session)
+            try:
+                with TripleWriter(output_path, format) as writer:
+                    if spill_file is not None and format != "rdfb":
+                        # The model is already on disk as N-Triples
+                        writer.copy_ntriples(spill_file)
+                    else:
+                        writer.write(triples)
+            except Exception as e:
+                logger.error(f"Error exporting model '{model_id}': {e}")
+                output_path.unlink(missing_ok=True)
+                return {"success": False, "error": f"Error exporting model: {str(e)}"}
+        return {
+            "success": True,
+            "model_id": model_id,
+            "format": format,
+            "triples": writer.triples,
+            "output_file": str(output_path),
+            "bytes": writer.bytes,
+            "elapsed_seconds": round(time.perf_counter() - started, 4),
+            "from_disk": spill_file is not None,
+        }
+
+    def delete_model(self, model_id: str) -> dict:
+        """Delete a model and free its memory.
+
+        Args:
+            model_id: Identifier of the model
+
+        Returns:
+            dict saying whether the model was deleted
+        """
+        if not self.models.delete(model_id):
+            return self._model_not_found(model_id)
+        return {"success": True, "model_id": model_id}
+
+    def model_stats(self) -> dict:
+        """Report the size of every model and whether it is in memory or on disk.
+
+        Returns:
+            dict with per-model triple counts and sizes, and totals against the memory budget
+        """
+        return {"success": True, **self.models.stats()}
+
+    def _default_libraries(self) -> List[str]:
+        """Libraries a call that names none uses: all of them, or with loaded_only those loaded so far."""
+        if not self.loaded_only:
+            return self.om.list_libraries()
+        # Libraries unloaded to save memory were loaded before and reopen without parsing
+        return [name for name in self.om.list_libraries() if name in self.om.libraries or name in self.om.unloaded]
+
+    def _no_library_loaded(self) -> dict:
+        """Error for a call that needs libraries when none is loaded and none was named."""
+        return {
+            "success": False,
+            "error": "No library is loaded yet. Name the libraries to use, or load one with load_library.",
+            "libraries": self.om.list_libraries(),
+        }
+
+    def _model_not_found(self, model_id: str) -> dict:
+        """Error dict for an unknown model id."""
+        return {
+            "success": False,
+            "error": f"Model '{model_id}' not found. Available models: {self.models.list()}",
+        }
+
+    def search_templates(self, query: str, library_name: str = None, limit: int = 10) -> dict:
+        """Search templates by keyword across one or all libraries.
+
+        Matches template names and parameter names, tolerating partial words
+        and small typos.
+
+        Args:
+            query: Keywords, e.g. "supply air temp sensor"
+            library_name: Library to search (optional - if not provided, searches all libraries)
+            limit: Maximum number of results
+
+        Returns:
+            dict with ranked matching templates
+        """
+        indexes = self._search_indexes(library_name)
+        if isinstance(indexes, dict) and indexes.get("success") is False:
+            return indexes
+
+        results = []
+        for hit in search_libraries(indexes, query, "template", limit):
+            results.append({
+                "library": hit["library"],
+                "template": hit["id"],
+                "score": hit["score"],
+                "parameters": hit["fields"]["parameters"].split(),
+            })
+
+        return {
+            "success": True,
+            "query": query,
+            "count": len(results),
+            "results": results,
+        }
+
+    def find_class_by_keyword(self, keyword: str, library_name: str = None, limit: int = 10) -> dict:
+        """Search ontology classes by name, rdfs:label and skos:definition.
+
+        Args:
+            keyword: Keywords, e.g. "outside air damper"
+            library_name: Library to search (optional - if not provided, searches all libraries)
+            limit: Maximum number of results
+
+        Returns:
+            dict with ranked matching classes
+        """
+        indexes = self._search_indexes(library_name)
+        if isinstance(indexes, dict) and indexes.get("success") is False:
+            return indexes
+
+        results = [
+            {
+                "library": hit["library"],
+                "class": hit["id"],
+                "score": hit["score"],
+                "label": hit["fields"]["label"],
+                "definition": hit["fields"]["definition"],
+            }
+            for hit in search_libraries(indexes, keyword, "class", limit)
+        ]
+
+        return {
+            "success": True,
+            "keyword": keyword,
+            "count": len(results),
+            "results": results,
+        }
+
+    def is_subclass_of(self, class_name: str, superclass_name: str, library_name: str = None) -> dict:
+        """Check whether a class is a kind of another class.
+
+        Args:
+            class_name: Class IRI, prefixed name or local name, e.g. "Air_Temperature_Sensor"
+            superclass_name: The possible superclass, in the same forms
+            library_name: Library whose hierarchy to use (optional - default all libraries)
+
+        Returns:
+            dict with both class IRIs and "is_subclass"
+        """
+        hierarchies = self._class_hierarchies(library_name)
+        if isinstance(hierarchies, dict):
+            return hierarchies
+        class_iri = self._resolve_class(class_name, hierarchies)
+        if isinstance(class_iri, dict):
+            return class_iri
+        superclass_iri = self._resolve_class(superclass_name, hierarchies)
+        if isinstance(superclass_iri, dict):
+            return superclass_iri
+
+        is_subclass = class_iri == superclass_iri or any(
+            hierarchy.is_subclass(class_iri, superclass_iri) for hierarchy in hierarchies
+        )
+        if not is_subclass and len(hierarchies) > 1:
+            # The chain may run through more than one library
+            is_subclass = superclass_iri in related_classes(hierarchies, class_iri, upward=True)
+        return {
+            "success": True,
+            "class": class_iri,
+            "superclass": superclass_iri,
+            "is_subclass": is_subclass,
+        }
+
+    def get_superclasses(self, class_name: str, library_name: str = None, direct: bool = False) -> dict:
+        """List the superclasses of a class, nearest first.
+
+        Args:
+            class_name: Class IRI, prefixed name or local name
+            library_name: Library whose hierarchy to use (optional - default all libraries)
+            direct: Only list direct superclasses
+
+        Returns:
+            dict with the class IRI and its superclasses
+        """
+        hierarchies = self._class_hierarchies(library_name)
+        if isinstance(hierarchies, dict):
+            return hierarchies
+        class_iri = self._resolve_class(class_name, hierarchies)
+        if isinstance(class_iri, dict):
+            return class_iri
+
+        superclasses = related_classes(hierarchies, class_iri, upward=True, direct=direct)
+        return {
+            "success": True,
+            "class": class_iri,
+            "direct": direct,
+            "count": len(superclasses),
+            "superclasses": superclasses,
+        }
+
+    def get_subclasses(
+        self,
+        class_name: str,
+        library_name: str = None,
+        direct: bool = False,
+        limit: int = None,
+        cursor: str = None,
+    ) -> dict:
+        """List the subclasses of a class.
+
+        Args:
+            class_name: Class IRI, prefixed name or local name, e.g. "Point"
+            library_name: Library whose hierarchy to use (optional - default all libraries)
+            direct: Only list direct subclasses
+            limit: Maximum number of subclasses to return (optional - default all)
+            cursor: next_cursor from a previous call, to continue from there
+
+        Returns:
+            dict with the class IRI and its subclasses, sorted by IRI
+        """
+        hierarchies = self._class_hierarchies(library_name)
+        if isinstance(hierarchies, dict):
+            return hierarchies
+        class_iri = self._resolve_class(class_name, hierarchies)
+        if isinstance(class_iri, dict):
+            return class_iri
+
+        subclasses = related_classes(hierarchies, class_iri, upward=False, direct=direct)
+        if len(hierarchies) > 1:
+            subclasses.sort()
+        try:
+            subclasses, page = paginate(subclasses, limit, cursor)
+        except ValueError as e:
+            return {"success": False, "error": str(e), "subclasses": []}
+
+        result = {
+            "success": True,
+            "class": class_iri,
+            "direct": direct,
+            "count": len(subclasses),
+            "subclasses": subclasses,
+        }
+        if limit is not None or cursor:
+            result.update(page)
+        return result
+
+    def match_templates(self, classes: List[str], library_name: str = None, limit: int = 10) -> dict:
+        """Rank templates by how completely a set of available classes can fill them.
+
+        A parameter is satisfied when one of the available classes is, or is
+        a subclass of, a class the template gives it, or the class of the
+        template the parameter is bound to as a dependency. Candidates come
+        from the reverse index built at library load, so no template body is
+        read.
+
+        Args:
+            classes: Classes of the points and equipment at hand, as IRIs,
+                prefixed names or local names
+            library_name: Library whose templates to rank (optional - default all libraries)
+            limit: Maximum number of templates to return
+
+        Returns:
+            dict with the ranked templates, each with its satisfied, missing
+            and unconstrained parameters
+        """
+        indexes = self._template_indexes(library_name)
+        if isinstance(indexes, dict) and indexes.get("success") is False:
+            return indexes
+        hierarchies = self._class_hierarchies()
+
+        # Every class a template may ask for that an available class can fill,
+        # with the available class and how far up its hierarchy it is
+        provided: Dict[str, Tuple[str, int]] = {}
+        unresolved = []
+        for class_name in classes:
+            class_iri = self._resolve_class(class_name, hierarchies)
+            if isinstance(class_iri, dict):
+                unresolved.append({"class": class_name, "error": class_iri["error"]})
+                continue
+            superclasses = related_classes(hierarchies, class_iri, upward=True)
+            for distance, iri in enumerate([class_iri] + superclasses):
+                if iri not in provided or provided[iri][1] > distance:
+                    provided[iri] = (class_iri, distance)
+
+        candidates = set()
+        for lib_name, index in indexes.items():
+            for iri in provided:
+                for template_name in index.templates_for_class(iri):
+                    candidates.add((lib_name, template_name))
+        # Templates that depend on a candidate may be filled through it
+        for lib_name, template_name in list(candidates):
+            for index_name, index in indexes.items():
+                for dependent in index.dependents(template_name):
+                    candidates.add((index_name, dependent))
+
+        results = []
+        for lib_name, template_name in candidates:
+            match = self._match_template(lib_name, indexes[lib_name], template_name, provided)
+            if match is not None:
+                results.append(match)
+        results.sort(key=lambda r: (-r["score"], -len(r["satisfied"]), r["_distance"], r["template"]))
+        for result in results:
+            del result["_distance"]
+
+        return {
+            "success": True,
+            "classes": sorted({iri for iri, _ in provided.values()}),
+            "unresolved": unresolved,
+            "total": len(results),
+            "count": min(len(results), limit),
+            "results": results[:limit],
+        }
+
+    def _match_template(
+        self,
+        library_name: str,
+        index: TemplateIndex,
+        template_name: str,
+        provided: Dict[str, Tuple[str, int]],
+    ) -> Optional[dict]:
+        """Score one template of a library's index against the classes the caller can provide."""
+        entry = index.get(template_name)
+        required = [p for p in entry["parameters"] if p not in entry["optional_parameters"]]
+        wanted: Dict[str, set] = {param: set(entry["parameter_classes"].get(param, [])) for param in required}
+        for dependency in entry["dependencies"]:
+            param = dependency["args"].get("name")
+            if param in wanted:
+                wanted[param].update(self._dependency_classes(dependency["template"], library_name, index))
+
+        satisfied, missing, unconstrained = {}, {}, []
+        distance = 0
+        for param in required:
+            if not wanted[param]:
+                unconstrained.append(param)
+                continue
+            fills = [provided[cls] for cls in wanted[param] if cls in provided]
+            if fills:
+                class_iri, steps = min(fills, key=lambda fill: fill[1])
+                satisfied[param] = class_iri
+                distance += steps
+            else:
+                missing[param] = sorted(wanted[param])
+        if not satisfied:
+            return None
+        return {
+            "library": library_name,
+            "template": template_name,
+            "score": round(len(satisfied) / (len(satisfied) + len(missing)), 4),
+            "satisfied": satisfied,
+            "missing": missing,
+            "unconstrained": unconstrained,
+            "_distance": distance,
+        }
+
+    def _dependency_classes(self, template_name: str, library_name: str, index: TemplateIndex) -> List[str]:
+        """Classes of the "name" parameter of a dependency template, found in its own or any loaded library."""
+        others = [other for name, other in list(self.om.template_indexes.items()) if name != library_name]
+        for candidate in [index] + others:
+            entry = candidate.get(template_name)
+            if entry is not None:
+                return entry["parameter_classes"].get("name", [])
+        return []
+
+    def _template_indexes(self, library_name: str = None):
+        """Collect the template indexes to consult, or an error dict for an unusable library."""
+        if library_name is None:
+            indexes = {}
+            for lib_name in self._default_libraries():
+                index = self.om.get_template_index(lib_name)
+                if index is not None:
+                    indexes[lib_name] = index
+            return indexes
+
+        available_libraries = self.om.list_libraries()
+        if library_name not in available_libraries:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' not found. Available libraries: {available_libraries}",
+                "results": [],
+            }
+
+        index = self.om.get_template_index(library_name)
+        if index is None:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' failed to load: {self.om.load_errors.get(library_name)}",
+                "results": [],
+            }
+        return {library_name: index}
+
+    def _class_hierarchies(self, library_name: str = None):
+        """Collect the class hierarchies to consult, or an error dict for an unusable library."""
+        if library_name is None:
+            hierarchies = []
+            for lib_name in self._default_libraries():
+                hierarchy = self.om.get_class_hierarchy(lib_name)
+                if hierarchy is not None:
+                    hierarchies.append(hierarchy)
+            return hierarchies
+
+        available_libraries = self.om.list_libraries()
+        if library_name not in available_libraries:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' not found. Available libraries: {available_libraries}",
+            }
+
+        hierarchy = self.om.get_class_hierarchy(library_name)
+        if hierarchy is None:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' failed to load: {self.om.load_errors.get(library_name)}",
+            }
+        return [hierarchy]
+
+    def _resolve_class(self, class_name: str, hierarchies: List[ClassHierarchy]):
+        """Turn a class name into a class IRI, or an error dict if it is unknown or ambiguous."""
+        candidates = sorted({iri for hierarchy in hierarchies for iri in hierarchy.resolve(class_name)})
+        if len(candidates) == 1:
+            return candidates[0]
+        if not candidates:
+            return {
+                "success": False,
+                "error": f"Class '{class_name}' not found.",
+                "hint": "Use find_class_by_keyword to find class names.",
+            }
+        return {
+            "success": False,
+            "error": f"Class name '{class_name}' is ambiguous; use the full IRI.",
+            "candidates": candidates,
+        }
+
+    def match_point_labels(
+        self,
+        labels: List[str] = None,
+        labels_file: str = None,
+        label_column: str = None,
+        output_file: str = None,
+        top_k: int = 3,
+        max_results: int = 1000,
+    ) -> dict:
+        """Match BMS point labels such as "AHU1_SAT" to Brick point classes in bulk.
+
+        Labels are tokenized, numbers dropped and abbreviations expanded, then
+        scored against the names, labels and tags of every Point subclass in
+        the loaded libraries. Files are read and written a row at a time, so
+        point lists of any length use constant memory.
+
+        Args:
+            labels: Point labels to match
+            labels_file: Path to a .csv or .jsonl file of labels, instead of labels
+            label_column: Column or key holding the label (default: "label",
+                or the first CSV column)
+            output_file: Optional path of a JSON Lines file to write one result
+                per label to; without it results are returned
+            top_k: Number of candidate classes per label
+            max_results: Maximum number of results returned without output_file
+
+        Returns:
+            dict with per-label candidates (or the output file) and throughput stats
+        """
+        if (labels is None) == (labels_file is None):
+            return {
+                "success": False,
+                "error": "Provide exactly one of 'labels' or 'labels_file'.",
+            }
+        if top_k < 1:
+            return {"success": False, "error": "top_k must be at least 1"}
+
+        started = time.perf_counter()
+        index = self._get_point_index()
+        if not len(index):
+            return {
+                "success": False,
+                "error": "No Brick point classes are loaded.",
+            }
+
+        stats = {"rows": 0, "matched": 0, "unmatched": 0}
+        results = []
+        try:
+            rows = labels if labels is not None else read_labels(Path(labels_file).expanduser(), label_column)
+            out = None
+            if output_file is not None:
+                output_path = Path(output_file).expanduser()
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                out = open(output_path, "w", encoding="utf-8")
+            try:
+                chunk = []
+                for row_no, label in enumerate(rows):
+                    matches, unknown = index.match(label, top_k) if label else ([], [])
+                    stats["rows"] += 1
+                    stats["matched" if matches else "unmatched"] += 1
+                    result = {
+                        "row": row_no,
+                        "label": label,
+                        "matches": [{"class": iri, "score": score} for iri, score in matches],
+                        "unmatched_tokens": unknown,
+                    }
+                    if out is not None:
+                        chunk.append(json.dumps(result) + "\n")
+                        if len(chunk) >= 1000:
+                            out.writelines(chunk)
+                            chunk = []
+                    elif len(results) < max_results:
+                        results.append(result)
+                if out is not None:
+                    out.writelines(chunk)
+            finally:
+                if out is not None:
+                    out.close()
+        except (OSError, ValueError) as e:
+            return {
+                "success": False,
+                "error": f"Error matching labels: {str(e)}",
+            }
+
+        elapsed = time.perf_counter() - started
+        response = {
+            "success": True,
+            **stats,
+            "point_classes": len(index),
+            "stats": {
+                "elapsed_seconds": round(elapsed, 4),
+                "rows_per_second": round(stats["rows"] / elapsed, 1) if elapsed else None,
+            },
+        }
+        if output_file is not None:
+            response["output_file"] = str(output_path)
+        else:
+            response["results"] = results
+            if stats["rows"] > len(results):
+                response["truncated"] = True
+        return response
+
+    def _get_point_index(self) -> PointIndex:
+        """The point label index over all loaded libraries, rebuilt when one of them changes."""
+        hierarchies, library_classes = {}, {}
+        for name in self._default_libraries():
+            hierarchy = self.om.get_class_hierarchy(name)
+            classes = self.om.get_library_classes(name)
+            if hierarchy is not None and classes is not None:
+                hierarchies[name] = hierarchy
+                library_classes[name] = classes
+        key = tuple((name, self.om.library_versions.get(name)) for name in hierarchies)
+        with self._point_index_lock:
+            if self._point_index is None or self._point_index[0] != key:
+                point_classes = set(related_classes(list(hierarchies.values()), str(BRICK.Point), upward=False))
+                classes = {}
+                for name in hierarchies:
+                    for cls in library_classes[name]:
+                        if cls["iri"] in point_classes:
+                            classes.setdefault(cls["iri"], cls)
+                self._point_index = (key, PointIndex(list(classes.values())))
+                logger.info(f"Built point label index over {len(classes)} point classes")
+            return self._point_index[1]
+
+    def _search_indexes(self, library_name: str = None):
+        """Collect the search indexes to query, or an error dict for an unusable library."""
+        if library_name is None:
+            indexes = {}
+            for lib_name in self._default_libraries():
+                index = self.om.get_search_index(lib_name)
+                if index is not None:
+                    indexes[lib_name] = index
+            return indexes
+
+        available_libraries = self.om.list_libraries()
+        if library_name not in available_libraries:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' not found. Available libraries: {available_libraries}",
+                "results": [],
+            }
+
+        index = self.om.get_search_index(library_name)
+        if index is None:
+            return {
+                "success": False,
+                "error": f"Library '{library_name}' failed to load: {self.om.load_errors.get(library_name)}",
+                "results": [],
+            }
+        return {library_name: index}
@@ -0,0 +1,556 @@
+"""SHACL validation of models for BuildingMOTIF MCP."""
+
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pyshacl
+from rdflib import RDF, SH, Graph, Literal, URIRef
+from rdflib.collection import Collection
+from rdflib.term import Node
+
+logger = logging.getLogger(__name__)
+
+# How many hops of outgoing edges a shape may follow from its focus node
+# (e.g. focus -> hasPoint -> the point's rdf:type) and still be validated
+# exactly by incremental validation
+DEFAULT_DEPTH = 2
+
+
+def run_shacl(data_graph: Graph, shapes_graph: Graph) -> List[dict]:
+    """Validate a data graph with pySHACL and return its results.
+
+    The shapes graph is also used as the ontology graph, so class
+    hierarchies from the loaded libraries apply, as in BuildingMOTIF's own
+    validation.
+
+    Args:
+        data_graph: Graph to validate
+        shapes_graph: Shapes and ontology to validate against
+
+    Returns:
+        List of result dicts, see parse_results
+    """
+    _, report_graph, _ = pyshacl.validate(
+        data_graph,
+        shacl_graph=shapes_graph,
+        ont_graph=shapes_graph,
+        advanced=True,
+        allow_warnings=True,
+    )
+    return parse_results(report_graph)
+
+
+def parse_results(report_graph: Graph) -> List[dict]:
+    """Turn a SHACL validation report graph into plain result dicts.
+
+    Args:
+        report_graph: The sh:ValidationReport graph
+
+    Returns:
+        One dict per sh:ValidationResult with focus_node, path, value,
+        severity, message, source_shape and constraint
+    """
+    results = []
+    for result in report_graph.subjects(RDF.type, SH.ValidationResult):
+        severity = report_graph.value(result, SH.resultSeverity)
+        path = report_graph.value(result, SH.resultPath)
+        value = report_graph.value(result, SH.value)
+        message = report_graph.value(result, SH.resultMessage)
+        component = report_graph.value(result, SH.sourceConstraintComponent)
+        results.append({
+            "focus_node": str(report_graph.value(result, SH.focusNode)),
+            "path": str(path) if path is not None else None,
+            "value": str(value) if value is not None else None,
+            "severity": str(severity).split("#")[-1] if severity is not None else "Violation",
+            "message": str(message) if message is not None else None,
+            "source_shape": str(report_graph.value(result, SH.sourceShape)),
+            "constraint": str(component).split("#")[-1] if component is not None else None,
+        })
+    return results
+
+
+# Shapes graph predicates whose shapes look beyond outgoing edges of their
+# focus node: inverse and transitive paths, targets found through an
+# incoming edge, and SPARQL-based constraints and targets, which may read
+# anything. Neither a neighbourhood subgraph nor the incremental re-check
+# sees all the triples such shapes depend on.
+_NON_LOCAL_PREDICATES = (
+    SH.inversePath,
+    SH.zeroOrMorePath,
+    SH.oneOrMorePath,
+    SH.targetObjectsOf,
+    SH.sparql,
+    SH.target,
+)
+
+# Shape parameters whose values are shapes, checked against the value nodes
+# of a property shape or the focus node of a node shape
+_NESTED_SHAPE_PREDICATES = (SH.node, SH.property, SH.qualifiedValueShape, SH["not"])
+_NESTED_SHAPE_LIST_PREDICATES = (SH["and"], SH["or"], SH.xone)
+
+
+def _path_length(shapes_graph: Graph, path: Node) -> Optional[int]:
+    """Hops a property path follows, or None for inverse and transitive paths."""
+    if isinstance(path, URIRef):
+        return 1
+    if (path, RDF.first, None) in shapes_graph:
+        lengths = [_path_length(shapes_graph, step) for step in Collection(shapes_graph, path)]
+        return None if None in lengths else sum(lengths)
+    alternatives = shapes_graph.value(path, SH.alternativePath)
+    if alternatives is not None:
+        lengths = [_path_length(shapes_graph, option) for option in Collection(shapes_graph, alternatives)]
+        return None if None in lengths else max(lengths, default=0)
+    optional = shapes_graph.value(path, SH.zeroOrOnePath)
+    if optional is not None:
+        return _path_length(shapes_graph, optional)
+    return None
+
+
+def _shape_depth(shapes_graph: Graph, shape: Node, depths: Dict[Node, Optional[int]], visiting: Set[Node]) -> Optional[int]:
+    """Hops a shape follows from the node it is checked against; see shapes_depth."""
+    if shape in depths:
+        return depths[shape]
+    if shape in visiting:
+        # A recursive shape may follow a path of any length
+        return None
+    path = shapes_graph.value(shape, SH.path)
+    length = 0 if path is None else _path_length(shapes_graph, path)
+    if length is None:
+        depths[shape] = None
+        return None
+    nested = [obj for predicate in _NESTED_SHAPE_PREDICATES for obj in shapes_graph.objects(shape, predicate)]
+    for predicate in _NESTED_SHAPE_LIST_PREDICATES:
+        for members in shapes_graph.objects(shape, predicate):
+            nested.extend(Collection(shapes_graph, members))
+    # Reading the value nodes themselves, e.g. their rdf:type for sh:class
+    depth = 1
+    for inner in nested:
+        inner_depth = _shape_depth(shapes_graph, inner, depths, visiting | {shape})
+        if inner_depth is None:
+            depths[shape] = None
+            return None
+        depth = max(depth, inner_depth)
+    depths[shape] = length + depth
+    return depths[shape]
+
+
+def shapes_depth(shapes_graph: Graph) -> Optional[int]:
+    """How many outgoing hops from its focus node any shape may follow.
+
+    A property shape follows its path and then reads its value nodes (one
+    more hop, e.g. to their rdf:type), or checks shapes nested with
+    sh:node, sh:qualifiedValueShape and the like against them. So
+    `sh:path brick:hasPoint ; sh:class brick:Point` is 2 hops, and a path
+    of four steps is 5. Incremental and sharded validation give the same
+    results as validating the whole model at once if they look at least
+    this far.
+
+    Args:
+        shapes_graph: Shapes and ontology to validate against
+
+    Returns:
+        The largest depth of any shape, or None if some shape looks beyond
+        outgoing edges (inverse or transitive paths, sh:targetObjectsOf,
+        SPARQL) or nests shapes recursively
+    """
+    if any(
+        next(iter(shapes_graph.triples((None, predicate, None))), None) is not None
+        for predicate in _NON_LOCAL_PREDICATES
+    ):
+        return None
+    shapes = set(shapes_graph.subjects(RDF.type, SH.NodeShape))
+    shapes.update(shapes_graph.subjects(RDF.type, SH.PropertyShape))
+    shapes.update(shapes_graph.subjects(SH.path, None))
+    shapes.update(shapes_graph.subjects(SH.property, None))
+    depths: Dict[Node, Optional[int]] = {}
+    depth = 0
+    for shape in shapes:
+        shape_depth = _shape_depth(shapes_graph, shape, depths, set())
+        if shape_depth is None:
+            return None
+        depth = max(depth, shape_depth)
+    return depth
+
+
+def affected_nodes(graph: Graph, touched: Iterable[Node], depth: int = DEFAULT_DEPTH) -> Set[Node]:
+    """Find the focus nodes whose validation may change after an edit.
+
+    A node's result can only change if a touched node lies within `depth`
+    outgoing hops of it, so this walks incoming edges back from the touched
+    nodes. rdf:type edges are not walked back: adding an instance of a
+    class does not change how other instances of it validate.
+
+    Args:
+        graph: The model graph after the edit
+        touched: Subjects and objects of the added triples
+        depth: Hops a shape follows from its focus node
+
+    Returns:
+        The touched nodes and all nodes reaching them within depth hops
+    """
+    affected = {node for node in touched if not isinstance(node, Literal)}
+    frontier = set(affected)
+    for _ in range(depth):
+        previous = set()
+        for node in frontier:
+            for subject, predicate in graph.subject_predicates(node):
+                if predicate != RDF.type:
+                    previous.add(subject)
+        frontier = previous - affected
+        affected |= frontier
+    return affected
+
+
+def neighborhood(graph: Graph, nodes: Iterable[Node], depth: int = DEFAULT_DEPTH) -> Graph:
+    """Extract every triple within `depth` outgoing hops of some nodes.
+
+    Args:
+        graph: The model graph
+        nodes: Start nodes
+        depth: Hops to follow
+
+    Returns:
+        A new graph holding the extracted triples
+    """
+    subgraph = Graph()
+    seen: Set[Node] = set()
+    frontier = set(nodes)
+    for _ in range(depth + 1):
+        following = set()
+        for node in frontier - seen:
+            seen.add(node)
+            for triple in graph.triples((node, None, None)):
+                subgraph.add(triple)
+                if not isinstance(triple[2], Literal):
+                    following.add(triple[2])
+        frontier = following
+    return subgraph
+
+
+class ValidationState:
+    """The last validation report of a model, kept per focus node.
+
+    Incremental validation replaces the results of the affected focus nodes
+    and keeps everything else, so the merged report matches what a full run
+    would produce for shapes that look at most `depth` hops from their
+    focus node.
+    """
+
+    def __init__(self, shapes_key: Tuple, results: List[dict]):
+        """Initialize from a full validation run.
+
+        Args:
+            shapes_key: Identifies the shapes graph the results were computed with
+            results: Results of the full run
+        """
+        self.shapes_key = shapes_key
+        self.results_by_focus: Dict[str, List[dict]] = {}
+        for result in results:
+            self.results_by_focus.setdefault(result["focus_node"], []).append(result)
+
+    def replace(self, focus_nodes: Iterable[Node], results: List[dict]) -> None:
+        """Replace the results of some focus nodes with fresh ones.
+
+        Args:
+            focus_nodes: Nodes that were validated again
+            results: Results of validating them; results for other nodes are ignored
+        """
+        validated = {str(node) for node in focus_nodes}
+        for node in validated:
+            self.results_by_focus.pop(node, None)
+        for result in results:
+            if result["focus_node"] in validated:
+                self.results_by_focus.setdefault(result["focus_node"], []).append(result)
+
+    @property
+    def results(self) -> List[dict]:
+        """All results, ordered by focus node."""
+        return [result for node in sorted(self.results_by_focus) for result in self.results_by_focus[node]]
+
+    @property
+    def conforms(self) -> bool:
+        """True if no result is a violation."""
+        return not any(r["severity"] == "Violation" for r in self.results)
+
+
+def candidate_focus_nodes(graph: Graph) -> Set[Node]:
+    """All nodes of a model that shapes can target: subjects, and objects other than classes."""
+    nodes = set(graph.subjects())
+    for _, predicate, obj in graph:
+        if predicate != RDF.type and not isinstance(obj, Literal):
+            nodes.add(obj)
+    return nodes
+
+
+def partition_nodes(graph: Graph, nodes: Set[Node], n_shards: int) -> List[List[Node]]:
+    """Split focus nodes into shards that keep equipment subgraphs together.
+
+    Nodes connected by non-rdf:type edges (an AHU, its fans and their points)
+    go to the same shard, so their shared neighbourhood is extracted once.
+    Connected groups are assigned largest first to the smallest shard, and
+    groups larger than a fair share are split.
+
+    Args:
+        graph: The model graph
+        nodes: Focus nodes to distribute
+        n_shards: Number of shards wanted
+
+    Returns:
+        Up to n_shards non-empty lists of nodes
+    """
+    parent: Dict[Node, Node] = {node: node for node in nodes}
+
+    def find(node: Node) -> Node:
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for subject, predicate, obj in graph:
+        if predicate != RDF.type and subject in parent and obj in parent:
+            root_s, root_o = find(subject), find(obj)
+            if root_s != root_o:
+                parent[root_s] = root_o
+
+    groups: Dict[Node, List[Node]] = {}
+    for node in nodes:
+        groups.setdefault(find(node), []).append(node)
+
+    fair_share = max(1, -(-len(nodes) // n_shards))
+    pieces = []
+    for group in groups.values():
+        group.sort(key=str)
+        pieces.extend(group[i:i + fair_share] for i in range(0, len(group), fair_share))
+    pieces.sort(key=len, reverse=True)
+
+    shards: List[List[Node]] = [[] for _ in range(n_shards)]
+    for piece in pieces:
+        min(shards, key=len).extend(piece)
+    return [shard for shard in shards if shard]
+
+
+# Shapes graph of a validation worker process, set by _init_shard_worker
+_worker_shapes: Optional[Graph] = None
+
+
+def _build_graph(triples: List[Tuple[Node, Node, Node]]) -> Graph:
+    """Rebuild a graph from triples sent to a worker.
+
+    Triples are pickled rather than serialized as RDF so that blank node
+    identifiers, which appear in results as source shapes and focus nodes,
+    stay the same as in the server process.
+    """
+    graph = Graph()
+    for triple in triples:
+        graph.add(triple)
+    return graph
+
+
+def _init_shard_worker(shapes_triples: List[Tuple[Node, Node, Node]]) -> None:
+    """Build the shared shapes graph once per worker process."""
+    global _worker_shapes
+    _worker_shapes = _build_graph(shapes_triples)
+
+
+def _validate_shard(triples: List[Tuple[Node, Node, Node]], focus: List[str]) -> Tuple[List[dict], float]:
+    """Validate one shard in a worker process.
+
+    Args:
+        triples: The shard's focus nodes and their neighbourhood
+        focus: The shard's focus nodes, as strings
+
+    Returns:
+        Results for the shard's focus nodes, and the seconds spent validating
+    """
+    started = time.perf_counter()
+    subgraph = _build_graph(triples)
+    focus_set = set(focus)
+    results = [r for r in run_shacl(subgraph, _worker_shapes) if r["focus_node"] in focus_set]
+    return results, time.perf_counter() - started
+
+
+class ShardedValidator:
+    """Validates large models by spreading focus nodes over worker processes.
+
+    Each worker keeps a parsed copy of the shapes graph for as long as the
+    shapes and worker count stay the same, so only shard subgraphs travel
+    between processes. A shard holds its focus nodes plus everything within
+    reach of the shapes (see shapes_depth), and only results for its own
+    focus nodes are kept, so the merged results equal a serial run.
+    """
+
+    def __init__(self, depth: int = DEFAULT_DEPTH):
+        """Initialize without starting any worker.
+
+        Args:
+            depth: Least number of hops around its focus nodes a shard
+                holds; deeper shapes get deeper shards
+        """
+        self.depth = depth
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_key: Optional[Tuple] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self, shapes_graph: Graph, shapes_key: Tuple, workers: int) -> ProcessPoolExecutor:
+        """Return a pool whose workers hold this shapes graph, starting one if needed."""
+        if self._pool is not None and self._pool_key == (shapes_key, workers):
+            return self._pool
+        self.shutdown()
+        # Spawn rather than fork: the server process runs threads, and a
+        # forked worker could inherit a lock one of them holds
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_shard_worker,
+            initargs=(list(shapes_graph),),
+        )
+        self._pool_key = (shapes_key, workers)
+        return self._pool
+
+    def validate(self, graph: Graph, shapes_graph: Graph, shapes_key: Tuple, workers: int) -> Tuple[List[dict], dict]:
+        """Validate a whole model in parallel.
+
+        Args:
+            graph: The model graph
+            shapes_graph: Shapes and ontology to validate against
+            shapes_key: Identifies shapes_graph, to reuse workers across calls
+            workers: Number of worker processes
+
+        Returns:
+            All results, and run info with "mode", "workers", "depth",
+            "focus_nodes", "elapsed_seconds" and per-shard "shards" timings.
+            Shapes that look beyond outgoing edges (see shapes_depth) are
+            validated in this process instead, with "mode" "full".
+        """
+        started = time.perf_counter()
+        depth = shapes_depth(shapes_graph)
+        if depth is None:
+            logger.info("Shapes follow incoming or transitive paths; validating without sharding")
+            results = run_shacl(graph, shapes_graph)
+            return results, {
+                "mode": "full",
+                "focus_nodes": None,
+                "elapsed_seconds": round(time.perf_counter() - started, 4),
+            }
+        depth = max(depth, self.depth)
+        nodes = candidate_focus_nodes(graph)
+        shards = partition_nodes(graph, nodes, workers)
+
+        # One sharded run at a time: a run already uses every worker, and a
+        # run with other shapes must not replace the pool under another
+        with self._lock:
+            pool = self._get_pool(shapes_graph, shapes_key, workers)
+            futures = []
+            shard_info = []
+            for shard in shards:
+                extract_started = time.perf_counter()
+                subgraph = neighborhood(graph, shard, depth)
+                futures.append(pool.submit(
+                    _validate_shard,
+                    list(subgraph),
+                    [str(node) for node in shard],
+                ))
+                shard_info.append({
+                    "focus_nodes": len(shard),
+                    "triples": len(subgraph),
+                    "extract_seconds": round(time.perf_counter() - extract_started, 4),
+                })
+
+            results = []
+            for info, future in zip(shard_info, futures):
+                shard_results, seconds = future.result()
+                results.extend(shard_results)
+                info["validate_seconds"] = round(seconds, 4)
+                info["results"] = len(shard_results)
+
+        results.sort(key=lambda r: r["focus_node"])
+        return results, {
+            "mode": "sharded",
+            "workers": workers,
+            "depth": depth,
+            "focus_nodes": len(nodes),
+            "elapsed_seconds": round(time.perf_counter() - started, 4),
+            "shards": shard_info,
+        }
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, if any. Called with the lock held, or at exit."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._pool_key = None
+
+
+def validate_model_graph(
+    graph: Graph,
+    shapes_graph: Graph,
+    shapes_key: Tuple,
+    state: Optional[ValidationState],
+    touched: Set[Node],
+    mode: str = "auto",
+    depth: int = DEFAULT_DEPTH,
+    sharded: Optional[ShardedValidator] = None,
+    workers: int = 1,
+) -> Tuple[ValidationState, dict]:
+    """Validate a model, re-checking only the nodes touched since the last run when possible.
+
+    Args:
+        graph: The model graph
+        shapes_graph: Shapes and ontology to validate against
+        shapes_key: Identifies shapes_graph; a change forces a full run
+        state: Result of the previous validation, or None
+        touched: Nodes in triples added since the previous validation
+        mode: "incremental", "full", or "auto" (incremental when a previous
+            report for the same shapes exists)
+        depth: Least number of hops around the touched nodes to re-check;
+            deeper shapes (see shapes_depth) re-check further
+        sharded: Validator to spread a full run over worker processes
+        workers: Worker processes for a full run; 1 validates in this process
+
+    Returns:
+        The new validation state, and run info with "mode", "focus_nodes"
+        (None for a serial full run) and "elapsed_seconds", and for an
+        incremental run the "depth" re-checked
+    """
+    started = time.perf_counter()
+    incremental_possible = state is not None and state.shapes_key == shapes_key
+    if mode == "incremental" and not incremental_possible:
+        logger.info("No previous report for these shapes; running full validation")
+    if mode != "full" and incremental_possible:
+        reach = shapes_depth(shapes_graph)
+        if reach is None:
+            logger.info("Shapes follow incoming or transitive paths; running full validation")
+            incremental_possible = False
+        else:
+            depth = max(depth, reach)
+    if (mode == "full" or not incremental_possible) and sharded is not None and workers > 1:
+        results, run = sharded.validate(graph, shapes_graph, shapes_key, workers)
+        return ValidationState(shapes_key, results), run
+    if mode == "full" or not incremental_possible:
+        state = ValidationState(shapes_key, run_shacl(graph, shapes_graph))
+        return state, {
+            "mode": "full",
+            "focus_nodes": None,
+            "elapsed_seconds": round(time.perf_counter() - started, 4),
+        }
+
+    if not touched:
+        return state, {
+            "mode": "unchanged",
+            "focus_nodes": 0,
+            "elapsed_seconds": round(time.perf_counter() - started, 4),
+        }
+
+    focus = affected_nodes(graph, touched, depth)
+    subgraph = neighborhood(graph, focus, depth)
+    state.replace(focus, run_shacl(subgraph, shapes_graph))
+    return state, {
+        "mode": "incremental",
+        "depth": depth,
+        "focus_nodes": len(focus),
+        "elapsed_seconds": round(time.perf_counter() - started, 4),
+    }
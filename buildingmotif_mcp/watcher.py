@@ -0,0 +1,113 @@
+"""Reload libraries whose ontology files change while the server runs."""
+
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from buildingmotif_mcp.ontology import OntologyManager
+
+logger = logging.getLogger(__name__)
+
+# Path -> (mtime in ns, size) of every file making up one library
+Snapshot = Dict[Path, Tuple[int, int]]
+
+
+class LibraryWatcher:
+    """Poll the ontology paths and reload libraries whose files changed.
+
+    Uses file modification times rather than inotify, so it works on every
+    platform and on network file systems. A change is only acted on once the
+    library's files have stopped changing for the debounce period, so an
+    editor saving several files, or writing one in pieces, causes one reload.
+    """
+
+    def __init__(self, ontology_manager: OntologyManager, interval: float = 1.0, debounce: float = 1.0):
+        """Initialize the watcher.
+
+        Args:
+            ontology_manager: OntologyManager whose libraries are watched
+            interval: Seconds between polls
+            debounce: Seconds a library's files must stay unchanged before it is reloaded
+        """
+        self.om = ontology_manager
+        self.interval = interval
+        self.debounce = debounce
+        self._snapshots: Dict[Path, Snapshot] = {}
+        # Library path -> library name, remembered so removed libraries can be dropped
+        self._names: Dict[Path, str] = {}
+        # Library path -> time its files were last seen changing
+        self._pending: Dict[Path, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Take the initial snapshot and start polling in a daemon thread."""
+        if self._thread is not None:
+            return
+        self._snapshots = self._scan()
+        self._thread = threading.Thread(target=self._run, name="library-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {len(self._snapshots)} libraries for changes every {self.interval:g}s")
+
+    def stop(self) -> None:
+        """Stop polling."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        """Body of the polling thread."""
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    self.poll()
+                except Exception:
+                    logger.exception("Error while checking ontology files for changes")
+        finally:
+            # Release this thread's database session
+            self.om.bm.Session.remove()
+
+    def poll(self, now: Optional[float] = None) -> None:
+        """Check the files once and reload libraries that have settled.
+
+        Args:
+            now: Current time (default: time.monotonic())
+        """
+        now = time.monotonic() if now is None else now
+        current = self._scan()
+
+        for path in set(current) | set(self._snapshots):
+            if current.get(path) != self._snapshots.get(path):
+                self._pending[path] = now
+        self._snapshots = current
+
+        for path, changed_at in list(self._pending.items()):
+            if now - changed_at < self.debounce:
+                continue
+            del self._pending[path]
+            if path in current:
+                logger.info(f"Ontology files changed in {path}; reloading")
+                self.om.reload_library(path)
+            elif path in self._names:
+                logger.info(f"Ontology files removed from {path}")
+                self.om.remove_library(self._names.pop(path))
+
+    def _scan(self) -> Dict[Path, Snapshot]:
+        """Snapshot the ontology and metadata files of every library."""
+        snapshots = {}
+        for path in self.om.iter_library_paths():
+            source = self.om.make_source(path)
+            self._names[path] = source.name
+            snapshot = {}
+            for file_path in source.ontology_files:
+                for candidate in (file_path, Path(str(file_path) + ".metadata")):
+                    try:
+                        stat = candidate.stat()
+                    except OSError:
+                        continue
+                    snapshot[candidate] = (stat.st_mtime_ns, stat.st_size)
+            snapshots[path] = snapshot
+        return snapshots
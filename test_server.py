@@ -8,13 +8,33 @@ logging.basicConfig(level=logging.INFO)
 
 from buildingmotif_mcp.server import BuildingMOTIFServer
 
+_server = None
+
+
+def _shared_server() -> BuildingMOTIFServer:
+    """The server the tests share, so libraries are loaded once.
+
+    BuildingMOTIF keeps the database of the first OntologyManager for the
+    whole process, so this is created first and kept alive.
+    """
+    global _server
+    if _server is None:
+        _server = BuildingMOTIFServer()
+    return _server
+
+
 def test_server():
     """Test server initialization and basic functionality."""
+    assert run_server_checks() == 0
+
+
+def run_server_checks() -> int:
+    """Exercise every tool of the shared server, returning an exit status."""
     print("Testing BuildingMOTIF MCP Server...")
     
     try:
         # Create server
-        server = BuildingMOTIFServer()
+        server = _shared_server()
         print("✓ Server created successfully")
         
         # Test list_libraries tool
@@ -68,6 +88,126 @@ def test_server():
                 else:
                     print(f"  - Error: {result.get('error')}")
 
+        # Test evaluate_template with a small batch of bindings
+        if libraries:
+            lib_name = libraries[0]
+            templates = server.ontology_manager.list_templates(lib_name)
+            if templates:
+                template_name = templates[0]
+                print(f"\n✓ Testing evaluate_template for '{template_name[:60]}...':")
+                params = server.tools.get_template_details(lib_name, template_name, ["parameters"])["parameters"]
+                rows = [{param: f"urn:test/{param}_{i}" for param in params} for i in range(3)]
+                result = server.tools.evaluate_template(lib_name, template_name, bindings=rows)
+                if result["success"]:
+                    print(f"  - {result['rows_ok']}/{result['rows']} rows, {result['triples']} triples")
+                    result = server.tools.evaluate_template(lib_name, template_name, bindings=rows)
+                    print(f"  - Second call used the template from {result['stats']['compiled_from']}")
+                else:
+                    print(f"  - Error: {result.get('error')}")
+
+        # Test building up and validating a model
+        print("\n✓ Testing create_model / add_to_model / validate_model:")
+        model_id = server.tools.create_model()["model_id"]
+        server.tools.add_to_model(
+            model_id,
+            "@prefix brick: <https://brickschema.org/schema/Brick#> .\n"
+            "<urn:test/floor1> a brick:Floor ; brick:hasPoint <urn:test/ts1> .",
+        )
+        result = server.tools.validate_model(model_id=model_id)
+        if result["success"]:
+            print(f"  - {result['mode']} validation: conforms={result['conforms']}, {result['result_count']} results")
+            server.tools.add_to_model(
+                model_id,
+                "@prefix brick: <https://brickschema.org/schema/Brick#> .\n"
+                "<urn:test/ts1> a brick:Temperature_Sensor .",
+            )
+            result = server.tools.validate_model(model_id=model_id)
+            print(f"  - {result['mode']} validation of {result['focus_nodes']} nodes: conforms={result['conforms']}")
+        else:
+            print(f"  - Error: {result.get('error')}")
+
+        print("\n✓ Testing query_model / model_stats:")
+        result = server.tools.query_model(model_id, "SELECT ?s WHERE { ?s a ?type }")
+        if result["success"]:
+            print(f"  - {result['count']} typed nodes")
+        else:
+            print(f"  - Error: {result.get('error')}")
+        stats = server.tools.model_stats()
+        print(f"  - {len(stats['models'])} model(s), {stats['resident_bytes']} bytes resident")
+
+        print("\n✓ Testing streaming export_model:")
+        import tempfile
+        from buildingmotif_mcp.export import read_rdfb
+        with tempfile.TemporaryDirectory() as export_dir:
+            for fmt in ("nt.gz", "rdfb"):
+                result = server.tools.export_model(model_id, fmt, f"{export_dir}/model.{fmt}")
+                if result["success"]:
+                    print(f"  - {fmt}: {result['triples']} triples, {result['bytes']} bytes in {result['elapsed_seconds']}s")
+                else:
+                    print(f"  - Error: {result.get('error')}")
+            print(f"  - Read back {len(list(read_rdfb(f'{export_dir}/model.rdfb')))} triples from rdfb")
+
+        # Test search_templates and find_class_by_keyword
+        print("\n✓ Testing search_templates:")
+        result = server.tools.search_templates("supply air temprature sensor", limit=3)
+        if result["success"]:
+            print(f"  - Top matches: {[r['template'] for r in result['results']]}")
+        else:
+            print(f"  - Error: {result.get('error')}")
+
+        print("\n✓ Testing match_templates:")
+        result = server.tools.match_templates(["Supply_Air_Temperature_Sensor"], limit=3)
+        if result["success"]:
+            print(f"  - {result['total']} templates, best: {[(r['template'], r['score']) for r in result['results']]}")
+        else:
+            print(f"  - Error: {result.get('error')}")
+
+        print("\n✓ Testing find_class_by_keyword:")
+        result = server.tools.find_class_by_keyword("outside air damper", limit=3)
+        if result["success"]:
+            print(f"  - Top matches: {[r['class'] for r in result['results']]}")
+        else:
+            print(f"  - Error: {result.get('error')}")
+
+        print("\n✓ Testing is_subclass_of / get_subclasses:")
+        result = server.tools.is_subclass_of("Supply_Air_Temperature_Sensor", "Temperature_Sensor")
+        if result["success"]:
+            print(f"  - Supply_Air_Temperature_Sensor is a Temperature_Sensor: {result['is_subclass']}")
+            result = server.tools.get_subclasses("Air_Temperature_Sensor", limit=3)
+            print(f"  - {result['total']} subclasses of Air_Temperature_Sensor")
+        else:
+            print(f"  - Error: {result.get('error')}")
+
+        print("\n✓ Testing sparql_query:")
+        result = server.tools.sparql_query("SELECT ?c WHERE { ?c rdfs:subClassOf brick:Sensor }", limit=5)
+        if result["success"]:
+            print(f"  - {result['count']} rows in {result['elapsed_seconds']}s, more: {result['next_cursor'] is not None}")
+        else:
+            print(f"  - Error: {result.get('error')}")
+
+        print("\n✓ Testing match_point_labels:")
+        result = server.tools.match_point_labels(labels=["AHU1_SAT", "VAV-2-14 DMP POS"], top_k=1)
+        if result["success"]:
+            for row in result["results"]:
+                best = row["matches"][0]["class"] if row["matches"] else None
+                print(f"  - {row['label']} -> {best}")
+        else:
+            print(f"  - Error: {result.get('error')}")
+
+        print("\n✓ Testing server_stats:")
+        result = server.server_stats()
+        for lib in result["libraries"]:
+            print(f"  - {lib['library']}: loaded in {lib['load_seconds']}s, indexed in {lib['index_seconds']}s")
+
+        print("\n✓ Testing unload_library / load_library:")
+        result = server.tools.unload_library("brick")
+        if result.get("success"):
+            print(f"  - Released about {result['released_bytes']} bytes")
+            result = server.tools.load_library("brick")
+            print(f"  - Reopened as '{result.get('status')}' in {result.get('elapsed_seconds')}s, {result.get('resident_bytes')} bytes")
+        else:
+            print(f"  - Error: {result.get('error')}")
+
         # Test parsing example shapes.ttl
         print("\n✓ Testing example shapes.ttl parsing:")
         from pathlib import Path
@@ -101,5 +241,769 @@ def test_server():
         return 1
 
 
+SHARDING_SHAPES = """
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+@prefix ex: <urn:ex/> .
+
+ex:EquipmentShape a sh:NodeShape ;
+    sh:targetClass ex:Equipment ;
+    sh:property [ sh:path ex:hasPoint ; sh:minCount 2 ; sh:class ex:Point ] .
+"""
+
+# Reaches six hops from each equipment: five steps, then the last node
+DEEP_SHAPES = SHARDING_SHAPES + """
+ex:ChainShape a sh:NodeShape ;
+    sh:targetClass ex:Equipment ;
+    sh:property [ sh:path ( ex:hasPoint ex:feeds ex:feeds ex:feeds ex:feeds ) ; sh:minCount 1 ] .
+"""
+
+INVERSE_SHAPES = SHARDING_SHAPES + """
+ex:PointShape a sh:NodeShape ;
+    sh:targetClass ex:Point ;
+    sh:property [ sh:path [ sh:inversePath ex:hasPoint ] ; sh:maxCount 1 ; sh:class ex:Equipment ] .
+"""
+
+
+def _sharding_model():
+    """A model with one large connected group, so sharding has to split it."""
+    import rdflib
+
+    ex = rdflib.Namespace("urn:ex/")
+    graph = rdflib.Graph()
+    for i in range(12):
+        equipment, point = ex[f"equipment{i}"], ex[f"point{i}"]
+        graph.add((equipment, rdflib.RDF.type, ex.Equipment))
+        graph.add((equipment, ex.hasPoint, point))
+        graph.add((point, rdflib.RDF.type, ex.Point))
+        # Every point is also claimed by equipment0, chaining all nodes together
+        graph.add((ex.equipment0, ex.hasPoint, point))
+        # Chains of four feeds edges from every other point, three from the rest
+        chain = [point] + [ex[f"chain{i}_{step}"] for step in range(4 if i % 2 else 3)]
+        for upstream, downstream in zip(chain, chain[1:]):
+            graph.add((upstream, ex.feeds, downstream))
+    graph.add((ex.orphan, rdflib.RDF.type, ex.Point))
+    graph.add((ex.loner, ex.hasPoint, ex.orphan))
+    return graph
+
+
+def _result_keys(results):
+    """Results without their messages, which may abbreviate IRIs differently."""
+    return sorted(
+        (r["focus_node"], r["path"] or "", r["value"] or "", r["source_shape"], r["constraint"])
+        for r in results
+    )
+
+
+def test_sharded_validation_matches_serial():
+    """Sharded validation gives the serial results, also for inverse and long paths."""
+    import rdflib
+    from buildingmotif_mcp.validation import ShardedValidator, run_shacl
+
+    graph = _sharding_model()
+    validator = ShardedValidator()
+    try:
+        for shapes_ttl, expected_mode in (
+            (SHARDING_SHAPES, "sharded"),
+            (DEEP_SHAPES, "sharded"),
+            (INVERSE_SHAPES, "full"),
+        ):
+            shapes = rdflib.Graph().parse(data=shapes_ttl, format="turtle")
+            serial = _result_keys(run_shacl(graph, shapes))
+            results, run = validator.validate(graph, shapes, (shapes_ttl,), workers=4)
+            sharded = _result_keys(results)
+            assert run["mode"] == expected_mode
+            assert serial, "the model should not conform"
+            assert sharded == serial
+    finally:
+        validator.shutdown()
+
+
+def test_incremental_validation_matches_full():
+    """An edit further than two hops from a focus node is re-checked for shapes that reach it."""
+    import rdflib
+    from buildingmotif_mcp.validation import run_shacl, validate_model_graph
+
+    ex = rdflib.Namespace("urn:ex/")
+    shapes = rdflib.Graph().parse(data=DEEP_SHAPES, format="turtle")
+    graph = rdflib.Graph()
+    graph.add((ex.ahu, rdflib.RDF.type, ex.Equipment))
+    chain = [ex.ahu, ex.sat] + [ex[f"duct{step}"] for step in range(4)]
+    graph.add((ex.ahu, ex.hasPoint, ex.sat))
+    graph.add((ex.sat, rdflib.RDF.type, ex.Point))
+    for upstream, downstream in zip(chain[1:-2], chain[2:-1]):
+        graph.add((upstream, ex.feeds, downstream))
+    state, run = validate_model_graph(graph, shapes, (DEEP_SHAPES,), None, set())
+    assert run["mode"] == "full"
+    before = _result_keys(state.results)
+
+    # Completes the five-step path from ex:ahu, four hops from the edit
+    graph.add((chain[-2], ex.feeds, chain[-1]))
+    state, run = validate_model_graph(graph, shapes, (DEEP_SHAPES,), state, {chain[-2], chain[-1]})
+    assert run["mode"] == "incremental"
+    assert _result_keys(state.results) == _result_keys(run_shacl(graph, shapes))
+    assert _result_keys(state.results) != before
+
+
+RELOAD_LIBRARY = """
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+
+<urn:reload-test/> a owl:Ontology .
+<urn:reload-test/%s> a owl:Class, sh:NodeShape .
+"""
+
+
+def test_reload_drops_removed_templates():
+    """Reloading an edited library serves only the templates still in its files."""
+    import tempfile
+    from pathlib import Path
+    from buildingmotif_mcp.ontology import OntologyManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        library_dir = Path(tmp) / "reload-test"
+        library_dir.mkdir()
+        ontology_file = library_dir / "reload-test.ttl"
+        ontology_file.write_text(RELOAD_LIBRARY % "Alpha")
+        om = OntologyManager(ontology_paths=[tmp])
+        assert om.list_templates("reload-test") == ["urn:reload-test/Alpha"]
+
+        ontology_file.write_text(RELOAD_LIBRARY % "Beta")
+        assert om.reload_library(library_dir)
+        assert om.list_templates("reload-test") == ["urn:reload-test/Beta"]
+        assert om.get_template_by_name("reload-test", "urn:reload-test/Beta") is not None
+        with om.database():
+            names = [lib.name for lib in om.bm.table_connection.get_all_db_libraries()]
+        assert names.count("urn:reload-test/") == 1
+        assert not any(name.startswith("urn:buildingmotif-mcp:replaced:") for name in names)
+
+
+
+# Opens the cache-test library in a fresh process, since BuildingMOTIF keeps
+# one database per process, and prints what the library cache did
+CACHE_RUN = """
+import json, sys
+from buildingmotif_mcp.ontology import OntologyManager
+om = OntologyManager(ontology_paths=[sys.argv[1]], cache_dir=sys.argv[2])
+om.get_library("cache-test")
+print("RESULT " + json.dumps({
+    "hits": om.cache.hits,
+    "misses": om.cache.misses,
+    "from_cache": om.library_stats["cache-test"]["from_cache"],
+    "templates": om.list_templates("cache-test"),
+}))
+"""
+
+
+def test_library_cache_hits_until_files_change():
+    """A second start reopens an unchanged library from the cache, an edited one is parsed again."""
+    import json
+    import subprocess
+    import tempfile
+    from pathlib import Path
+
+    def run(library_dir, cache_dir):
+        completed = subprocess.run(
+            [sys.executable, "-c", CACHE_RUN, str(library_dir), str(cache_dir)],
+            capture_output=True, text=True, timeout=600, cwd=Path(__file__).parent,
+        )
+        assert completed.returncode == 0, completed.stderr
+        line = next(line for line in completed.stdout.splitlines() if line.startswith("RESULT "))
+        return json.loads(line[len("RESULT "):])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        library_dir = Path(tmp) / "libraries" / "cache-test"
+        library_dir.mkdir(parents=True)
+        ontology_file = library_dir / "cache-test.ttl"
+        ontology_file.write_text(RELOAD_LIBRARY.replace("reload-test", "cache-test") % "Alpha")
+        cache_dir = Path(tmp) / "cache"
+
+        first = run(library_dir.parent, cache_dir)
+        assert "cache-test" in first["misses"] and "cache-test" not in first["hits"]
+        assert not first["from_cache"]
+
+        second = run(library_dir.parent, cache_dir)
+        assert "cache-test" in second["hits"] and "cache-test" not in second["misses"]
+        assert second["from_cache"]
+        assert second["templates"] == first["templates"] == ["urn:cache-test/Alpha"]
+
+        ontology_file.write_text(RELOAD_LIBRARY.replace("reload-test", "cache-test") % "Beta")
+        edited = run(library_dir.parent, cache_dir)
+        assert "cache-test" in edited["misses"] and "cache-test" not in edited["hits"]
+        assert not edited["from_cache"]
+        assert edited["templates"] == ["urn:cache-test/Beta"]
+
+
+BUDGET_LIBRARY = """
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+
+<urn:budget-test/%(name)s/> a owl:Ontology .
+<urn:budget-test/%(name)s/Thing> a owl:Class, sh:NodeShape .
+"""
+
+
+def test_memory_budget_unloads_and_reopens_libraries():
+    """Libraries beyond the memory budget are unloaded and reopened on use, also by concurrent calls."""
+    import tempfile
+    import threading
+    import time
+    from pathlib import Path
+    from buildingmotif_mcp.ontology import OntologyManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("budget-a", "budget-b"):
+            (Path(tmp) / name).mkdir()
+            (Path(tmp) / name / f"{name}.ttl").write_text(BUDGET_LIBRARY % {"name": name})
+        om = OntologyManager(ontology_paths=[tmp], lazy=True, memory_budget=1)
+        template = {name: f"urn:budget-test/{name}/Thing" for name in ("budget-a", "budget-b")}
+        assert om.list_templates("budget-a") == [template["budget-a"]]
+        assert om.list_templates("budget-b") == [template["budget-b"]]
+        assert om.get_library_info("budget-a")["status"] == "unloaded"
+        assert om.get_library_info("budget-b")["status"] == "loaded"
+
+        # Calls reopen their library and unload the other one, racing with
+        # calls on the same library
+        errors = []
+
+        def use(name):
+            try:
+                for _ in range(25):
+                    compiled, _ = om.get_compiled_template(name, template[name])
+                    assert compiled.triples
+                    assert om.get_template_by_name(name, template[name]) is not None
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=use, args=(name,), daemon=True) for name in list(template) * 2]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 120
+        for thread in threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        assert not any(thread.is_alive() for thread in threads), "calls deadlocked"
+        assert not errors, errors
+        assert om.unloads > 1
+        assert sum(om.get_library_info(name)["status"] == "loaded" for name in template) == 1
+
+
+def test_sparql_is_read_only_paged_and_stopped_at_its_deadline():
+    """SPARQL updates are rejected, pages are capped and chained by cursor, and slow queries stop."""
+    import time
+    import rdflib
+    from buildingmotif_mcp.sparql import QueryTimeout, SparqlEngine
+    from buildingmotif_mcp.tools import BuildingMOTIFTools
+
+    engine = SparqlEngine(timeout=0.5, max_rows=10)
+    tools = BuildingMOTIFTools(_shared_server().ontology_manager, sparql=engine)
+    model_id = tools.create_model()["model_id"]
+    triples = "\n".join(f'<urn:ex/s{i}> <urn:ex/p> "{i}" .' for i in range(25))
+    assert tools.add_to_model(model_id, triples, "nt")["success"]
+
+    result = tools.query_model(model_id, "INSERT DATA { <urn:ex/new> <urn:ex/p> 1 }")
+    assert not result["success"]
+    assert tools.query_model(model_id, "ASK { <urn:ex/new> ?p ?o }")["boolean"] is False
+
+    rows, cursor, pages = [], None, 0
+    while True:
+        page = tools.query_model(model_id, "SELECT ?s WHERE { ?s ?p ?o }", limit=100, cursor=cursor)
+        assert page["success"] and page["count"] <= 10
+        rows.extend(row["s"] for row in page["rows"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == 3
+    assert sorted(rows) == sorted(f"urn:ex/s{i}" for i in range(25))
+
+    graph = rdflib.Graph()
+    for i in range(200):
+        graph.add((rdflib.URIRef(f"urn:ex/s{i}"), rdflib.URIRef("urn:ex/p"), rdflib.Literal(i)))
+    started = time.perf_counter()
+    try:
+        engine.run(graph, "SELECT (COUNT(*) AS ?n) WHERE { ?a ?b ?c . ?d ?e ?f . ?g ?h ?i }")
+        assert False, "the query should have timed out"
+    except QueryTimeout:
+        pass
+    assert time.perf_counter() - started < 5
+    result = tools.query_model(model_id, "SELECT (COUNT(*) AS ?n) WHERE { ?a ?b ?c . ?d ?e ?f . ?g ?h ?i . ?j ?k ?l }")
+    assert not result["success"] and "time limit" in result["error"]
+
+
+def test_evaluate_template_batches():
+    """Batches expand every good row, cap the listed errors, and round-trip through files."""
+    import gzip
+    import json
+    import tempfile
+    import rdflib
+
+    tools = _shared_server().tools
+    ahu = "https://brickschema.org/schema/Brick#AHU"
+    expected = {(rdflib.URIRef(f"urn:ex/ahu{i}"), rdflib.RDF.type, rdflib.URIRef(ahu)) for i in range(5)}
+
+    result = tools.evaluate_template("brick", ahu, bindings=[{"name": f"urn:ex/ahu{i}"} for i in range(5)])
+    assert result["success"]
+    assert (result["rows"], result["rows_ok"], result["rows_failed"], result["triples"]) == (5, 5, 0, 5)
+    assert result["errors"] == []
+    assert set(rdflib.Graph().parse(data=result["graph"], format="turtle")) == expected
+
+    rows = [{"name": "urn:ex/ahu0"}, {"bogus": "x"}, "not a row", {"name": "urn:ex/ahu1"}, {"name": "ex:ahu2"}]
+    result = tools.evaluate_template("brick", ahu, bindings=rows, max_errors=2)
+    assert result["success"]
+    assert (result["rows"], result["rows_ok"], result["rows_failed"], result["triples"]) == (5, 2, 3, 2)
+    assert [error["row"] for error in result["errors"]] == [1, 2]
+    assert "bogus" in result["errors"][0]["error"]
+
+    with tempfile.TemporaryDirectory() as batch_dir:
+        with open(f"{batch_dir}/rows.csv", "w") as f:
+            f.write("name\n" + "".join(f"urn:ex/ahu{i}\n" for i in range(5)))
+        result = tools.evaluate_template("brick", ahu, bindings_file=f"{batch_dir}/rows.csv",
+                                         output_file=f"{batch_dir}/out.nt")
+        assert result["success"] and result["rows_ok"] == 5 and result["bytes"] > 0
+        assert set(rdflib.Graph().parse(f"{batch_dir}/out.nt", format="nt")) == expected
+
+        with open(f"{batch_dir}/rows.jsonl", "w") as f:
+            f.write("".join(json.dumps({"name": f"ahu{i}"}) + "\n" for i in range(5)) + "{not json\n")
+        result = tools.evaluate_template("brick", ahu, bindings_file=f"{batch_dir}/rows.jsonl",
+                                         output_file=f"{batch_dir}/out.nt.gz", base_namespace="urn:ex/")
+        assert result["success"] and (result["rows_ok"], result["rows_failed"]) == (5, 1)
+        assert "line 6" in result["errors"][0]["error"]
+        with gzip.open(f"{batch_dir}/out.nt.gz", "rt") as f:
+            assert set(rdflib.Graph().parse(data=f.read(), format="nt")) == expected
+
+
+def test_response_cache_hits_evicts_and_keeps_budget():
+    """The response cache evicts least recently used entries to stay in its byte budget."""
+    from buildingmotif_mcp.cache import ResponseCache
+
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    assert cache.get("a") == "aaaa"
+    cache.put("c", "c\u00e9c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa" and cache.get("c") == "c\u00e9c"
+    cache.put("big", "x" * 11)
+    assert cache.get("big") is None
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 8, 1)
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (3, 2, 0.6)
+    disabled = ResponseCache(max_bytes=0)
+    disabled.put("a", "aaaa")
+    assert disabled.get("a") is None and disabled.stats()["entries"] == 0
+
+    server = _shared_server()
+    template = server.ontology_manager.list_templates("brick")[0]
+    before = server.response_cache.stats()
+    first, ok = server._dispatch("get_template_details", {"library_name": "brick", "template_name": template})
+    assert ok
+    second, ok = server._dispatch("get_template_details", {"library_name": "brick", "template_name": template})
+    assert ok and second == first
+    after = server.response_cache.stats()
+    assert after["hits"] == before["hits"] + 1
+    assert after["bytes"] <= after["max_bytes"]
+    missing, ok = server._dispatch("get_template_details", {"library_name": "brick", "template_name": "urn:ex/none"})
+    assert not ok
+    assert server.response_cache.stats()["entries"] == after["entries"]
+
+
+def test_search_ranks_exact_prefix_and_typo_matches():
+    """Search favours exact over prefix over typo matches, names over parameters, then shorter names."""
+    from buildingmotif_mcp.search import SearchIndex, search_libraries
+
+    def template(name, parameters=""):
+        return {"kind": "template", "id": f"urn:ex/{name}", "fields": {"name": name, "parameters": parameters}}
+
+    index = SearchIndex([
+        template("Damper_Position"),
+        template("Dampers"),
+        template("Valve", "damper"),
+        template("Outside_Air_Damper"),
+        template("Fan"),
+        {"kind": "class", "id": "urn:ex/Damper", "fields": {"name": "Damper", "label": "", "definition": ""}},
+    ])
+    ranked = [doc["id"] for _, doc in index.search("damper", "template")]
+    assert ranked == ["urn:ex/Damper_Position", "urn:ex/Outside_Air_Damper", "urn:ex/Dampers", "urn:ex/Valve"]
+    assert [doc["id"] for _, doc in index.search("dampr", "template", limit=2)] == [
+        "urn:ex/Damper_Position", "urn:ex/Outside_Air_Damper"]
+    exact = dict((doc["id"], score) for score, doc in index.search("damper", "template"))
+    typo = dict((doc["id"], score) for score, doc in index.search("dampr", "template"))
+    prefix = dict((doc["id"], score) for score, doc in index.search("damp", "template"))
+    assert exact["urn:ex/Damper_Position"] > prefix["urn:ex/Damper_Position"] > typo["urn:ex/Damper_Position"]
+    assert [doc["id"] for _, doc in index.search("outside damper", "template")][0] == "urn:ex/Outside_Air_Damper"
+    assert [doc["id"] for _, doc in index.search("damper", "class")] == ["urn:ex/Damper"]
+    assert index.search("xqzzv", "template") == []
+
+    merged = search_libraries({"a": index, "b": SearchIndex(index.documents)}, "damper", "template", limit=3)
+    assert [hit["id"] for hit in merged] == ["urn:ex/Damper_Position"] * 2 + ["urn:ex/Outside_Air_Damper"]
+    assert {hit["library"] for hit in merged[:2]} == {"a", "b"}
+
+    tools = _shared_server().tools
+    brick = "https://brickschema.org/schema/Brick#"
+    for query in ("supply air temperature sensor", "supply air temprature sensor", "supply air temp sens"):
+        result = tools.search_templates(query, limit=4)
+        assert result["success"] and result["count"] == 4
+        assert result["results"][0]["template"] == f"{brick}Supply_Air_Temperature_Sensor"
+        scores = [hit["score"] for hit in result["results"]]
+        assert scores == sorted(scores, reverse=True)
+    result = tools.find_class_by_keyword("outside air damper", limit=3)
+    assert result["results"][0]["class"] == f"{brick}Outside_Damper"
+    assert not tools.search_templates("sensor", library_name="nope")["success"]
+
+
+def test_pagination_cursors_and_field_projection():
+    """Pages chained by cursor cover a list exactly once, and details return only the requested fields."""
+    from buildingmotif_mcp.tools import decode_cursor, encode_cursor, paginate
+
+    assert decode_cursor(encode_cursor(7)) == 7 and decode_cursor(None) == 0
+    for bad_cursor in ("garbage", encode_cursor(-1)):
+        try:
+            paginate([1, 2, 3], 2, bad_cursor)
+            assert False, f"cursor {bad_cursor!r} should be rejected"
+        except ValueError:
+            pass
+    assert paginate([1, 2, 3], None, encode_cursor(1)) == ([2, 3], {"total": 3, "next_cursor": None})
+
+    tools = _shared_server().tools
+    everything = tools.list_templates("brick")["templates"]
+    pages, cursor = [], None
+    while True:
+        page = tools.list_templates("brick", limit=400, cursor=cursor)
+        assert page["success"] and page["total"] == len(everything) and page["count"] <= 400
+        pages.append(page["templates"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(pages) == -(-len(everything) // 400)
+    assert [template for page in pages for template in page] == everything
+    page = tools.list_templates(limit=3)
+    assert page["count"] == 3 and page["templates_by_library"] == {"brick": everything[:3]}
+    assert tools.list_templates(limit=3, cursor=page["next_cursor"])["templates_by_library"] == {"brick": everything[3:6]}
+    assert not tools.list_templates("brick", limit=0)["success"]
+    assert not tools.list_libraries(cursor="garbage")["success"]
+    assert "next_cursor" not in tools.list_templates("brick")
+
+    template = "https://brickschema.org/schema/Brick#AHU"
+    fields = {"success", "library", "template"}
+    assert set(tools.get_template_details("brick", template, ["parameters"])) == fields | {"parameters"}
+    assert set(tools.get_template_details("brick", template, ["body"])) == fields | {"body"}
+    assert set(tools.get_template_details("brick", template)) == fields | {"parameters", "description", "body"}
+    result = tools.get_template_details("brick", template, ["inlined_body"])
+    assert set(result) == fields | {"inlined_body", "inlined_parameters"} and result["inlined_parameters"] == ["name"]
+    result = tools.get_template_details("brick", template, ["colour"])
+    assert not result["success"] and "colour" in result["error"]
+
+
+def test_class_hierarchy_closure():
+    """Subclass and superclass queries follow the transitive closure, across libraries and cycles."""
+    import rdflib
+    from buildingmotif_mcp.hierarchy import ClassHierarchy, related_classes
+
+    point, sensor, temp, air, air_temp, loop_a, loop_b, orphan = (
+        f"urn:ex/{name}" for name in ("Point", "Sensor", "Temp_Sensor", "Air_Sensor", "Air_Temp_Sensor",
+                                      "Loop_A", "Loop_B", "Orphan"))
+    graph = rdflib.Graph()
+    for child, parent in [(sensor, point), (temp, sensor), (air_temp, temp), (air_temp, air), (air, sensor),
+                          (loop_a, loop_b), (loop_b, loop_a)]:
+        graph.add((rdflib.URIRef(child), rdflib.RDFS.subClassOf, rdflib.URIRef(parent)))
+    graph.add((rdflib.URIRef(sensor), rdflib.RDFS.subClassOf, rdflib.BNode()))
+    graph.add((rdflib.URIRef(orphan), rdflib.RDF.type, rdflib.OWL.Class))
+
+    hierarchy = ClassHierarchy.build(graph)
+    assert hierarchy.superclasses(air_temp) == [air, temp, sensor, point]
+    assert hierarchy.superclasses(air_temp, direct=True) == [air, temp]
+    assert hierarchy.subclasses(sensor) == [air, air_temp, temp]
+    assert hierarchy.subclasses(sensor, direct=True) == [air, temp]
+    assert hierarchy.is_subclass(air_temp, point) and hierarchy.is_subclass(point, point)
+    assert not hierarchy.is_subclass(point, sensor) and not hierarchy.is_subclass(orphan, point)
+    assert hierarchy.superclasses(loop_a) == [loop_b] and hierarchy.is_subclass(loop_b, loop_a)
+    assert orphan in hierarchy and hierarchy.superclasses(orphan) == []
+    assert hierarchy.resolve("ex:air_temp_sensor") == [air_temp]
+    assert ClassHierarchy.from_dict(hierarchy.to_dict()).subclasses(point) == hierarchy.subclasses(point)
+
+    duct = "urn:org/Duct_Sensor"
+    org = ClassHierarchy.build(rdflib.Graph().add((rdflib.URIRef(duct), rdflib.RDFS.subClassOf, rdflib.URIRef(air))))
+    assert related_classes([hierarchy, org], duct, upward=True) == [air, sensor, point]
+    assert duct in related_classes([hierarchy, org], point, upward=False)
+
+    tools = _shared_server().tools
+    brick = "https://brickschema.org/schema/Brick#"
+    assert tools.is_subclass_of("Supply_Air_Temperature_Sensor", "brick:Point")["is_subclass"]
+    assert not tools.is_subclass_of("Temperature_Sensor", "Supply_Air_Temperature_Sensor")["is_subclass"]
+    assert not tools.is_subclass_of("No_Such_Class", "Point")["success"]
+    superclasses = tools.get_superclasses("Supply_Air_Temperature_Sensor")["superclasses"]
+    assert superclasses.index(f"{brick}Air_Temperature_Sensor") < superclasses.index(f"{brick}Temperature_Sensor")
+    assert superclasses.index(f"{brick}Temperature_Sensor") < superclasses.index(f"{brick}Point")
+    subclasses = tools.get_subclasses("Air_Temperature_Sensor")["subclasses"]
+    direct = tools.get_subclasses("Air_Temperature_Sensor", direct=True)["subclasses"]
+    assert f"{brick}Supply_Air_Temperature_Sensor" in subclasses and set(direct) < set(subclasses)
+    assert all(tools.is_subclass_of(iri, "Air_Temperature_Sensor")["is_subclass"] for iri in subclasses)
+
+
+def test_point_labels_match_brick_classes():
+    """BMS point labels match the Brick point classes their expanded abbreviations name."""
+    import json
+    import tempfile
+    from buildingmotif_mcp.points import PointIndex, label_tokens
+
+    assert label_tokens("AHU1_SAT") == ["ahu", "supply", "air", "temperature"]
+    assert label_tokens("B2 CO2") == ["b", "co2"]
+    index = PointIndex([
+        {"iri": "urn:ex/Supply_Air_Temperature_Sensor", "tags": ["Point", "Sensor"]},
+        {"iri": "urn:ex/Supply_Air_Temperature_Setpoint", "tags": ["Point", "Setpoint"]},
+        {"iri": "urn:ex/Return_Air_Temperature_Sensor"},
+    ])
+    matches, unknown = index.match("AHU1_SAT", top_k=3)
+    assert matches[0][0] == "urn:ex/Supply_Air_Temperature_Sensor" and len(matches) == 3
+    assert all(0 < score <= 1 for _, score in matches)
+    assert unknown == ["ahu"]
+    assert index.match("AHU1 SAT SP", top_k=1)[0][0][0] == "urn:ex/Supply_Air_Temperature_Setpoint"
+    index.match("AHU2_SAT", top_k=3)
+    assert len(index._memo) == 2
+    assert index.match("XYZZY") == ([], ["xyzzy"])
+
+    tools = _shared_server().tools
+    brick = "https://brickschema.org/schema/Brick#"
+    expected = {
+        "AHU1_SAT": "Supply_Air_Temperature_Sensor",
+        "VAV-2-14 DMP POS": "Damper_Position_Sensor",
+        "RTU3 OAT": "Outside_Air_Temperature_Sensor",
+        "CHW SUPPLY TEMP": "Chilled_Water_Supply_Temperature_Sensor",
+        "AHU1_SF_STATUS": "Fan_Status",
+        "ZONE CO2 SP": "CO2_Setpoint",
+    }
+    result = tools.match_point_labels(labels=list(expected) + ["XYZZY", ""], top_k=2)
+    assert result["success"] and (result["rows"], result["matched"], result["unmatched"]) == (8, 6, 2)
+    for row in result["results"][:len(expected)]:
+        assert row["matches"][0]["class"] == brick + expected[row["label"]], row
+    assert result["results"][6]["unmatched_tokens"] == ["xyzzy"] and result["results"][7]["matches"] == []
+    result = tools.match_point_labels(labels=list(expected), max_results=2)
+    assert len(result["results"]) == 2 and result["truncated"]
+
+    with tempfile.TemporaryDirectory() as label_dir:
+        with open(f"{label_dir}/points.csv", "w") as f:
+            f.write("id,name\n" + "".join(f"{i},{label}\n" for i, label in enumerate(expected)))
+        result = tools.match_point_labels(labels_file=f"{label_dir}/points.csv", label_column="name",
+                                          output_file=f"{label_dir}/matches.jsonl", top_k=1)
+        assert result["success"] and result["matched"] == len(expected) and "results" not in result
+        with open(f"{label_dir}/matches.jsonl") as f:
+            rows = [json.loads(line) for line in f]
+        assert [row["matches"][0]["class"] for row in rows] == [brick + cls for cls in expected.values()]
+        result = tools.match_point_labels(labels_file=f"{label_dir}/points.csv", label_column="missing")
+        assert not result["success"] and "missing" in result["error"]
+
+
+def test_templates_found_by_class():
+    """Templates are found from the classes their parameters take, directly, by superclass or by dependency."""
+    from buildingmotif_mcp.index import TemplateIndex
+
+    def entry(parameter_classes, dependencies=()):
+        return {"id": 0, "parameters": sorted(parameter_classes), "optional_parameters": [],
+                "parameter_classes": {param: classes for param, classes in parameter_classes.items() if classes},
+                "dependencies": list(dependencies)}
+
+    index = TemplateIndex({
+        "urn:t/sat": entry({"name": ["urn:ex/Supply_Air_Temperature_Sensor"]}),
+        "urn:t/vav": entry({"name": ["urn:ex/VAV"], "sat": [], "dmp": ["urn:ex/Damper"]},
+                           [{"template": "urn:t/sat", "library": "t", "args": {"name": "sat"}}]),
+        "urn:t/box": entry({"name": ["urn:ex/VAV"]}),
+    })
+    assert index.templates_for_class("urn:ex/VAV") == ["urn:t/box", "urn:t/vav"]
+    assert index.templates_for_class("urn:ex/Nothing") == []
+    assert index.dependents("urn:t/sat") == ["urn:t/vav"]
+    assert TemplateIndex.from_dict(index.to_dict()).by_class == index.by_class
+
+    tools = _shared_server().tools
+    provided = {"urn:ex/VAV": ("urn:ex/VAV", 0), "urn:ex/Supply_Air_Temperature_Sensor": ("urn:ex/SAT_Sub", 1)}
+    match = tools._match_template("t", index, "urn:t/vav", provided)
+    assert match["satisfied"] == {"name": "urn:ex/VAV", "sat": "urn:ex/SAT_Sub"}
+    assert match["missing"] == {"dmp": ["urn:ex/Damper"]} and match["score"] == 0.6667
+    assert tools._match_template("t", index, "urn:t/vav", {"urn:ex/Damper": ("urn:ex/Damper", 0)})["score"] == 0.3333
+    assert tools._match_template("t", index, "urn:t/sat", {"urn:ex/VAV": ("urn:ex/VAV", 0)}) is None
+
+    brick = "https://brickschema.org/schema/Brick#"
+    assert f"{brick}AHU" in tools.om.get_template_index("brick").templates_for_class(f"{brick}AHU")
+    result = tools.match_templates(["Supply_Air_Temperature_Sensor", "No_Such_Class"], limit=3)
+    assert result["success"] and [row["class"] for row in result["unresolved"]] == ["No_Such_Class"]
+    assert [row["template"] for row in result["results"]] == [
+        f"{brick}{name}" for name in ("Supply_Air_Temperature_Sensor", "Air_Temperature_Sensor", "Temperature_Sensor")]
+    assert all(row["satisfied"] == {"name": f"{brick}Supply_Air_Temperature_Sensor"} for row in result["results"])
+    assert result["total"] > result["count"] == 3
+    assert tools.match_templates(["Supply_Air_Temperature_Sensor"], library_name="nope")["success"] is False
+
+
+def test_server_stats_count_tool_calls():
+    """Every tool call is counted by outcome with its latency and UTF-8 response size."""
+    import asyncio
+    import json
+    import tempfile
+    from mcp import types
+    from buildingmotif_mcp.stats import Histogram, StatsReporter
+
+    histogram = Histogram(min_value=1e-3)
+    for ms in range(1, 1001):
+        histogram.add(ms / 1000)
+    assert histogram.count == 1000 and histogram.max == 1.0
+    assert abs(histogram.percentile(0.5) - 0.5) <= 0.05 and abs(histogram.percentile(0.99) - 0.99) <= 0.1
+    assert Histogram(min_value=1).percentile(0.5) is None
+
+    server = _shared_server()
+    handler = server.server.request_handlers[types.CallToolRequest]
+    ahu = "https://brickschema.org/schema/Brick#AHU"
+    calls = [
+        ("list_libraries", {}),
+        ("get_template_details", {"library_name": "brick", "template_name": ahu}),
+        ("get_template_details", {"library_name": "brick", "template_name": "urn:ex/none"}),
+    ]
+
+    async def call_all():
+        texts = []
+        for name, arguments in calls:
+            request = types.CallToolRequest(method="tools/call",
+                                            params=types.CallToolRequestParams(name=name, arguments=arguments))
+            response = await handler(request)
+            texts.append(response.root.content[0].text)
+        return texts
+
+    before = server.server_stats()
+    texts = asyncio.run(call_all())
+    after = server.server_stats()
+    assert after["calls"] == before["calls"] + 3
+    tools = {row["tool"]: row for row in after["tools"]}
+    previous = {row["tool"]: row for row in before["tools"]}
+    details = tools["get_template_details"]
+    old = previous.get("get_template_details", {"calls": 0, "ok": 0, "error": 0, "response_bytes": {"total": 0}})
+    assert (details["calls"], details["ok"], details["error"]) == (old["calls"] + 2, old["ok"] + 1, old["error"] + 1)
+    assert details["response_bytes"]["total"] - old["response_bytes"]["total"] == sum(
+        len(text.encode("utf-8")) for text in texts[1:])
+    assert details["latency_ms"]["p50"] <= details["latency_ms"]["max"]
+    assert [row["total_seconds"] for row in after["tools"]] == sorted(
+        (row["total_seconds"] for row in after["tools"]), reverse=True)
+    assert after["caches"]["responses"]["entries"] >= 1 and after["libraries"][0]["library"] == "brick"
+
+    with tempfile.TemporaryDirectory() as stats_dir:
+        reporter = StatsReporter(server.server_stats, interval=60, path=f"{stats_dir}/stats.jsonl")
+        reporter.write()
+        with open(f"{stats_dir}/stats.jsonl") as f:
+            line = json.loads(f.readline())
+        assert line["calls"] == after["calls"] and "time" in line
+
+
+def test_export_round_trips_through_rdfb_and_gzip():
+    """Streamed exports read back to the same graph, whether the model is in memory or on disk."""
+    import gzip
+    import tempfile
+    import rdflib
+    from rdflib.compare import isomorphic
+    from buildingmotif_mcp.export import read_rdfb
+    from buildingmotif_mcp.models import ESTIMATED_BYTES_PER_TRIPLE, ModelStore
+    from buildingmotif_mcp.tools import BuildingMOTIFTools
+
+    ex = rdflib.Namespace("urn:ex/")
+    point = rdflib.BNode()
+    triples = [
+        (ex.ahu1, rdflib.RDF.type, ex.AHU),
+        (ex.ahu1, ex.hasPoint, point),
+        (point, rdflib.RDFS.label, rdflib.Literal("SAT \u00b0C", lang="en")),
+        (point, rdflib.RDFS.comment, rdflib.Literal('line one\nline "two" \\ three')),
+        (point, ex.value, rdflib.Literal(21.5)),
+        (point, ex["count"], rdflib.Literal("7", datatype=rdflib.XSD.integer)),
+    ]
+    expected = rdflib.Graph()
+    for triple in triples:
+        expected.add(triple)
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        store = ModelStore(memory_budget=8 * ESTIMATED_BYTES_PER_TRIPLE, spill_dir=f"{export_dir}/spill")
+        tools = BuildingMOTIFTools(_shared_server().ontology_manager, models=store)
+        model_id = tools.create_model()["model_id"]
+        with store.checkout(model_id) as session:
+            session.add_triples(triples)
+
+        for from_disk in (False, True):
+            for fmt in ("nt", "nt.gz", "rdfb"):
+                path = f"{export_dir}/model-{from_disk}.{fmt}"
+                result = tools.export_model(model_id, fmt, path)
+                assert result["success"] and result["from_disk"] == from_disk
+                assert result["triples"] == len(triples) and result["bytes"] > 0
+                if fmt == "rdfb":
+                    graph = rdflib.Graph()
+                    for triple in read_rdfb(path):
+                        graph.add(triple)
+                elif fmt == "nt.gz":
+                    with gzip.open(path, "rt", encoding="utf-8") as f:
+                        graph = rdflib.Graph().parse(data=f.read(), format="nt")
+                else:
+                    graph = rdflib.Graph().parse(path, format="nt")
+                assert isomorphic(graph, expected), (fmt, from_disk)
+            # Push the model out of memory for the second round
+            other = tools.create_model()["model_id"]
+            with store.checkout(other) as session:
+                session.add_triples((ex[f"vav{i}"], rdflib.RDF.type, ex.VAV) for i in range(8))
+            assert not store.get(model_id).resident
+
+        with open(f"{export_dir}/model-True.rdfb", "rb") as f:
+            data = f.read()
+        with gzip.open(f"{export_dir}/truncated.rdfb", "wb") as f:
+            f.write(gzip.decompress(data)[:-3])
+        try:
+            list(read_rdfb(f"{export_dir}/truncated.rdfb"))
+            assert False, "a truncated rdfb file should be rejected"
+        except ValueError:
+            pass
+
+        turtle = tools.export_model(model_id)
+        assert isomorphic(rdflib.Graph().parse(data=turtle["rdf_content"], format="turtle"), expected)
+        assert not tools.export_model(model_id, "rdfb")["success"]
+
+
+def test_model_spill_round_trip():
+    """A model evicted under a small memory budget comes back from disk unchanged."""
+    import tempfile
+    import rdflib
+    from buildingmotif_mcp.models import ESTIMATED_BYTES_PER_TRIPLE, ModelStore
+
+    ex = rdflib.Namespace("urn:ex/")
+    with tempfile.TemporaryDirectory() as spill_dir:
+        store = ModelStore(memory_budget=5 * ESTIMATED_BYTES_PER_TRIPLE, spill_dir=spill_dir)
+        first, second = store.create(), store.create()
+        with store.checkout(first.model_id) as session:
+            session.add_triples([
+                (ex.ahu1, rdflib.RDF.type, ex.AHU),
+                (ex.ahu1, ex.hasPoint, rdflib.BNode("sat")),
+                (rdflib.BNode("sat"), rdflib.RDFS.label, rdflib.Literal("SAT \u00b0C", lang="en")),
+            ], [("ex", ex)])
+            expected = set(session.graph)
+        with store.checkout(second.model_id) as session:
+            session.add_triples((ex[f"vav{i}"], rdflib.RDF.type, ex.VAV) for i in range(4))
+
+        assert not first.resident
+        assert store.evictions == 1
+        assert store.spill_file(first).exists()
+        with store.checkout(first.model_id) as session:
+            assert set(session.graph) == expected
+            assert ("ex", rdflib.URIRef(ex)) in set(session.graph.namespaces())
+        assert store.rehydrations == 1
+        assert not second.resident
+
+
 if __name__ == "__main__":
-    sys.exit(test_server())
+    # Same order as pytest: BuildingMOTIF keeps the database of the first
+    # OntologyManager for the whole process, so the server test goes first
+    status = run_server_checks()
+    test_sharded_validation_matches_serial()
+    test_incremental_validation_matches_full()
+    test_reload_drops_removed_templates()
+    test_library_cache_hits_until_files_change()
+    test_memory_budget_unloads_and_reopens_libraries()
+    test_sparql_is_read_only_paged_and_stopped_at_its_deadline()
+    test_evaluate_template_batches()
+    test_response_cache_hits_evicts_and_keeps_budget()
+    test_search_ranks_exact_prefix_and_typo_matches()
+    test_pagination_cursors_and_field_projection()
+    test_class_hierarchy_closure()
+    test_point_labels_match_brick_classes()
+    test_templates_found_by_class()
+    test_server_stats_count_tool_calls()
+    test_export_round_trips_through_rdfb_and_gzip()
+    test_model_spill_round_trip()
+    sys.exit(status)